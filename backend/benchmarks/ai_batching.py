@@ -0,0 +1,67 @@
+"""
+Throughput against added latency for AI micro-batching.
+
+Runs in-process against MockProvider behind ResilientAIClient, so the
+provider concurrency cap applies to batches just as it does in the app.
+Each round-trip costs --latency-ms plus --item-ms per prompt in the
+batch.
+
+  python -m benchmarks.ai_batching --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+from src.ai import generate_ai_response
+from src.ai_providers import MicroBatcher, MockProvider, ResilientAIClient
+from benchmarks.load_test import percentile
+
+MESSAGES = [{"role": "user", "content": "What should I do after a tooth extraction?"}]
+
+async def drive(call, requests: int, concurrency: int):
+  semaphore = asyncio.Semaphore(concurrency)
+  latencies = []
+
+  async def one():
+    async with semaphore:
+      start = time.perf_counter()
+      await call()
+      latencies.append(time.perf_counter() - start)
+
+  start = time.perf_counter()
+  await asyncio.gather(*[one() for _ in range(requests)])
+  return latencies, time.perf_counter() - start
+
+async def run(args):
+  def make_client():
+    provider = MockProvider(generate_ai_response, latency_ms=args.latency_ms, batch_item_ms=args.item_ms)
+    return ResilientAIClient(provider, max_concurrency=args.max_concurrency, timeout=60)
+
+  print(f"{'mode':<24}{'req/s':>9}{'p50':>9}{'p99':>9}{'avg batch':>11}")
+  client = make_client()
+  latencies, elapsed = await drive(lambda: client.complete(MESSAGES), args.requests, args.concurrency)
+  print(f"{'unbatched':<24}{len(latencies) / elapsed:>9.0f}{percentile(latencies, 50) * 1000:>7.0f}ms{percentile(latencies, 99) * 1000:>7.0f}ms{1:>11.1f}")
+
+  for window_ms in args.windows:
+    client = make_client()
+    batcher = MicroBatcher(client.complete_batch, window_ms=window_ms, max_batch_size=args.batch_size)
+    latencies, elapsed = await drive(lambda: batcher.submit(MESSAGES), args.requests, args.concurrency)
+    name = f"window {window_ms:g}ms / max {args.batch_size}"
+    print(
+      f"{name:<24}{len(latencies) / elapsed:>9.0f}{percentile(latencies, 50) * 1000:>7.0f}ms"
+      f"{percentile(latencies, 99) * 1000:>7.0f}ms{batcher.stats()['avg_batch_size']:>11.1f}"
+    )
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--requests", type=int, default=2000)
+  parser.add_argument("--concurrency", type=int, default=200)
+  parser.add_argument("--max-concurrency", type=int, default=16, help="provider in-flight cap")
+  parser.add_argument("--latency-ms", type=float, default=200)
+  parser.add_argument("--item-ms", type=float, default=5)
+  parser.add_argument("--batch-size", type=int, default=16)
+  parser.add_argument("--windows", type=float, nargs="+", default=[5, 10, 20])
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,96 @@
+"""
+Tail latency of the AI layer while the upstream degrades.
+
+Runs entirely in-process against MockProvider. Each scenario is driven
+twice: calling the provider directly (no deadline, no breaker), and
+through ResilientAIClient with its deadline, retries and breaker.
+
+  python -m benchmarks.ai_degradation --requests 400 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from src.ai import generate_ai_response, generate_fallback_response
+from src.ai_providers import (
+  CircuitBreaker,
+  CircuitOpen,
+  MockProvider,
+  ProviderError,
+  ResilientAIClient,
+)
+from benchmarks.load_test import percentile
+
+SCENARIOS = {
+  # name: (latency_ms, jitter_ms, failure_rate)
+  "healthy": (200, 100, 0.0),
+  "slow": (1500, 3000, 0.0),
+  "flaky": (300, 200, 0.3),
+  "down": (2000, 2000, 1.0),
+}
+MESSAGES = [{"role": "user", "content": "How long after a filling can I eat?"}]
+
+async def call_direct(provider: MockProvider):
+  try:
+    await provider.complete(MESSAGES)
+    return False
+  except ProviderError:
+    generate_fallback_response(MESSAGES[-1]["content"])
+    return True
+
+async def call_resilient(client: ResilientAIClient):
+  try:
+    await client.complete(MESSAGES)
+    return False
+  except (CircuitOpen, ProviderError, TimeoutError):
+    generate_fallback_response(MESSAGES[-1]["content"])
+    return True
+
+async def drive(call, requests: int, concurrency: int):
+  semaphore = asyncio.Semaphore(concurrency)
+  latencies, fallbacks = [], 0
+
+  async def one():
+    nonlocal fallbacks
+    async with semaphore:
+      start = time.perf_counter()
+      fell_back = await call()
+      latencies.append(time.perf_counter() - start)
+      fallbacks += fell_back
+
+  await asyncio.gather(*[one() for _ in range(requests)])
+  return latencies, fallbacks
+
+async def run(args):
+  print(f"{'scenario':<10}{'mode':<11}{'p50':>9}{'p99':>9}{'max':>9}{'fallbacks':>11}")
+  for name, (latency_ms, jitter_ms, failure_rate) in SCENARIOS.items():
+    def make_provider():
+      return MockProvider(generate_ai_response, latency_ms=latency_ms, jitter_ms=jitter_ms, failure_rate=failure_rate, seed=args.seed)
+
+    direct = make_provider()
+    client = ResilientAIClient(
+      make_provider(),
+      max_concurrency=args.max_concurrency,
+      timeout=args.timeout,
+      max_retries=2,
+      retry_base=0.05,
+      breaker=CircuitBreaker(failure_threshold=5, reset_timeout=1.0),
+    )
+    for mode, call in (("direct", lambda: call_direct(direct)), ("resilient", lambda: call_resilient(client))):
+      latencies, fallbacks = await drive(call, args.requests, args.concurrency)
+      print(
+        f"{name:<10}{mode:<11}{percentile(latencies, 50) * 1000:>7.0f}ms{percentile(latencies, 99) * 1000:>7.0f}ms"
+        f"{max(latencies) * 1000:>7.0f}ms{fallbacks:>11}"
+      )
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--requests", type=int, default=400)
+  parser.add_argument("--concurrency", type=int, default=50)
+  parser.add_argument("--max-concurrency", type=int, default=50, help="ResilientAIClient in-flight cap")
+  parser.add_argument("--timeout", type=float, default=1.5, help="ResilientAIClient deadline in seconds")
+  parser.add_argument("--seed", type=int, default=7)
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,63 @@
+"""
+Rows per second: one create_patient call per row against the bulk import.
+
+Runs in-process against DATABASE_URL using generated patients; each
+path gets its own batch of unique emails.
+
+  DATABASE_URL=postgresql://... python -m benchmarks.bulk_import_benchmark --rows 20000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import time
+
+from src.database import AsyncSessionLocal, engine, init_db
+from src.crud import create_patient
+from src.schemas import PatientCreate
+from src.bulk import import_patients
+from benchmarks.data import generate_patients
+
+def to_csv(rows) -> io.BytesIO:
+  text = io.StringIO()
+  writer = None
+  for row in rows:
+    if writer is None:
+      writer = csv.DictWriter(text, fieldnames=list(row))
+      writer.writeheader()
+    writer.writerow(row)
+  return io.BytesIO(text.getvalue().encode())
+
+async def run(args):
+  await init_db()
+  # Offset the generator so repeated runs don't collide on email
+  start = int(time.time()) * 10
+
+  rows = list(generate_patients(args.single_rows, seed=args.seed, start=start))
+  async with AsyncSessionLocal() as db:
+    began = time.perf_counter()
+    for row in rows:
+      await create_patient(db, PatientCreate(**row))
+    single = len(rows) / (time.perf_counter() - began)
+  print(f"single inserts   {len(rows):>8} rows {single:>10.0f} rows/s")
+
+  upload = to_csv(generate_patients(args.rows, seed=args.seed, start=start + args.single_rows))
+  for chunk_size in args.chunk_sizes:
+    upload.seek(0)
+    async with AsyncSessionLocal() as db:
+      began = time.perf_counter()
+      report = await import_patients(db, upload, fmt="csv", on_conflict="update", chunk_size=chunk_size)
+      bulk = report["received"] / (time.perf_counter() - began)
+    print(f"bulk chunk={chunk_size:<5} {report['received']:>8} rows {bulk:>10.0f} rows/s  ({bulk / single:.0f}x)")
+  await engine.dispose()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--rows", type=int, default=20_000)
+  parser.add_argument("--single-rows", type=int, default=1_000, help="rows for the slow single-insert path")
+  parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[250, 1000])
+  parser.add_argument("--seed", type=int, default=42)
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
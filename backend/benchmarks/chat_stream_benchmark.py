@@ -0,0 +1,67 @@
+"""
+Time to first byte for /api/chat against /api/chat/stream.
+
+Start the server with the mock provider slowed down to LLM-like
+timings, so no API key is needed:
+
+  AI_MOCK_LATENCY_MS=400 AI_MOCK_TOKEN_MS=30 uvicorn src.main:app
+  python -m benchmarks.chat_stream_benchmark --url http://localhost:8000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from benchmarks.load_test import get_token, percentile
+
+MESSAGE = {"message": "How often should I brush my teeth after a filling?"}
+
+async def time_blocking(client: httpx.AsyncClient, headers: dict):
+  start = time.perf_counter()
+  response = await client.post("/api/chat", json=MESSAGE, headers=headers)
+  response.raise_for_status()
+  elapsed = time.perf_counter() - start
+  return elapsed, elapsed
+
+async def time_streaming(client: httpx.AsyncClient, headers: dict):
+  start = time.perf_counter()
+  first_token = None
+  async with client.stream("POST", "/api/chat/stream", json=MESSAGE, headers=headers) as response:
+    response.raise_for_status()
+    async for line in response.aiter_lines():
+      if first_token is None and line.startswith("data:"):
+        first_token = time.perf_counter() - start
+  return first_token, time.perf_counter() - start
+
+async def measure(fn, client, headers, concurrency: int, rounds: int):
+  first, total = [], []
+  for _ in range(rounds):
+    results = await asyncio.gather(*[fn(client, headers) for _ in range(concurrency)])
+    first += [r[0] for r in results]
+    total += [r[1] for r in results]
+  return first, total
+
+async def run(args):
+  limits = httpx.Limits(max_connections=args.concurrency)
+  async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+    token = await get_token(client, f"chatbench-{uuid.uuid4().hex[:8]}@example.com", "chatbench-password")
+    headers = {"Authorization": f"Bearer {token}"}
+    print(f"{'endpoint':<20}{'ttfb p50':>10}{'ttfb p99':>10}{'total p50':>11}{'total p99':>11}")
+    for name, fn in (("/api/chat", time_blocking), ("/api/chat/stream", time_streaming)):
+      first, total = await measure(fn, client, headers, args.concurrency, args.rounds)
+      print(
+        f"{name:<20}{percentile(first, 50) * 1000:>8.0f}ms{percentile(first, 99) * 1000:>8.0f}ms"
+        f"{percentile(total, 50) * 1000:>9.0f}ms{percentile(total, 99) * 1000:>9.0f}ms"
+      )
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--url", default="http://localhost:8000")
+  parser.add_argument("--concurrency", type=int, default=50)
+  parser.add_argument("--rounds", type=int, default=5)
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
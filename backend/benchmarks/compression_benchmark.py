@@ -0,0 +1,91 @@
+"""
+Bandwidth and latency of patient list pages by response encoding, and
+of revalidating an unchanged page with If-None-Match.
+
+For each page shape, requests the page repeatedly in-process with no
+compression, gzip and brotli, and reports the bytes sent, server-side
+p50/p95, and the estimated time to the last byte over a few link speeds
+(server p50 + bytes / bandwidth). Then reports a 304 revalidation the
+same way. Seeds DATABASE_URL with benchmark patients if needed.
+
+  DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.compression_benchmark --patients 10000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from benchmarks.load_test import percentile
+
+PAGES = [
+  ("full x50", "/api/patients/?limit=50"),
+  ("full x100", "/api/patients/?limit=100"),
+  ("full x500", "/api/patients/?paginate=cursor&limit=500"),
+  ("summary x100", "/api/patients/?limit=100&view=summary"),
+]
+ENCODINGS = ["identity", "gzip", "br"]
+LINKS_MBPS = [5, 20, 100]
+
+async def measure(client, url: str, headers: dict, repeat: int):
+  latencies = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    response = await client.get(url, headers=headers)
+    latencies.append(time.perf_counter() - start)
+  # Bytes on the wire: the body as sent, before the client decodes it
+  size = int(response.headers.get("content-length") or len(response.content))
+  return response, size, latencies
+
+def row(label: str, size: int, latencies: list) -> str:
+  p50 = percentile(latencies, 50) * 1000
+  transfers = "".join(f"{p50 + size * 8 / (mbps * 1000):>10.1f}ms" for mbps in LINKS_MBPS)
+  return f"{label:<24}{size:>10}{p50:>9.2f}ms{percentile(latencies, 95) * 1000:>9.2f}ms{transfers}"
+
+async def run(args):
+  from benchmarks.data import ensure_patients, seed_users, user_email
+  from src.compression import brotli
+  from src.database import engine, init_db
+  from src.main import app
+
+  await init_db()
+  await ensure_patients(engine, args.patients, seed=args.seed)
+  await seed_users(engine, 1, args.password)
+  encodings = ENCODINGS if brotli is not None else ENCODINGS[:2]
+
+  await app.router._startup()
+  try:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+      response = await client.post("/api/auth/login", json={"email": user_email(0), "password": args.password})
+      response.raise_for_status()
+      auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+      links = "".join(f"{f'@{mbps}Mbit/s':>12}" for mbps in LINKS_MBPS)
+      print(f"{'page / encoding':<24}{'bytes':>10}{'p50':>11}{'p95':>11}{links}")
+      for name, url in PAGES:
+        for encoding in encodings:
+          # A warm-up request also primes the principal cache
+          await client.get(url, headers={**auth, "Accept-Encoding": encoding})
+          response, size, latencies = await measure(client, url, {**auth, "Accept-Encoding": encoding}, args.repeat)
+          print(row(f"{name} {encoding}", size, latencies))
+        etag = response.headers["etag"]
+        _, size, latencies = await measure(client, url, {**auth, "If-None-Match": etag}, args.repeat)
+        print(row(f"{name} 304", size, latencies))
+  finally:
+    await app.router._shutdown()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--patients", type=int, default=10000)
+  parser.add_argument("--repeat", type=int, default=50)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--password", default="benchmark-password")
+  args = parser.parse_args()
+  # Offline and unthrottled: set before src is first imported
+  os.environ["AI_PROVIDER"] = "mock"
+  os.environ["RATE_LIMIT_ENABLED"] = "false"
+  asyncio.run(run(args))
+
+if __name__ == "__main__":
+  main()
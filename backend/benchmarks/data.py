@@ -0,0 +1,89 @@
+"""
+Seeded synthetic users and patients, for benchmarks only.
+"""
+from datetime import date, timedelta
+import random
+
+from sqlalchemy import func, insert, select
+
+from src.auth import get_password_hash
+from src.models import Patient, User
+
+FIRST_NAMES = [
+  "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+  "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+  "Thomas", "Sarah", "Charles", "Karen", "Daniel", "Nancy", "Matthew", "Lisa",
+  "Anthony", "Betty", "Mark", "Margaret", "Donald", "Sandra", "Steven", "Ashley",
+  "Aisha", "Wei", "Mohammed", "Sofia", "Hiroshi", "Priya", "Carlos", "Olga",
+]
+LAST_NAMES = [
+  "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+  "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+  "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+  "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker",
+  "Khan", "Nguyen", "Patel", "Kim", "Chen", "Okafor", "Ivanova", "Tanaka", "Silva",
+]
+HISTORY = [
+  "No significant medical history.",
+  "Hypertension, controlled with medication.",
+  "Type 2 diabetes. Takes metformin daily.",
+  "Asthma, uses inhaler as needed.",
+  "History of heart murmur; requires antibiotic premedication.",
+]
+DENTAL = [
+  "Routine cleanings every six months.",
+  "Two composite fillings (2019), crown on #30.",
+  "Orthodontic treatment completed in adolescence.",
+  "Root canal on #14, periodontal maintenance.",
+  "Wisdom teeth extracted. Sensitivity on lower incisors.",
+]
+
+def generate_patients(count: int, seed: int = 42, start: int = 0):
+  rng = random.Random(seed)
+  for i in range(start, start + count):
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    yield {
+      "first_name": first_name,
+      "last_name": last_name,
+      "email": f"{first_name.lower()}.{last_name.lower()}.{i}@example.com",
+      "phone": f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}",
+      "date_of_birth": date(1940, 1, 1) + timedelta(days=rng.randint(0, 30000)),
+      "address": f"{rng.randint(1, 9999)} Main St, Springfield",
+      "medical_history": rng.choice(HISTORY),
+      "dental_history": rng.choice(DENTAL),
+      "allergies": rng.choice(["None", "Penicillin", "Latex", "Ibuprofen", "None"]),
+      "emergency_contact": f"{rng.choice(FIRST_NAMES)} {last_name} {rng.randint(200, 999)}-555-{rng.randint(0, 9999):04d}",
+    }
+
+async def seed_patients(engine, count: int, seed: int = 42, chunk_size: int = 5000, start: int = 0):
+  rows = []
+  async with engine.begin() as conn:
+    for row in generate_patients(count, seed=seed, start=start):
+      rows.append(row)
+      if len(rows) >= chunk_size:
+        await conn.execute(insert(Patient), rows)
+        rows = []
+    if rows:
+      await conn.execute(insert(Patient), rows)
+
+def user_email(index: int) -> str:
+  return f"bench-user-{index}@example.com"
+
+async def seed_users(engine, count: int, password: str, chunk_size: int = 5000):
+  """Insert users bench-user-0..count-1 that don't exist yet, all with one password."""
+  # One bcrypt hash shared by every row: hashing per user would dominate seeding
+  hashed = get_password_hash(password)
+  async with engine.begin() as conn:
+    existing = set((await conn.execute(select(User.email).where(User.email.like("bench-user-%")))).scalars())
+    rows = [{"email": user_email(i), "hashed_password": hashed} for i in range(count) if user_email(i) not in existing]
+    for start in range(0, len(rows), chunk_size):
+      await conn.execute(insert(User), rows[start:start + chunk_size])
+
+async def ensure_patients(engine, count: int, seed: int = 42):
+  """Top the patients table up to count rows, continuing the seeded sequence."""
+  async with engine.connect() as conn:
+    existing = (await conn.execute(select(func.count()).select_from(Patient))).scalar_one()
+  if existing < count:
+    # Emails are numbered from start, so topping up never collides
+    await seed_patients(engine, count - existing, seed=seed + existing, start=existing)
@@ -0,0 +1,72 @@
+"""
+Concurrent load test for the patient API.
+
+Run against a live server, once on the old build and once on the new one:
+
+  python -m benchmarks.load_test --url http://localhost:8000 --concurrency 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+def percentile(samples, pct):
+  ordered = sorted(samples)
+  index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+  return ordered[index]
+
+async def get_token(client: httpx.AsyncClient, email: str, password: str) -> str:
+  await client.post("/api/auth/register", json={"email": email, "password": password})
+  response = await client.post("/api/auth/login", json={"email": email, "password": password})
+  response.raise_for_status()
+  return response.json()["access_token"]
+
+async def worker(client: httpx.AsyncClient, path: str, headers: dict, count: int, latencies: list, errors: list):
+  for _ in range(count):
+    start = time.perf_counter()
+    try:
+      response = await client.get(path, headers=headers)
+      if response.status_code >= 400:
+        errors.append(response.status_code)
+    except httpx.HTTPError as e:
+      errors.append(type(e).__name__)
+    latencies.append(time.perf_counter() - start)
+
+async def run(args):
+  limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+  async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+    email = args.email or f"loadtest-{uuid.uuid4().hex[:8]}@example.com"
+    token = await get_token(client, email, args.password)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+      worker(client, args.path, headers, args.requests, latencies, errors)
+      for _ in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+  print(f"path         {args.path}")
+  print(f"concurrency  {args.concurrency}")
+  print(f"requests     {len(latencies)} ({len(errors)} errors)")
+  print(f"throughput   {len(latencies) / elapsed:.1f} req/s")
+  print(f"mean         {statistics.mean(latencies) * 1000:.1f} ms")
+  print(f"p50          {percentile(latencies, 50) * 1000:.1f} ms")
+  print(f"p99          {percentile(latencies, 99) * 1000:.1f} ms")
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--url", default="http://localhost:8000")
+  parser.add_argument("--path", default="/api/patients/")
+  parser.add_argument("--concurrency", type=int, default=200)
+  parser.add_argument("--requests", type=int, default=20, help="requests per client")
+  parser.add_argument("--email")
+  parser.add_argument("--password", default="loadtest-password")
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
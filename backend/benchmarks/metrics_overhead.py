@@ -0,0 +1,58 @@
+"""
+Per-request cost of MetricsMiddleware and the per-statement query hook,
+measured against a bare ASGI app, plus how long a /metrics scrape takes
+to render. Pure in-process; no server or database needed.
+
+  python -m benchmarks.metrics_overhead --requests 200000
+"""
+import argparse
+import asyncio
+import time
+
+from starlette.routing import Route
+
+from src.metrics import MetricsMiddleware, record_query, registry
+
+ROUTE = Route("/api/patients/{patient_id}", endpoint=lambda request: None)
+
+async def endpoint(scope, receive, send):
+  scope["route"] = ROUTE
+  await send({"type": "http.response.start", "status": 200, "headers": []})
+  await send({"type": "http.response.body", "body": b"{}"})
+
+async def endpoint_with_queries(scope, receive, send):
+  # A handler that runs three statements
+  for _ in range(3):
+    record_query("primary")
+  await endpoint(scope, receive, send)
+
+async def noop_send(message):
+  pass
+
+async def per_request_us(app, requests: int) -> float:
+  scope = {"type": "http", "method": "GET", "path": "/api/patients/42"}
+  start = time.perf_counter()
+  for _ in range(requests):
+    await app(dict(scope), None, noop_send)
+  return (time.perf_counter() - start) / requests * 1e6
+
+async def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--requests", type=int, default=200000)
+  args = parser.parse_args()
+
+  bare = await per_request_us(endpoint, args.requests)
+  wrapped = await per_request_us(MetricsMiddleware(endpoint), args.requests)
+  bare_queries = await per_request_us(endpoint_with_queries, args.requests)
+  wrapped_queries = await per_request_us(MetricsMiddleware(endpoint_with_queries), args.requests)
+  print(f"bare app                 {bare:7.2f}us/request")
+  print(f"with middleware          {wrapped:7.2f}us/request  (+{wrapped - bare:.2f}us)")
+  print(f"3 queries, bare          {bare_queries:7.2f}us/request")
+  print(f"3 queries, middleware    {wrapped_queries:7.2f}us/request  (+{wrapped_queries - bare_queries:.2f}us)")
+
+  start = time.perf_counter()
+  body = registry.render()
+  print(f"scrape render            {(time.perf_counter() - start) * 1000:7.2f}ms for {body.count(chr(10))} lines")
+
+if __name__ == "__main__":
+  asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Per-request cost of RateLimitMiddleware with the in-process store,
+measured against a bare ASGI app: anonymous requests (keyed by IP) and
+authenticated ones (keyed by the token's subject, claims cached), spread
+over many distinct keys. Limits are set high enough that nothing is
+rejected, so every request takes the full allow path. Pure in-process;
+no server or database needed.
+
+  DATABASE_URL=sqlite:// SECRET_KEY=x python -m benchmarks.ratelimit_overhead --requests 200000
+"""
+import argparse
+import asyncio
+import time
+
+from src.auth import create_access_token
+from src.ratelimit import InMemoryRateLimitStore, Policy, RateLimitMiddleware
+
+async def endpoint(scope, receive, send):
+  await send({"type": "http.response.start", "status": 200, "headers": []})
+  await send({"type": "http.response.body", "body": b"{}"})
+
+async def noop_send(message):
+  pass
+
+def scopes(keys: int, authenticated: bool) -> list:
+  result = []
+  for index in range(keys):
+    headers = []
+    if authenticated:
+      token = create_access_token({"sub": f"user{index}@example.com"})
+      headers.append((b"authorization", f"Bearer {token}".encode()))
+    result.append({
+      "type": "http",
+      "method": "GET",
+      "path": "/api/patients/42",
+      "headers": headers,
+      "client": (f"10.0.{index // 256 % 256}.{index % 256}", 50000),
+    })
+  return result
+
+async def per_request_us(app, requests: int, request_scopes: list) -> float:
+  # One pass first, so token claims are cached as they are in steady state
+  for scope in request_scopes:
+    await app(dict(scope), None, noop_send)
+  start = time.perf_counter()
+  for index in range(requests):
+    await app(dict(request_scopes[index % len(request_scopes)]), None, noop_send)
+  return (time.perf_counter() - start) / requests * 1e6
+
+async def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--requests", type=int, default=200000)
+  parser.add_argument("--keys", type=int, default=1000)
+  args = parser.parse_args()
+
+  policies = [Policy("login", "/api/auth/login", 10, 60, methods=("POST",), key="ip"), Policy("api", "/api/", 10**9, 1)]
+  limited = RateLimitMiddleware(endpoint, policies=policies, store=InMemoryRateLimitStore())
+  anonymous = scopes(args.keys, authenticated=False)
+  authenticated = scopes(args.keys, authenticated=True)
+
+  bare = await per_request_us(endpoint, args.requests, anonymous)
+  by_ip = await per_request_us(limited, args.requests, anonymous)
+  by_user = await per_request_us(limited, args.requests, authenticated)
+  print(f"bare app                 {bare:7.2f}us/request")
+  print(f"limited, by IP           {by_ip:7.2f}us/request  (+{by_ip - bare:.2f}us)")
+  print(f"limited, by user         {by_user:7.2f}us/request  (+{by_user - bare:.2f}us)")
+
+if __name__ == "__main__":
+  asyncio.run(main())
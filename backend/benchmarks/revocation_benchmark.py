@@ -0,0 +1,62 @@
+"""
+Revocation check overhead: what checking the in-memory revocation list
+adds to authenticating a request, for growing numbers of revoked
+tokens, next to the database lookup it replaces.
+
+  DATABASE_URL=sqlite:////tmp/revocation.db SECRET_KEY=bench \
+    python -m benchmarks.revocation_benchmark --revoked 0 1000 100000
+"""
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+
+from sqlalchemy import select
+
+from src.auth import create_access_token, decode_token, token_cache
+from src.database import AsyncSessionLocal, init_db
+from src.models import RevokedToken
+from src.revocation import DatabaseRevocationBackend, InMemoryRevocationBackend, RevocationList
+import src.auth
+
+def per_call_us(fn, number: int) -> float:
+  return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+async def db_lookup_us(token_id: str, number: int) -> float:
+  async with AsyncSessionLocal() as db:
+    start = time.perf_counter()
+    for _ in range(number):
+      await db.execute(select(RevokedToken.id).where(RevokedToken.id == token_id))
+    return (time.perf_counter() - start) / number * 1e6
+
+async def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--revoked", type=int, nargs="+", default=[0, 1000, 100000])
+  parser.add_argument("--number", type=int, default=100000)
+  args = parser.parse_args()
+
+  token = create_access_token(data={"sub": "bench@example.com", "sid": uuid.uuid4().hex})
+  claims = decode_token(token)
+
+  print(f"{'revoked':>8} {'token cache hit':>16} {'+ revocation':>12} {'check alone':>12}")
+  for count in args.revoked:
+    revocations = RevocationList(InMemoryRevocationBackend())
+    expires_at = time.time() + 3600
+    for _ in range(count):
+      await revocations.revoke(uuid.uuid4().hex, expires_at)
+    src.auth.revocation_list = revocations
+
+    without = per_call_us(lambda: token_cache.get(token), args.number)
+    with_check = per_call_us(lambda: decode_token(token), args.number)
+    check = per_call_us(lambda: revocations.is_revoked(claims["jti"], claims["sid"]), args.number)
+    print(f"{count:>8} {without:>14.2f}us {with_check - without:>10.2f}us {check:>10.2f}us")
+
+  # What a per-request database check would cost instead
+  await init_db()
+  backend = DatabaseRevocationBackend(AsyncSessionLocal)
+  await backend.revoke("bench", time.time() + 3600, time.time())
+  print(f"database lookup per request: {await db_lookup_us('bench', 2000):.1f}us")
+
+if __name__ == "__main__":
+  asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Patient search benchmark: the old ILIKE scan against src.search.
+
+Seeds DATABASE_URL (Postgres with migrations applied, or SQLite) with
+generated patients, then times a set of queries through both paths:
+
+  DATABASE_URL=postgresql://... python -m benchmarks.search_benchmark --patients 500000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import or_, select
+
+from src.database import AsyncSessionLocal, engine, init_db
+from src.models import Patient
+from src.search import search_patients
+from benchmarks.data import ensure_patients
+
+QUERIES = ["smi", "john", "jennifer gar", "patel", "example.com", "555-01", "(415)", "zzz"]
+
+async def legacy_search(db, query: str):
+  result = await db.execute(
+    select(Patient).where(
+      or_(
+        Patient.first_name.ilike(f"%{query}%"),
+        Patient.last_name.ilike(f"%{query}%"),
+        Patient.email.ilike(f"%{query}%")
+      )
+    )
+  )
+  return result.scalars().all()
+
+async def time_call(fn, repeat: int):
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    await fn()
+    samples.append((time.perf_counter() - start) * 1000)
+  return statistics.median(samples), max(samples)
+
+async def run(args):
+  await init_db()
+  await ensure_patients(engine, args.patients, seed=args.seed)
+
+  print(f"{'query':<16}{'legacy p50':>12}{'full p50':>12}{'prefix p50':>12}{'legacy rows':>13}")
+  async with AsyncSessionLocal() as db:
+    for query in QUERIES:
+      legacy, _ = await time_call(lambda: legacy_search(db, query), args.repeat)
+      full, _ = await time_call(lambda: search_patients(db, query, limit=args.limit), args.repeat)
+      prefix, _ = await time_call(lambda: search_patients(db, query, limit=args.limit, prefix=True), args.repeat)
+      rows = len(await legacy_search(db, query))
+      print(f"{query:<16}{legacy:>10.1f}ms{full:>10.1f}ms{prefix:>10.1f}ms{rows:>13}")
+  await engine.dispose()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--patients", type=int, default=500_000)
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--limit", type=int, default=20)
+  parser.add_argument("--repeat", type=int, default=5)
+  asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+  main()
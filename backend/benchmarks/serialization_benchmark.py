@@ -0,0 +1,101 @@
+"""
+JSON serialization microbenchmark: the current response paths against
+the FAST_JSON path, for a patient list page, a patient detail and a chat
+reply. Rows come from an in-memory SQLite database and no server is
+needed (DATABASE_URL only has to be set for src.database to import):
+
+  DATABASE_URL=sqlite:// python -m benchmarks.serialization_benchmark --rows 100
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timezone
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from src.database import Base
+from src.models import Patient
+from src.schemas import ChatResponse, PatientResponse
+from src.serialization import ORJSON_OPTIONS, _orjson_default
+from benchmarks.data import generate_patients
+
+FIELDS = list(PatientResponse.model_fields)
+
+def stdlib_dumps(content) -> bytes:
+  # What JSONResponse does with jsonable_encoder output
+  return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+def fast_dumps(content) -> bytes:
+  return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
+
+def setup(rows: int):
+  engine = create_engine("sqlite://")
+  Base.metadata.create_all(engine)
+  with engine.begin() as conn:
+    conn.execute(insert(Patient), list(generate_patients(rows)))
+  return engine
+
+def cases(engine, rows: int):
+  list_adapter = TypeAdapter(List[PatientResponse])
+  columns = [Patient.__table__.c[name] for name in FIELDS]
+  chat = ChatResponse(message="How often should I floss?", response="Once a day. " * 40, timestamp=datetime.now(timezone.utc))
+
+  def orm_rows():
+    with Session(engine) as db:
+      return db.execute(select(Patient).limit(rows)).scalars().all()
+
+  def core_rows():
+    with engine.connect() as conn:
+      return conn.execute(select(*columns).limit(rows)).mappings().all()
+
+  def orm_detail():
+    with Session(engine) as db:
+      return db.get(Patient, 1)
+
+  return {
+    "list": {
+      # ORM rows validated into PatientResponse, then jsonable_encoder + json
+      "orm+pydantic+json": lambda: stdlib_dumps([PatientResponse.model_validate(p) for p in orm_rows()]),
+      # ORM rows through Pydantic's own dump_json (FastAPI's response_model path)
+      "orm+pydantic dump_json": lambda: list_adapter.dump_json(orm_rows()),
+      # FAST_JSON: Core mappings straight to orjson
+      "core+orjson": lambda: fast_dumps([{name: row[name] for name in FIELDS} for row in core_rows()]),
+    },
+    "detail": {
+      "orm+pydantic+json": lambda: stdlib_dumps(PatientResponse.model_validate(orm_detail())),
+      "orm+pydantic dump_json": lambda: PatientResponse.model_validate(orm_detail()).model_dump_json().encode(),
+      "orm+pydantic+orjson": lambda: fast_dumps(PatientResponse.model_validate(orm_detail())),
+    },
+    "chat": {
+      "pydantic+json": lambda: stdlib_dumps(chat),
+      "pydantic dump_json": lambda: chat.model_dump_json().encode(),
+      "pydantic+orjson": lambda: fast_dumps(chat),
+    },
+  }
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=100)
+  parser.add_argument("--number", type=int, default=200)
+  args = parser.parse_args()
+
+  engine = setup(args.rows)
+  for payload, variants in cases(engine, args.rows).items():
+    outputs = {name: json.loads(fn()) for name, fn in variants.items()}
+    assert all(output == next(iter(outputs.values())) for output in outputs.values()), f"{payload} outputs differ"
+
+    baseline = None
+    print(f"{payload}:")
+    for name, fn in variants.items():
+      seconds = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+      baseline = baseline or seconds
+      size = len(fn())
+      print(f"  {name:<24} {seconds * 1e6:9.1f} us  {size:7d} bytes  {baseline / seconds:5.2f}x")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,78 @@
+"""
+Cold-start budget check. Each run starts a fresh interpreter and measures:
+
+  import   time to import src.main (what a serverless cold start pays first)
+  startup  app startup hooks
+  first    the first /health/ready request, which opens a DB connection
+  ready    interpreter start to the first ready response
+
+Medians are compared against budgets; the exit status is 1 if any is
+over, so this can gate CI.
+
+  DATABASE_URL=sqlite:////tmp/startup.db python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Milliseconds; medians over these fail the check
+IMPORT_BUDGET_MS = 1500
+FIRST_REQUEST_BUDGET_MS = 250
+READY_BUDGET_MS = 3000
+
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from src.main import app
+t1 = time.perf_counter()
+import httpx
+
+async def main():
+  await app.router._startup()
+  t2 = time.perf_counter()
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://probe") as client:
+    response = await client.get("/health/ready")
+  t3 = time.perf_counter()
+  await app.router._shutdown()
+  assert response.status_code == 200, response.text
+  return t2, t3
+
+t2, t3 = asyncio.run(main())
+print(json.dumps({"import": t1 - t0, "startup": t2 - t1, "first": t3 - t2}))
+"""
+
+def run_once() -> dict:
+  start = time.perf_counter()
+  output = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True).stdout
+  timings = json.loads(output.strip().splitlines()[-1])
+  # Wall time includes interpreter start, which the probe can't see
+  timings["ready"] = time.perf_counter() - start
+  return timings
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--runs", type=int, default=5)
+  parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+  parser.add_argument("--first-request-budget-ms", type=float, default=FIRST_REQUEST_BUDGET_MS)
+  parser.add_argument("--ready-budget-ms", type=float, default=READY_BUDGET_MS)
+  args = parser.parse_args()
+
+  runs = [run_once() for _ in range(args.runs)]
+  budgets = {"import": args.import_budget_ms, "startup": None, "first": args.first_request_budget_ms, "ready": args.ready_budget_ms}
+  over = []
+  print(f"{'phase':8} {'median':>10} {'max':>10} {'budget':>10}")
+  for phase, budget in budgets.items():
+    values = [run[phase] * 1000 for run in runs]
+    median = statistics.median(values)
+    print(f"{phase:8} {median:>8.1f}ms {max(values):>8.1f}ms {f'{budget:.0f}ms' if budget else '-':>10}")
+    if budget is not None and median > budget:
+      over.append(phase)
+  if over:
+    print(f"Over budget: {', '.join(over)}")
+    sys.exit(1)
+
+if __name__ == "__main__":
+  main()
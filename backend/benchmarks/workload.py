@@ -0,0 +1,263 @@
+"""
+Reproducible mixed-workload benchmark for the API, with regression checks.
+
+Seeds DATABASE_URL with deterministic users and patients (topping up an
+existing benchmark database), then drives a weighted mix of list,
+search, detail, update, login and chat calls from concurrent clients.
+Each client draws its operations from its own seeded RNG, so a given
+--seed replays the same request sequence. Reports p50/p95/p99 latency
+and throughput per operation.
+
+By default the app runs in-process over ASGI, fully offline: the AI
+provider is forced to the mock and rate limiting is off. With --url it
+targets a live server instead (which should use the same database and
+AI_PROVIDER=mock, with rate limits raised).
+
+  DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.workload --patients 10000 --requests 5000
+  DATABASE_URL=... python -m benchmarks.workload --save-baseline benchmarks/baselines/sqlite-mixed-10k.json
+  DATABASE_URL=... python -m benchmarks.workload --baseline benchmarks/baselines/sqlite-mixed-10k.json --threshold 0.25
+
+With --baseline, the exit status is 1 if any operation's p95 grew, or its
+throughput fell, by more than --threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.load_test import percentile
+
+MIXES = {
+  "mixed": {"list": 25, "search": 20, "detail": 30, "update": 10, "login": 5, "chat": 10},
+  "read": {"list": 40, "search": 25, "detail": 35},
+  "write": {"update": 70, "detail": 30},
+  "auth": {"login": 100},
+  "chat": {"chat": 100},
+}
+
+CHAT_MESSAGES = [
+  "How often should I get a cleaning?",
+  "My gums bleed when I floss, is that normal?",
+  "What can I do about sensitive teeth?",
+  "Is it safe to whiten my teeth at home?",
+  "How long does a crown last?",
+]
+
+class Context:
+  def __init__(self, min_id: int, max_id: int, users: int, password: str):
+    self.min_id = min_id
+    self.max_id = max_id
+    self.users = users
+    self.password = password
+
+  def patient_id(self, rng: random.Random) -> int:
+    return rng.randint(self.min_id, self.max_id)
+
+async def op_list(client, headers, ctx, rng):
+  return await client.get("/api/patients/", params={"paginate": "cursor", "limit": 50, "view": "summary"}, headers=headers)
+
+async def op_search(client, headers, ctx, rng):
+  from benchmarks.data import LAST_NAMES
+  query = rng.choice(LAST_NAMES)[:rng.randint(2, 5)].lower()
+  return await client.get("/api/patients/search", params={"query": query, "mode": "prefix"}, headers=headers)
+
+async def op_detail(client, headers, ctx, rng):
+  return await client.get(f"/api/patients/{ctx.patient_id(rng)}", headers=headers)
+
+async def op_update(client, headers, ctx, rng):
+  phone = f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+  return await client.put(f"/api/patients/{ctx.patient_id(rng)}", json={"phone": phone}, headers=headers)
+
+async def op_login(client, headers, ctx, rng):
+  from benchmarks.data import user_email
+  return await client.post("/api/auth/login", json={"email": user_email(rng.randrange(ctx.users)), "password": ctx.password})
+
+async def op_chat(client, headers, ctx, rng):
+  message = f"{rng.choice(CHAT_MESSAGES)} ({rng.randrange(1_000_000)})"
+  return await client.post("/api/chat", json={"message": message, "patient_id": ctx.patient_id(rng)}, headers=headers)
+
+OPERATIONS = {
+  "list": op_list,
+  "search": op_search,
+  "detail": op_detail,
+  "update": op_update,
+  "login": op_login,
+  "chat": op_chat,
+}
+
+async def login(client, ctx, index: int) -> dict:
+  from benchmarks.data import user_email
+  response = await client.post("/api/auth/login", json={"email": user_email(index % ctx.users), "password": ctx.password})
+  response.raise_for_status()
+  return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def client_loop(client, ctx, mix: dict, count: int, seed: int, headers: dict, samples: dict, errors: dict):
+  rng = random.Random(seed)
+  names = list(mix)
+  weights = [mix[name] for name in names]
+  for name in rng.choices(names, weights, k=count):
+    start = time.perf_counter()
+    try:
+      response = await OPERATIONS[name](client, headers, ctx, rng)
+      failed = response.status_code >= 400
+    except httpx.HTTPError:
+      failed = True
+    if samples is not None:
+      samples[name].append(time.perf_counter() - start)
+      if failed:
+        errors[name] += 1
+
+async def drive(client, ctx, args) -> dict:
+  mix = MIXES[args.mix]
+  headers = [await login(client, ctx, index) for index in range(args.concurrency)]
+  if args.warmup:
+    await asyncio.gather(*[
+      client_loop(client, ctx, mix, args.warmup, args.seed - 1 - index, headers[index], None, None)
+      for index in range(args.concurrency)
+    ])
+
+  samples = {name: [] for name in mix}
+  errors = {name: 0 for name in mix}
+  per_client = max(1, args.requests // args.concurrency)
+  start = time.perf_counter()
+  await asyncio.gather(*[
+    client_loop(client, ctx, mix, per_client, args.seed + index, headers[index], samples, errors)
+    for index in range(args.concurrency)
+  ])
+  elapsed = time.perf_counter() - start
+
+  def summarize(latencies: list, error_count: int) -> dict:
+    return {
+      "count": len(latencies),
+      "errors": error_count,
+      "rps": len(latencies) / elapsed,
+      "mean_ms": statistics.mean(latencies) * 1000,
+      "p50_ms": percentile(latencies, 50) * 1000,
+      "p95_ms": percentile(latencies, 95) * 1000,
+      "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+  operations = {name: summarize(samples[name], errors[name]) for name in mix if samples[name]}
+  every = [latency for name in mix for latency in samples[name]]
+  return {
+    "config": {
+      "mix": args.mix,
+      "patients": args.patients,
+      "users": args.users,
+      "concurrency": args.concurrency,
+      "requests": len(every),
+      "seed": args.seed,
+      "target": args.url or "in-process",
+      "database": args.database_dialect,
+    },
+    "overall": summarize(every, sum(errors.values())),
+    "operations": operations,
+  }
+
+async def prepare(args) -> Context:
+  from sqlalchemy import func, select
+
+  from benchmarks.data import ensure_patients, seed_users
+  from src.database import engine, init_db
+  from src.models import Patient
+
+  args.database_dialect = engine.dialect.name
+  if not args.no_create:
+    await init_db()
+  print(f"Seeding up to {args.patients} patients and {args.users} users...")
+  await ensure_patients(engine, args.patients, seed=args.seed)
+  await seed_users(engine, args.users, args.password)
+  async with engine.connect() as conn:
+    min_id, max_id = (await conn.execute(select(func.min(Patient.id), func.max(Patient.id)))).one()
+  return Context(min_id, max_id, args.users, args.password)
+
+async def run(args) -> dict:
+  ctx = await prepare(args)
+  limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+  if args.url:
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+      return await drive(client, ctx, args)
+
+  from src.main import app
+  await app.router._startup()
+  try:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+      return await drive(client, ctx, args)
+  finally:
+    await app.router._shutdown()
+
+def print_report(results: dict):
+  config = results["config"]
+  print(f"{config['mix']} mix, {config['requests']} requests, concurrency {config['concurrency']}, "
+        f"{config['patients']} patients on {config['database']} ({config['target']})")
+  print(f"{'operation':<10}{'count':>8}{'errors':>8}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+  for name, stats in [*results["operations"].items(), ("overall", results["overall"])]:
+    print(f"{name:<10}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>10.1f}"
+          f"{stats['p50_ms']:>8.1f}ms{stats['p95_ms']:>8.1f}ms{stats['p99_ms']:>8.1f}ms")
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+  """Operations whose p95 rose, or whose throughput fell, by more than threshold."""
+  for key in ("mix", "patients", "concurrency", "database"):
+    if baseline["config"].get(key) != results["config"].get(key):
+      print(f"Warning: baseline {key} is {baseline['config'].get(key)!r}, this run used {results['config'].get(key)!r}")
+  regressions = []
+  for name, stats in [*results["operations"].items(), ("overall", results["overall"])]:
+    base = baseline["operations"].get(name) if name != "overall" else baseline["overall"]
+    if base is None:
+      continue
+    if stats["p95_ms"] > base["p95_ms"] * (1 + threshold):
+      regressions.append(f"{name}: p95 {base['p95_ms']:.1f}ms -> {stats['p95_ms']:.1f}ms")
+    if stats["rps"] < base["rps"] * (1 - threshold):
+      regressions.append(f"{name}: throughput {base['rps']:.1f} -> {stats['rps']:.1f} req/s")
+  return regressions
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+  parser.add_argument("--patients", type=int, default=10000)
+  parser.add_argument("--users", type=int, default=50)
+  parser.add_argument("--password", default="benchmark-password")
+  parser.add_argument("--requests", type=int, default=5000)
+  parser.add_argument("--concurrency", type=int, default=20)
+  parser.add_argument("--warmup", type=int, default=10, help="unrecorded requests per client first")
+  parser.add_argument("--seed", type=int, default=42)
+  parser.add_argument("--url", help="benchmark a live server instead of the in-process app")
+  parser.add_argument("--no-create", action="store_true", help="don't create tables; the schema is already migrated")
+  parser.add_argument("--output", help="write the results as JSON")
+  parser.add_argument("--save-baseline", help="write the results as a new baseline")
+  parser.add_argument("--baseline", help="compare against this baseline file")
+  parser.add_argument("--threshold", type=float, default=0.2)
+  args = parser.parse_args()
+
+  if not args.url:
+    # Offline and unthrottled: set before src is first imported
+    os.environ["AI_PROVIDER"] = "mock"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+  results = asyncio.run(run(args))
+  print_report(results)
+  for path in (args.output, args.save_baseline):
+    if path:
+      os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+      with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      regressions = compare(results, json.load(f), args.threshold)
+    if regressions:
+      print(f"Regressions beyond {args.threshold:.0%}:")
+      for line in regressions:
+        print(f"  {line}")
+      sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,51 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine, pool
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+from src.database import Base
+from src import models  # noqa: F401  (registers tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+  fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def get_url() -> str:
+  # Migrations run on the synchronous driver
+  url = os.getenv("DATABASE_URL")
+  if url.startswith("postgres://"):
+    url = "postgresql://" + url[len("postgres://"):]
+  return url
+
+def get_connect_args(url: str) -> dict:
+  if url.startswith("postgresql"):
+    return {"sslmode": os.getenv("DATABASE_SSLMODE", "require")}
+  return {}
+
+def run_migrations_offline():
+  context.configure(
+    url=get_url(),
+    target_metadata=target_metadata,
+    literal_binds=True,
+    dialect_opts={"paramstyle": "named"},
+  )
+  with context.begin_transaction():
+    context.run_migrations()
+
+def run_migrations_online():
+  url = get_url()
+  connectable = create_engine(url, connect_args=get_connect_args(url), poolclass=pool.NullPool)
+  with connectable.connect() as connection:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+      context.run_migrations()
+
+if context.is_offline_mode():
+  run_migrations_offline()
+else:
+  run_migrations_online()
@@ -0,0 +1,52 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases created by the old startup create_all() already have these
+tables; mark them with `alembic stamp 0001` instead of upgrading. The
+patient list index is left to 0007, which such databases may lack.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    "users",
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("email", sa.String(), nullable=False),
+    sa.Column("hashed_password", sa.String(), nullable=False),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+  )
+  op.create_index("ix_users_id", "users", ["id"])
+  op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+  op.create_table(
+    "patients",
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("first_name", sa.String(), nullable=False),
+    sa.Column("last_name", sa.String(), nullable=False),
+    sa.Column("email", sa.String()),
+    sa.Column("phone", sa.String()),
+    sa.Column("date_of_birth", sa.Date()),
+    sa.Column("address", sa.Text()),
+    sa.Column("medical_history", sa.Text()),
+    sa.Column("dental_history", sa.Text()),
+    sa.Column("allergies", sa.Text()),
+    sa.Column("emergency_contact", sa.String()),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+  )
+  op.create_index("ix_patients_id", "patients", ["id"])
+  op.create_index("ix_patients_email", "patients", ["email"], unique=True)
+
+def downgrade():
+  op.drop_table("patients")
+  op.drop_table("users")
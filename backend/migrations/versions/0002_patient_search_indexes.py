@@ -0,0 +1,45 @@
+"""patient search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Trigram GIN indexes serve substring search (LIKE '%q%') on names, email
+and phone digits; lower() text_pattern_ops btrees serve prefix search.
+The expressions must match src/search.py. Postgres only; SQLite falls
+back to scanning.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = {
+  "ix_patients_first_name_trgm": "lower(first_name) gin_trgm_ops",
+  "ix_patients_last_name_trgm": "lower(last_name) gin_trgm_ops",
+  "ix_patients_email_trgm": "lower(email) gin_trgm_ops",
+  "ix_patients_phone_digits_trgm": "regexp_replace(phone, '\\D', '', 'g') gin_trgm_ops",
+}
+
+PREFIX_INDEXES = {
+  "ix_patients_first_name_prefix": "lower(first_name) text_pattern_ops",
+  "ix_patients_last_name_prefix": "lower(last_name) text_pattern_ops",
+  "ix_patients_email_prefix": "lower(email) text_pattern_ops",
+}
+
+def upgrade():
+  if op.get_bind().dialect.name != "postgresql":
+    return
+  op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+  for name, expression in TRIGRAM_INDEXES.items():
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON patients USING gin ({expression})")
+  for name, expression in PREFIX_INDEXES.items():
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON patients ({expression})")
+
+def downgrade():
+  if op.get_bind().dialect.name != "postgresql":
+    return
+  for name in [*TRIGRAM_INDEXES, *PREFIX_INDEXES]:
+    op.execute(f"DROP INDEX IF EXISTS {name}")
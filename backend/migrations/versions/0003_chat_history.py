@@ -0,0 +1,41 @@
+"""chat history
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Conversations per user (and optionally patient), and an append-only
+messages table read by (conversation_id, created_at).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    "conversations",
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id", ondelete="CASCADE")),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+  )
+  op.create_index("ix_conversations_id", "conversations", ["id"])
+  op.create_index("ix_conversations_user_patient", "conversations", ["user_id", "patient_id"])
+
+  op.create_table(
+    "messages",
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False),
+    sa.Column("role", sa.String(), nullable=False),
+    sa.Column("content", sa.Text(), nullable=False),
+    sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+  )
+  op.create_index("ix_messages_conversation_created", "messages", ["conversation_id", "created_at", "id"])
+
+def downgrade():
+  op.drop_table("messages")
+  op.drop_table("conversations")
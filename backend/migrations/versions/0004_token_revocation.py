@@ -0,0 +1,39 @@
+"""refresh tokens and token revocation
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.create_table(
+    "refresh_tokens",
+    sa.Column("id", sa.Integer(), primary_key=True),
+    sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    sa.Column("token_hash", sa.String(64), nullable=False, unique=True),
+    sa.Column("session_id", sa.String(), nullable=False),
+    sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    sa.Column("revoked_at", sa.DateTime(timezone=True)),
+  )
+  op.create_index("ix_refresh_tokens_session_id", "refresh_tokens", ["session_id"])
+
+  op.create_table(
+    "revoked_tokens",
+    sa.Column("id", sa.String(), primary_key=True),
+    sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=False),
+  )
+  op.create_index("ix_revoked_tokens_expires_at", "revoked_tokens", ["expires_at"])
+  op.create_index("ix_revoked_tokens_revoked_at", "revoked_tokens", ["revoked_at"])
+
+def downgrade():
+  op.drop_table("revoked_tokens")
+  op.drop_table("refresh_tokens")
@@ -0,0 +1,20 @@
+"""patient version column for optimistic concurrency
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.add_column("patients", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+def downgrade():
+  with op.batch_alter_table("patients") as batch_op:
+    batch_op.drop_column("version")
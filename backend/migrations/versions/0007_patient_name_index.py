@@ -0,0 +1,22 @@
+"""patient list ordering index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Serves keyset pagination on (last_name, first_name, id). It used to be
+created by 0001, but databases stamped at 0001 after the old create_all()
+don't have it, so it is created here only if missing.
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+  op.execute("CREATE INDEX IF NOT EXISTS ix_patients_name_id ON patients (last_name, first_name, id)")
+
+def downgrade():
+  op.execute("DROP INDEX IF EXISTS ix_patients_name_id")
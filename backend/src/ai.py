@@ -1,86 +1,248 @@
-# Option 1: Dummy reply (no external API)
+from typing import AsyncIterator, List, Optional
+import json
+import os
+import time
+
+from src.ai_cache import ResponseCache
+from src.metrics import ai_errors, ai_latency
+from src.ai_providers import (
+  AIProvider,
+  CircuitBreaker,
+  CircuitOpen,
+  MicroBatcher,
+  MockProvider,
+  OpenAIProvider,
+  ProviderError,
+  ResilientAIClient,
+  split_tokens,
+)
+
+# Config
+AI_PROVIDER = os.getenv("AI_PROVIDER", "mock")  # "mock" or "openai"
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+AI_MODEL = os.getenv("AI_MODEL", "gpt-4")
+AI_MAX_TOKENS = int(os.getenv("AI_MAX_TOKENS", "150"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "16"))
+AI_TIMEOUT_S = float(os.getenv("AI_TIMEOUT_S", "15"))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+AI_RETRY_BASE_MS = float(os.getenv("AI_RETRY_BASE_MS", "200"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_S = float(os.getenv("AI_BREAKER_RESET_S", "30"))
+
+# Micro-batching of concurrent non-streaming completions, for providers
+# that support batched calls
+AI_BATCH_ENABLED = os.getenv("AI_BATCH_ENABLED", "false").lower() == "true"
+AI_BATCH_WINDOW_MS = float(os.getenv("AI_BATCH_WINDOW_MS", "15"))
+AI_BATCH_MAX_SIZE = int(os.getenv("AI_BATCH_MAX_SIZE", "16"))
+
+# Response cache. The similarity tier is off unless a threshold is set.
+AI_CACHE_ENABLED = os.getenv("AI_CACHE_ENABLED", "true").lower() == "true"
+AI_CACHE_TTL_S = float(os.getenv("AI_CACHE_TTL_S", "3600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "5000"))
+AI_CACHE_MAX_MB = float(os.getenv("AI_CACHE_MAX_MB", "32"))
+AI_CACHE_SIMILARITY_THRESHOLD = os.getenv("AI_CACHE_SIMILARITY_THRESHOLD")  # e.g. 0.92
+
+# Mock provider tuning, so latency and failures can be simulated
+# offline. All default to 0 (instant, never fails).
+AI_MOCK_LATENCY_MS = float(os.getenv("AI_MOCK_LATENCY_MS", "0"))
+AI_MOCK_JITTER_MS = float(os.getenv("AI_MOCK_JITTER_MS", "0"))
+AI_MOCK_TOKEN_MS = float(os.getenv("AI_MOCK_TOKEN_MS", "0"))
+AI_MOCK_FAILURE_RATE = float(os.getenv("AI_MOCK_FAILURE_RATE", "0"))
+AI_MOCK_BATCH_ITEM_MS = float(os.getenv("AI_MOCK_BATCH_ITEM_MS", "0"))
+
+DENTAL_SYSTEM_PROMPT = """
+You are a helpful AI assistant for a dental clinic. You provide general dental health information and guidance to patients. 
+
+Important guidelines:
+- Always remind users that your advice is for informational purposes only
+- Encourage users to consult with their dental professional for specific medical advice
+- Be empathetic and understanding about dental anxiety
+- Provide helpful, accurate information about common dental procedures and oral health
+- If asked about specific medical conditions or treatments, recommend consulting with a dentist
+- Keep responses concise but informative
+- Use a friendly, professional tone
+
+You should help with:
+- General oral hygiene tips
+- Information about common dental procedures
+- Addressing dental anxiety
+- Explaining dental terminology
+- Providing pre and post-treatment care instructions
+- Scheduling and appointment-related questions
+"""
+
+# Dummy reply used by the mock provider (no external API)
 def generate_ai_response(message: str) -> str:
   # Basic prompt engineering mock
   return f"You asked: '{message}'. This is a sample AI reply."
 
-# Option 2: Use OpenAI (if you have an API key)
-# import openai
-# import os
-# from typing import Optional
-
-# # Set OpenAI API key
-# openai.api_key = os.getenv("OPENAI_API_KEY")
-
-# DENTAL_SYSTEM_PROMPT = """
-# You are a helpful AI assistant for a dental clinic. You provide general dental health information and guidance to patients. 
-
-# Important guidelines:
-# - Always remind users that your advice is for informational purposes only
-# - Encourage users to consult with their dental professional for specific medical advice
-# - Be empathetic and understanding about dental anxiety
-# - Provide helpful, accurate information about common dental procedures and oral health
-# - If asked about specific medical conditions or treatments, recommend consulting with a dentist
-# - Keep responses concise but informative
-# - Use a friendly, professional tone
-
-# You should help with:
-# - General oral hygiene tips
-# - Information about common dental procedures
-# - Addressing dental anxiety
-# - Explaining dental terminology
-# - Providing pre and post-treatment care instructions
-# - Scheduling and appointment-related questions
-# """
-
-# async def get_ai_response(message: str, patient_context: Optional[str] = None) -> str:
-#   """
-#   Generate AI response using OpenAI API with dental clinic context
-#   """
-#   try:
-#     # Prepare the prompt with context
-#     user_prompt = message
-#     if patient_context:
-#       user_prompt = f"Patient context: {patient_context}\n\nQuestion: {message}"
-
-#     # Call OpenAI API
-#     response = await openai.chat.completions.create(
-#       model="gpt-4",
-#       messages=[
-#         {"role": "system", "content": DENTAL_SYSTEM_PROMPT},
-#         {"role": "user", "content": user_prompt}
-#       ],
-#       max_tokens=150,  # Limit response length
-#       temperature=0.7,  # Control randomness
-#       top_p=1.0,  # Use nucleus sampling
-#       frequency_penalty=0.0,  # No penalty for repeated phrases
-#       presence_penalty=0.0  # No penalty for new topics
-#     )
-    
-#     return response.choices[0].message.content.strip()
-  
-#   except Exception as e:
-#     print(f"OpenAI API error: {e}")
-#     # Fallback response
-#     return generate_fallback_response(message)
-
-# def generate_fallback_response(message: str) -> str:
-#   """
-#   Generate a fallback response when OpenAI API is not available
-#   """
-#   message_lower = message.lower()
+def build_messages(message: str, patient_context: Optional[str] = None, history: Optional[List[dict]] = None) -> list:
+  # Prepare the prompt with context and any earlier turns of the conversation
+  user_prompt = message
+  if patient_context:
+    user_prompt = f"Patient context: {patient_context}\n\nQuestion: {message}"
+  return [
+    {"role": "system", "content": DENTAL_SYSTEM_PROMPT},
+    *(history or []),
+    {"role": "user", "content": user_prompt},
+  ]
+
+def cache_context(patient_context: Optional[str], history: Optional[List[dict]]) -> Optional[str]:
+  # A reply depends on the earlier turns too, so they are part of the cache key
+  if not history:
+    return patient_context
+  return f"{patient_context or ''}\0{json.dumps(history)}"
+
+def create_provider(name: str) -> AIProvider:
+  if name == "openai":
+    return OpenAIProvider(api_key=OPENAI_API_KEY, model=AI_MODEL, max_tokens=AI_MAX_TOKENS, max_connections=AI_MAX_CONCURRENCY)
+  if name == "mock":
+    return MockProvider(
+      # The mock only sees the user prompt, so echo the question itself
+      reply_fn=lambda prompt: generate_ai_response(prompt.rsplit("Question: ", 1)[-1]),
+      latency_ms=AI_MOCK_LATENCY_MS,
+      jitter_ms=AI_MOCK_JITTER_MS,
+      token_ms=AI_MOCK_TOKEN_MS,
+      failure_rate=AI_MOCK_FAILURE_RATE,
+      batch_item_ms=AI_MOCK_BATCH_ITEM_MS,
+    )
+  raise ValueError(f"Unknown AI provider: {name}")
+
+ai_client = ResilientAIClient(
+  create_provider(AI_PROVIDER),
+  max_concurrency=AI_MAX_CONCURRENCY,
+  timeout=AI_TIMEOUT_S,
+  max_retries=AI_MAX_RETRIES,
+  retry_base=AI_RETRY_BASE_MS / 1000,
+  breaker=CircuitBreaker(failure_threshold=AI_BREAKER_FAILURES, reset_timeout=AI_BREAKER_RESET_S),
+)
+ai_stats = {"fallbacks": 0}
+
+batcher = MicroBatcher(
+  ai_client.complete_batch,
+  window_ms=AI_BATCH_WINDOW_MS,
+  max_batch_size=AI_BATCH_MAX_SIZE,
+) if AI_BATCH_ENABLED and ai_client.provider.supports_batching else None
+
+response_cache = ResponseCache(
+  ttl=AI_CACHE_TTL_S,
+  max_entries=AI_CACHE_MAX_ENTRIES,
+  max_bytes=int(AI_CACHE_MAX_MB * 1024 * 1024),
+  similarity_threshold=float(AI_CACHE_SIMILARITY_THRESHOLD) if AI_CACHE_SIMILARITY_THRESHOLD else None,
+) if AI_CACHE_ENABLED else None
+
+async def get_ai_response(
+  message: str,
+  patient_context: Optional[str] = None,
+  history: Optional[List[dict]] = None,
+  user: Optional[str] = None,
+) -> str:
+  """
+  Generate AI response with dental clinic context, falling back to the
+  keyword responses when the provider is failing, slow or short-circuited.
+  `user` scopes similar-question cache hits to the asking user.
+  """
+  context_key = cache_context(patient_context, history)
+  if response_cache is not None:
+    cached = response_cache.get(message, context_key, user)
+    if cached is not None:
+      return cached
+  started = time.perf_counter()
+  try:
+    messages = build_messages(message, patient_context, history)
+    if batcher is not None:
+      response = await batcher.submit(messages)
+    else:
+      response = await ai_client.complete(messages)
+  except (CircuitOpen, ProviderError, TimeoutError) as e:
+    ai_latency.observe(time.perf_counter() - started, "complete", "error")
+    ai_errors.inc("complete", type(e).__name__)
+    print(f"AI provider unavailable ({type(e).__name__}): {e}")
+    ai_stats["fallbacks"] += 1
+    return generate_fallback_response(message)
+  ai_latency.observe(time.perf_counter() - started, "complete", "ok")
+  if response_cache is not None:
+    response_cache.set(message, context_key, response, user)
+  return response
+
+async def stream_ai_response(
+  message: str,
+  patient_context: Optional[str] = None,
+  history: Optional[List[dict]] = None,
+  user: Optional[str] = None,
+) -> AsyncIterator[str]:
+  """
+  Yield the reply in chunks as the model produces them.
+
+  This is a pull-based async generator: the next chunk is only requested
+  once the previous one has been written to the client, so a slow reader
+  slows the model down instead of buffering. Closing the generator (for
+  example on client disconnect) cancels the upstream request. Failures
+  before the first chunk fall back like get_ai_response; failures after
+  it are raised, since part of the reply has already been sent.
+  """
+  context_key = cache_context(patient_context, history)
+  if response_cache is not None:
+    cached = response_cache.get(message, context_key, user)
+    if cached is not None:
+      for token in split_tokens(cached):
+        yield token
+      return
+
+  tokens = ai_client.stream(build_messages(message, patient_context, history))
+  chunks = []
+  started = False
+  started_at = time.perf_counter()
+  try:
+    async for token in tokens:
+      started = True
+      chunks.append(token)
+      yield token
+    ai_latency.observe(time.perf_counter() - started_at, "stream", "ok")
+    # Only complete replies from the provider are cached, never fallbacks
+    if response_cache is not None:
+      response_cache.set(message, context_key, "".join(chunks), user)
+  except (CircuitOpen, ProviderError, TimeoutError) as e:
+    ai_latency.observe(time.perf_counter() - started_at, "stream", "error")
+    ai_errors.inc("stream", type(e).__name__)
+    if started:
+      raise
+    print(f"AI provider unavailable ({type(e).__name__}): {e}")
+    ai_stats["fallbacks"] += 1
+    for token in split_tokens(generate_fallback_response(message)):
+      yield token
+  finally:
+    await tokens.aclose()
+
+def get_ai_stats() -> dict:
+  stats = {**ai_client.stats(), **ai_stats}
+  if response_cache is not None:
+    stats["cache"] = response_cache.stats()
+  if batcher is not None:
+    stats["batching"] = batcher.stats()
+  return stats
+
+async def close_ai_client():
+  await ai_client.aclose()
+
+def generate_fallback_response(message: str) -> str:
+  """
+  Generate a fallback response when OpenAI API is not available
+  """
+  message_lower = message.lower()
     
-#   # Simple keyword-based responses
-#   if any(word in message_lower for word in ['pain', 'hurt', 'ache']):
-#       return "I understand you're experiencing discomfort. For any dental pain, it's important to contact your dentist as soon as possible. In the meantime, you can try rinsing with warm salt water and taking over-the-counter pain medication as directed. Please remember this is general advice - your dentist can provide specific treatment for your situation."
+  # Simple keyword-based responses
+  if any(word in message_lower for word in ['pain', 'hurt', 'ache']):
+      return "I understand you're experiencing discomfort. For any dental pain, it's important to contact your dentist as soon as possible. In the meantime, you can try rinsing with warm salt water and taking over-the-counter pain medication as directed. Please remember this is general advice - your dentist can provide specific treatment for your situation."
   
-#   elif any(word in message_lower for word in ['appointment', 'schedule', 'booking']):
-#       return "For appointment scheduling, please contact our office directly. Our staff can help you find a convenient time and answer any questions about your upcoming visit. If you have specific concerns about your appointment, feel free to discuss them with our team."
+  elif any(word in message_lower for word in ['appointment', 'schedule', 'booking']):
+      return "For appointment scheduling, please contact our office directly. Our staff can help you find a convenient time and answer any questions about your upcoming visit. If you have specific concerns about your appointment, feel free to discuss them with our team."
   
-#   elif any(word in message_lower for word in ['cleaning', 'hygiene', 'brush']):
-#       return "Great question about oral hygiene! Regular brushing twice daily with fluoride toothpaste, daily flossing, and routine dental cleanings are essential for maintaining good oral health. Your dental hygienist can provide personalized tips during your next visit."
+  elif any(word in message_lower for word in ['cleaning', 'hygiene', 'brush']):
+      return "Great question about oral hygiene! Regular brushing twice daily with fluoride toothpaste, daily flossing, and routine dental cleanings are essential for maintaining good oral health. Your dental hygienist can provide personalized tips during your next visit."
   
-#   elif any(word in message_lower for word in ['anxiety', 'nervous', 'scared']):
-#       return "It's completely normal to feel anxious about dental visits. Many patients share these feelings. Our team is experienced in helping patients feel comfortable and relaxed. Please let us know about your concerns so we can make your visit as pleasant as possible."
+  elif any(word in message_lower for word in ['anxiety', 'nervous', 'scared']):
+      return "It's completely normal to feel anxious about dental visits. Many patients share these feelings. Our team is experienced in helping patients feel comfortable and relaxed. Please let us know about your concerns so we can make your visit as pleasant as possible."
   
-#   else:
-#       return "Thank you for your question. While I'd love to help, I recommend discussing this with your dental professional who can provide personalized advice based on your specific situation. Our team is always here to help address your concerns during your visit."
\ No newline at end of file
+  else:
+      return "Thank you for your question. While I'd love to help, I recommend discussing this with your dental professional who can provide personalized advice based on your specific situation. Our team is always here to help address your concerns during your visit."
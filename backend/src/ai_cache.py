@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import hashlib
+import re
+import time
+
+# Only the similarity tier needs numpy, so it is imported on first use
+np = None
+
+def _load_numpy():
+  global np
+  if np is None:
+    try:
+      import numpy
+    except ImportError as e:
+      raise RuntimeError("The similarity cache requires numpy") from e
+    np = numpy
+
+def normalize_message(message: str) -> str:
+  message = re.sub(r"[^\w\s]", " ", message.lower())
+  return " ".join(message.split())
+
+def hash_context(patient_context: Optional[str]) -> str:
+  return hashlib.sha256((patient_context or "").encode()).hexdigest()
+
+def _feature_index(feature: str, dim: int):
+  digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+  return digest % dim, 1.0 if digest >> 63 else -1.0
+
+class HashingEmbedder:
+  """
+  Local text embedding: words, word bigrams and character trigrams
+  hashed into a fixed-size, L2-normalized vector. Cheap and
+  deterministic; good enough to match rephrasings of the same question.
+  """
+
+  def __init__(self, dim: int = 512):
+    _load_numpy()
+    self.dim = dim
+
+  def __call__(self, text: str):
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+      padded = f"#{word}#"
+      features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    vector = np.zeros(self.dim, dtype=np.float32)
+    for feature in features:
+      index, sign = _feature_index(feature, self.dim)
+      vector[index] += sign
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class VectorIndex:
+  """Brute-force cosine index over a growable NumPy matrix."""
+
+  def __init__(self, dim: int, capacity: int = 16):
+    _load_numpy()
+    self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+    self._keys = []
+    self._rows: Dict[str, int] = {}
+
+  def __len__(self):
+    return len(self._keys)
+
+  def add(self, key: str, vector):
+    if key in self._rows:
+      self._vectors[self._rows[key]] = vector
+      return
+    if len(self._keys) == len(self._vectors):
+      self._vectors = np.concatenate([self._vectors, np.zeros_like(self._vectors)])
+    self._rows[key] = len(self._keys)
+    self._vectors[len(self._keys)] = vector
+    self._keys.append(key)
+
+  def remove(self, key: str):
+    row = self._rows.pop(key, None)
+    if row is None:
+      return
+    # Swap the last row into the hole
+    last = len(self._keys) - 1
+    if row != last:
+      self._vectors[row] = self._vectors[last]
+      self._keys[row] = self._keys[last]
+      self._rows[self._keys[row]] = row
+    self._keys.pop()
+
+  def nearest(self, vector):
+    if not self._keys:
+      return None, 0.0
+    scores = self._vectors[:len(self._keys)] @ vector
+    row = int(np.argmax(scores))
+    return self._keys[row], float(scores[row])
+
+class ResponseCache:
+  """
+  Cache of assistant replies in front of the AI provider.
+
+  The exact tier is keyed on the normalized message plus a hash of the
+  patient context. The optional similarity tier looks for a close
+  rephrasing, but only among entries from the same user with the same
+  patient-context hash: one index per (user, context), so a reply
+  generated with one patient's context can never be served to a request
+  with another's, and a reply about a patient named in one user's
+  question can't answer a different user's near-identical one.
+  """
+
+  def __init__(
+    self,
+    ttl: float = 3600.0,
+    max_entries: int = 5000,
+    max_bytes: int = 32 * 1024 * 1024,
+    similarity_threshold: Optional[float] = None,
+    embedder: Optional[Callable] = None,
+  ):
+    self.ttl = ttl
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.similarity_threshold = similarity_threshold
+    self.embedder = embedder or (HashingEmbedder() if similarity_threshold is not None else None)
+    # key -> (expires_at, response, index key, size)
+    self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+    self._indexes: Dict[str, VectorIndex] = {}
+    self.bytes = 0
+    self.exact_hits = 0
+    self.similar_hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  @staticmethod
+  def _key(normalized: str, context_hash: str) -> str:
+    return hashlib.sha256(f"{context_hash}\0{normalized}".encode()).hexdigest()
+
+  @staticmethod
+  def _index_key(context_hash: str, user: Optional[str]) -> str:
+    return f"{user or ''}\0{context_hash}"
+
+  def _live(self, key: str) -> Optional[tuple]:
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+    if entry[0] <= time.monotonic():
+      self._remove(key)
+      self.expirations += 1
+      return None
+    return entry
+
+  def _remove(self, key: str):
+    entry = self._entries.pop(key, None)
+    if entry is None:
+      return
+    self.bytes -= entry[3]
+    index = self._indexes.get(entry[2])
+    if index is not None:
+      index.remove(key)
+      if not len(index):
+        del self._indexes[entry[2]]
+
+  def get(self, message: str, patient_context: Optional[str] = None, user: Optional[str] = None) -> Optional[str]:
+    normalized = normalize_message(message)
+    context_hash = hash_context(patient_context)
+    key = self._key(normalized, context_hash)
+
+    entry = self._live(key)
+    if entry is not None:
+      self._entries.move_to_end(key)
+      self.exact_hits += 1
+      return entry[1]
+
+    index = self._indexes.get(self._index_key(context_hash, user)) if self.embedder is not None else None
+    if index is not None:
+      match, score = index.nearest(self.embedder(normalized))
+      if match is not None and score >= self.similarity_threshold:
+        entry = self._live(match)
+        if entry is not None:
+          self._entries.move_to_end(match)
+          self.similar_hits += 1
+          return entry[1]
+
+    self.misses += 1
+    return None
+
+  def set(self, message: str, patient_context: Optional[str], response: str, user: Optional[str] = None):
+    if self.max_entries <= 0:
+      return
+    normalized = normalize_message(message)
+    context_hash = hash_context(patient_context)
+    key = self._key(normalized, context_hash)
+    index_key = self._index_key(context_hash, user)
+    self._remove(key)
+
+    size = len(key) + len(response.encode())
+    if self.embedder is not None:
+      size += self.embedder.dim * 4
+    self._entries[key] = (time.monotonic() + self.ttl, response, index_key, size)
+    self.bytes += size
+    if self.embedder is not None:
+      index = self._indexes.get(index_key)
+      if index is None:
+        index = self._indexes[index_key] = VectorIndex(self.embedder.dim)
+      index.add(key, self.embedder(normalized))
+
+    while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+      oldest = next(iter(self._entries))
+      self._remove(oldest)
+      self.evictions += 1
+
+  def clear(self):
+    self._entries.clear()
+    self._indexes.clear()
+    self.bytes = 0
+
+  def stats(self) -> dict:
+    lookups = self.exact_hits + self.similar_hits + self.misses
+    return {
+      "entries": len(self._entries),
+      "bytes": self.bytes,
+      "max_entries": self.max_entries,
+      "max_bytes": self.max_bytes,
+      "similarity": self.embedder is not None,
+      "exact_hits": self.exact_hits,
+      "similar_hits": self.similar_hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "expirations": self.expirations,
+      "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+    }
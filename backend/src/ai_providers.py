@@ -0,0 +1,488 @@
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Union
+import asyncio
+import random
+import re
+import time
+
+
+Messages = List[dict]
+
+class ProviderError(Exception):
+  """An upstream AI provider call failed and may be retried."""
+
+class BatchItemsFailed(ProviderError):
+  """Some prompts in a batch failed. Raised so only those are retried."""
+
+  def __init__(self, failed: int, total: int):
+    super().__init__(f"{failed} of {total} batch items failed")
+    # A batch counts against the breaker only when most of it failed;
+    # one prompt the upstream keeps rejecting says little about its health
+    self.upstream_failure = failed * 2 > total
+
+class CircuitOpen(Exception):
+  """The circuit breaker is open; the provider is not being called."""
+
+class AIProvider:
+  """
+  Interface for chat completion backends. Providers only talk to the
+  upstream; concurrency limits, deadlines, retries and the circuit
+  breaker live in ResilientAIClient.
+  """
+
+  name = "base"
+  # Providers that can answer several prompts in one upstream call set
+  # this and implement complete_batch
+  supports_batching = False
+
+  async def complete(self, messages: Messages) -> str:
+    raise NotImplementedError
+
+  async def complete_batch(self, batch: List[Messages]) -> List[Union[str, Exception]]:
+    """One result per prompt, in order; failed prompts get an exception instead of a reply."""
+    raise NotImplementedError
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    # Providers without native streaming yield the whole reply at once
+    yield await self.complete(messages)
+
+  async def aclose(self):
+    pass
+
+def split_tokens(text: str) -> List[str]:
+  return re.findall(r"\S+\s*", text)
+
+class MockProvider(AIProvider):
+  """
+  Local provider for development and load tests. Replies with the dummy
+  text from reply_fn after a tunable latency, and fails a tunable
+  fraction of calls.
+  """
+
+  name = "mock"
+  supports_batching = True
+
+  def __init__(
+    self,
+    reply_fn: Callable[[str], str],
+    latency_ms: float = 0,
+    jitter_ms: float = 0,
+    token_ms: float = 0,
+    failure_rate: float = 0.0,
+    batch_item_ms: float = 0,
+    seed: Optional[int] = None,
+  ):
+    self.reply_fn = reply_fn
+    self.batch_item_ms = batch_item_ms
+    self.latency_ms = latency_ms
+    self.jitter_ms = jitter_ms
+    self.token_ms = token_ms
+    self.failure_rate = failure_rate
+    self._random = random.Random(seed)
+
+  async def _first_token(self, messages: Messages) -> str:
+    delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+    await asyncio.sleep(delay / 1000)
+    if self._random.random() < self.failure_rate:
+      raise ProviderError("mock provider failure")
+    return self.reply_fn(messages[-1]["content"])
+
+  async def complete(self, messages: Messages) -> str:
+    reply = await self._first_token(messages)
+    tokens = split_tokens(reply)
+    await asyncio.sleep(self.token_ms * max(len(tokens) - 1, 0) / 1000)
+    return reply
+
+  async def complete_batch(self, batch: List[Messages]) -> List[Union[str, Exception]]:
+    # One round-trip for the whole batch, plus a small per-prompt cost
+    delay = self.latency_ms + self._random.uniform(0, self.jitter_ms) + self.batch_item_ms * len(batch)
+    await asyncio.sleep(delay / 1000)
+    return [
+      ProviderError("mock provider failure") if self._random.random() < self.failure_rate
+      else self.reply_fn(messages[-1]["content"])
+      for messages in batch
+    ]
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    reply = await self._first_token(messages)
+    for index, token in enumerate(split_tokens(reply)):
+      if index:
+        await asyncio.sleep(self.token_ms / 1000)
+      yield token
+
+class OpenAIProvider(AIProvider):
+  """Chat completions over the OpenAI API, sharing one pooled HTTP client."""
+
+  name = "openai"
+
+  def __init__(
+    self,
+    api_key: str,
+    model: str = "gpt-4",
+    max_tokens: int = 150,
+    max_connections: int = 32,
+  ):
+    from openai import AsyncOpenAI
+    import httpx
+
+    self.model = model
+    self.max_tokens = max_tokens
+    # One keep-alive pool for the whole process. Timeouts and retries
+    # are enforced by ResilientAIClient, so the SDK's are disabled.
+    self._http = httpx.AsyncClient(
+      limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+      timeout=None,
+    )
+    self._client = AsyncOpenAI(api_key=api_key, http_client=self._http, max_retries=0, timeout=None)
+
+  def _params(self, messages: Messages) -> dict:
+    return {
+      "model": self.model,
+      "messages": messages,
+      "max_tokens": self.max_tokens,  # Limit response length
+      "temperature": 0.7,  # Control randomness
+      "top_p": 1.0,  # Use nucleus sampling
+    }
+
+  async def complete(self, messages: Messages) -> str:
+    from openai import OpenAIError
+
+    try:
+      response = await self._client.chat.completions.create(**self._params(messages))
+    except OpenAIError as e:
+      raise ProviderError(str(e)) from e
+    return response.choices[0].message.content.strip()
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    from openai import OpenAIError
+
+    try:
+      response = await self._client.chat.completions.create(stream=True, **self._params(messages))
+      async for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+          yield chunk.choices[0].delta.content
+    except OpenAIError as e:
+      raise ProviderError(str(e)) from e
+
+  async def aclose(self):
+    await self._http.aclose()
+
+class CircuitBreaker:
+  """
+  Opens after failure_threshold consecutive failures and short-circuits
+  calls for reset_timeout seconds, then lets a single trial call through
+  (half-open) to decide whether to close again.
+  """
+
+  def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.failures = 0
+    self.opened_at: Optional[float] = None
+    self._trial_in_flight = False
+
+  @property
+  def state(self) -> str:
+    if self.opened_at is None:
+      return "closed"
+    if time.monotonic() - self.opened_at >= self.reset_timeout:
+      return "half_open"
+    return "open"
+
+  def allow(self) -> bool:
+    state = self.state
+    if state == "closed":
+      return True
+    if state == "half_open" and not self._trial_in_flight:
+      self._trial_in_flight = True
+      return True
+    return False
+
+  def record_success(self):
+    self.failures = 0
+    self.opened_at = None
+    self._trial_in_flight = False
+
+  def abandon(self):
+    # A trial call was cancelled before it could succeed or fail
+    self._trial_in_flight = False
+
+  def record_failure(self):
+    self.failures += 1
+    if self._trial_in_flight or self.failures >= self.failure_threshold:
+      self.opened_at = time.monotonic()
+    self._trial_in_flight = False
+
+class ResilientAIClient:
+  """
+  Wraps a provider with a per-process concurrency cap, an overall
+  deadline per call, jittered exponential retries and a circuit breaker.
+  Every failure path raises; callers choose the fallback.
+  """
+
+  def __init__(
+    self,
+    provider: AIProvider,
+    max_concurrency: int = 16,
+    timeout: float = 15.0,
+    max_retries: int = 2,
+    retry_base: float = 0.2,
+    breaker: Optional[CircuitBreaker] = None,
+  ):
+    self.provider = provider
+    self.timeout = timeout
+    self.max_retries = max_retries
+    self.retry_base = retry_base
+    self.breaker = breaker or CircuitBreaker()
+    self.max_concurrency = max_concurrency
+    self._semaphore = asyncio.Semaphore(max_concurrency)
+    self.in_flight = 0
+    self.calls = 0
+    self.errors = 0
+    self.timeouts = 0
+    self.queue_timeouts = 0
+    self.retries = 0
+    self.short_circuits = 0
+    self.total_latency = 0.0
+
+  def _backoff(self, attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, self.retry_base * (2 ** attempt))
+
+  def _check_breaker(self):
+    if not self.breaker.allow():
+      self.short_circuits += 1
+      raise CircuitOpen()
+
+  def _record_timeout(self, reached_provider: bool):
+    if reached_provider:
+      self.timeouts += 1
+      self.breaker.record_failure()
+    else:
+      # Timed out queueing for our own semaphore; not the upstream's fault
+      self.queue_timeouts += 1
+      self.breaker.abandon()
+
+  async def _run(self, call: Callable[[], Awaitable]):
+    self._check_breaker()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + self.timeout
+    self.calls += 1
+    start = time.perf_counter()
+    reached_provider = False
+    try:
+      async with asyncio.timeout_at(deadline):
+        async with self._semaphore:
+          reached_provider = True
+          self.in_flight += 1
+          try:
+            for attempt in range(self.max_retries + 1):
+              try:
+                result = await call()
+                self.breaker.record_success()
+                return result
+              except ProviderError:
+                self.errors += 1
+                if attempt == self.max_retries:
+                  raise
+                self.retries += 1
+                await asyncio.sleep(min(self._backoff(attempt), max(deadline - loop.time(), 0)))
+          finally:
+            self.in_flight -= 1
+    except TimeoutError:
+      self._record_timeout(reached_provider)
+      raise
+    except ProviderError as e:
+      if getattr(e, "upstream_failure", True):
+        self.breaker.record_failure()
+      else:
+        self.breaker.record_success()
+      raise
+    except (asyncio.CancelledError, GeneratorExit):
+      self.breaker.abandon()
+      raise
+    finally:
+      self.total_latency += time.perf_counter() - start
+
+  async def complete(self, messages: Messages) -> str:
+    return await self._run(lambda: self.provider.complete(messages))
+
+  async def complete_batch(self, batch: List[Messages]) -> List[Union[str, Exception]]:
+    # The batch is one upstream call, so it takes one concurrency slot
+    # and shares a deadline, retries and breaker accounting. Retries
+    # resend only the prompts that failed.
+    results: List[Union[str, Exception, None]] = [None] * len(batch)
+    pending = list(range(len(batch)))
+
+    async def call():
+      nonlocal pending
+      outcomes = await self.provider.complete_batch([batch[i] for i in pending])
+      for i, outcome in zip(pending, outcomes):
+        results[i] = outcome
+      pending = [i for i in pending if isinstance(results[i], ProviderError)]
+      if pending:
+        raise BatchItemsFailed(len(pending), len(batch))
+      return results
+
+    try:
+      return await self._run(call)
+    except BatchItemsFailed:
+      return results
+    except (ProviderError, TimeoutError) as e:
+      if len(pending) == len(batch):
+        raise
+      # A retry failed outright; keep the replies earlier attempts got
+      for i in pending:
+        results[i] = e
+      return results
+
+  async def stream(self, messages: Messages) -> AsyncIterator[str]:
+    """
+    Streams from the provider. Retries only happen before the first
+    token, since a partially delivered reply can't be taken back; the
+    deadline applies to the first token, and the same budget again to
+    each gap between tokens.
+    """
+    self._check_breaker()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + self.timeout
+    self.calls += 1
+    start = time.perf_counter()
+    reached_provider = False
+    try:
+      async with asyncio.timeout_at(deadline):
+        await self._semaphore.acquire()
+      reached_provider = True
+      self.in_flight += 1
+      try:
+        for attempt in range(self.max_retries + 1):
+          tokens = self.provider.stream(messages)
+          started = False
+          try:
+            while True:
+              async with asyncio.timeout_at(deadline):
+                try:
+                  token = await tokens.__anext__()
+                except StopAsyncIteration:
+                  break
+              started = True
+              deadline = loop.time() + self.timeout
+              yield token
+            self.breaker.record_success()
+            return
+          except ProviderError:
+            self.errors += 1
+            if started or attempt == self.max_retries:
+              raise
+            self.retries += 1
+            await asyncio.sleep(min(self._backoff(attempt), max(deadline - loop.time(), 0)))
+          finally:
+            await tokens.aclose()
+      finally:
+        self.in_flight -= 1
+        self._semaphore.release()
+    except TimeoutError:
+      self._record_timeout(reached_provider)
+      raise
+    except ProviderError:
+      self.breaker.record_failure()
+      raise
+    except (asyncio.CancelledError, GeneratorExit):
+      self.breaker.abandon()
+      raise
+    finally:
+      self.total_latency += time.perf_counter() - start
+
+  def stats(self) -> dict:
+    return {
+      "provider": self.provider.name,
+      "breaker_state": self.breaker.state,
+      "max_concurrency": self.max_concurrency,
+      "in_flight": self.in_flight,
+      "calls": self.calls,
+      "errors": self.errors,
+      "timeouts": self.timeouts,
+      "queue_timeouts": self.queue_timeouts,
+      "retries": self.retries,
+      "short_circuits": self.short_circuits,
+      "avg_latency_ms": (self.total_latency / self.calls * 1000) if self.calls else 0.0,
+    }
+
+  async def aclose(self):
+    await self.provider.aclose()
+
+class MicroBatcher:
+  """
+  Collects concurrent prompts for up to window_ms, or until
+  max_batch_size are waiting, then sends them as one batched call and
+  hands each caller its own result.
+  """
+
+  def __init__(
+    self,
+    dispatch: Callable[[List[Messages]], Awaitable[List[Union[str, Exception]]]],
+    window_ms: float = 15,
+    max_batch_size: int = 16,
+  ):
+    self.dispatch = dispatch
+    self.window = window_ms / 1000
+    self.max_batch_size = max_batch_size
+    self._pending = []
+    self._timer: Optional[asyncio.TimerHandle] = None
+    self._tasks = set()
+    self.batches = 0
+    self.items = 0
+    self.largest_batch = 0
+    self.total_wait = 0.0
+
+  async def submit(self, messages: Messages) -> str:
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    self._pending.append((messages, future, loop.time()))
+    if len(self._pending) >= self.max_batch_size:
+      self._flush()
+    elif self._timer is None:
+      self._timer = loop.call_later(self.window, self._flush)
+    return await future
+
+  def _flush(self):
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    batch, self._pending = self._pending, []
+    if not batch:
+      return
+    # Hold a reference so the task isn't garbage collected mid-flight
+    task = asyncio.get_running_loop().create_task(self._send(batch))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _send(self, batch):
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    self.batches += 1
+    self.items += len(batch)
+    self.largest_batch = max(self.largest_batch, len(batch))
+    self.total_wait += sum(now - queued_at for _, _, queued_at in batch)
+    try:
+      results = await self.dispatch([messages for messages, _, _ in batch])
+    except Exception as e:
+      results = [e] * len(batch)
+    for (_, future, _), result in zip(batch, results):
+      # The caller may have gone away (cancelled) while we were waiting
+      if future.done():
+        continue
+      if isinstance(result, Exception):
+        future.set_exception(result)
+      else:
+        future.set_result(result)
+
+  def stats(self) -> dict:
+    return {
+      "window_ms": self.window * 1000,
+      "max_batch_size": self.max_batch_size,
+      "batches": self.batches,
+      "items": self.items,
+      "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+      "largest_batch": self.largest_batch,
+      "avg_wait_ms": (self.total_wait / self.items * 1000) if self.items else 0.0,
+    }
@@ -1,71 +1,202 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
 import os
+import secrets
+import time
+import uuid
 
 from src.models import User
 from src.database import get_db
+from src.cache import TTLCache, create_backend
+from src.revocation import revocation_list
 
 # Config
 SECRET_KEY = os.getenv("SECRET_KEY")  # use env in production
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Principal cache: decoded tokens and resolved users, so protected
+# routes don't hit the users table on every request
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_BACKEND = os.getenv("AUTH_CACHE_BACKEND")  # "memory" or "redis"
+CACHE_URL = os.getenv("CACHE_URL")
+
+_pwd_context = None
 security = HTTPBearer()
 
+token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, name="tokens")
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, name="principals")
+shared_principal_cache = create_backend(AUTH_CACHE_BACKEND, CACHE_URL)
+principal_stats = {"shared_hits": 0, "shared_misses": 0, "shared_errors": 0, "db_loads": 0}
+
+PRINCIPAL_FIELDS = ("id", "email", "created_at", "updated_at")
+
+def get_pwd_context():
+  # passlib is imported on first use: most requests, and every cold
+  # start, only verify tokens
+  global _pwd_context
+  if _pwd_context is None:
+    from passlib.context import CryptContext
+    _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+  return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-  return pwd_context.verify(plain_password, hashed_password)
+  return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-  return pwd_context.hash(password)
+  return get_pwd_context().hash(password)
 
 def create_access_token(
   data: dict,
   expires_delta: Optional[timedelta] = None
 ):
   to_encode = data.copy()
+  now = datetime.now(timezone.utc)
   if expires_delta:
-    expire = datetime.now(timezone.utc) + expires_delta
+    expire = now + expires_delta
   else:
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-  to_encode.update({"exp": expire})
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+  # jti lets a single token be revoked; "sid" (set by the caller) revokes a whole login session
+  to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
   encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
   return encoded_jwt
 
+def new_refresh_token() -> str:
+  return secrets.token_urlsafe(32)
+
+def hash_refresh_token(token: str) -> str:
+  return hashlib.sha256(token.encode()).hexdigest()
+
+def credentials_exception() -> HTTPException:
+  return HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+  )
+
+def decode_token(token: str) -> dict:
+  """
+  Return the claims of a valid, unrevoked access token. The revocation
+  check is an in-memory lookup, so it runs even for cached tokens.
+  """
+  claims = token_cache.get(token)
+  if claims is None:
+    try:
+      payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+      raise credentials_exception()
+    if payload.get("sub") is None:
+      raise credentials_exception()
+    claims = {key: payload.get(key) for key in ("sub", "exp", "jti", "sid")}
+    # Never cache a token past its own expiry
+    exp = payload.get("exp")
+    ttl = AUTH_CACHE_TTL if exp is None else min(AUTH_CACHE_TTL, exp - time.time())
+    token_cache.set(token, claims, ttl)
+  if revocation_list.is_revoked(claims["jti"], claims["sid"]):
+    raise credentials_exception()
+  return claims
+
 def verify_token(
   credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
-  try:
-    payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-    email: str = payload.get("sub")
-    if email is None:
-      raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-      )
-    return email
-  except JWTError:
-    raise HTTPException(
-      status_code=status.HTTP_401_UNAUTHORIZED,
-      detail="Could not validate credentials",
-      headers={"WWW-Authenticate": "Bearer"},
-    )
-
-def get_current_user(
-  db: Session = Depends(get_db),
+  return decode_token(credentials.credentials)["sub"]
+
+async def get_current_user(
+  db: AsyncSession = Depends(get_db),
   email: str = Depends(verify_token)
 ):
-  user = db.query(User).filter(User.email == email).first()
+  user = await get_cached_user(email)
   if user is None:
-    raise HTTPException(
-      status_code=status.HTTP_401_UNAUTHORIZED,
-      detail="Could not validate credentials",
-      headers={"WWW-Authenticate": "Bearer"},
-    )
-  return user
\ No newline at end of file
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
+    # Hand the connection back before the endpoint runs: GET endpoints
+    # open a second (read) session, and holding both per request can
+    # exhaust the pool under concurrency
+    await db.commit()
+    principal_stats["db_loads"] += 1
+    if user is not None:
+      await cache_user(user)
+  if user is None:
+    raise credentials_exception()
+  return user
+
+def _serialize_user(user: User) -> dict:
+  data = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+  for field in ("created_at", "updated_at"):
+    if data[field] is not None:
+      data[field] = data[field].isoformat()
+  return data
+
+def _deserialize_user(data: dict) -> User:
+  data = dict(data)
+  for field in ("created_at", "updated_at"):
+    if data.get(field) is not None:
+      data[field] = datetime.fromisoformat(data[field])
+  # Transient instance: safe to share between requests, never attached to a session
+  return User(**data)
+
+async def get_cached_user(email: str) -> Optional[User]:
+  data = principal_cache.get(email)
+  if data is None and shared_principal_cache is not None:
+    try:
+      data = await shared_principal_cache.get(f"principal:{email}")
+    except Exception as e:
+      principal_stats["shared_errors"] += 1
+      print(f"Principal cache backend error: {e}")
+    if data is None:
+      principal_stats["shared_misses"] += 1
+    else:
+      principal_stats["shared_hits"] += 1
+      principal_cache.set(email, data)
+  return None if data is None else _deserialize_user(data)
+
+async def cache_user(user: User):
+  data = _serialize_user(user)
+  principal_cache.set(user.email, data)
+  if shared_principal_cache is not None:
+    try:
+      await shared_principal_cache.set(f"principal:{user.email}", data, AUTH_CACHE_TTL)
+    except Exception as e:
+      principal_stats["shared_errors"] += 1
+      print(f"Principal cache backend error: {e}")
+
+async def invalidate_user(email: str):
+  principal_cache.delete(email)
+  if shared_principal_cache is not None:
+    try:
+      await shared_principal_cache.delete(f"principal:{email}")
+    except Exception as e:
+      principal_stats["shared_errors"] += 1
+      print(f"Principal cache backend error: {e}")
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+  # Drop both the old and new address if the email itself changed
+  emails = {target.email, *inspect(target).attrs.email.history.deleted}
+  for email in emails:
+    principal_cache.delete(email)
+  if shared_principal_cache is not None:
+    try:
+      loop = asyncio.get_running_loop()
+    except RuntimeError:
+      return
+    for email in emails:
+      loop.create_task(invalidate_user(email))
+
+def get_cache_stats() -> dict:
+  return {
+    "tokens": token_cache.stats(),
+    "principals": principal_cache.stats(),
+    **principal_stats,
+    "revocation": revocation_list.stats(),
+  }
@@ -0,0 +1,161 @@
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from typing import AsyncIterator, BinaryIO, Iterator, Tuple
+import csv
+import io
+import json
+
+from src.models import Patient
+from src.schemas import PatientCreate, PatientResponse
+from src.crud import bulk_upsert_patients
+
+BULK_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+EXPORT_COLUMNS = ["id", *(name for name in PatientResponse.model_fields if name != "id")]
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[Tuple[int, dict]]:
+  # newline="" lets the csv module handle quoted multi-line fields
+  text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+  try:
+    reader = csv.DictReader(text)
+    for row in reader:
+      # Blank CSV cells mean "not provided"
+      yield reader.line_num, {key: (value if value != "" else None) for key, value in row.items() if key}
+  finally:
+    # Don't let the wrapper close the caller's file
+    text.detach()
+
+def iter_ndjson_rows(file: BinaryIO) -> Iterator[Tuple[int, dict]]:
+  text = io.TextIOWrapper(file, encoding="utf-8")
+  try:
+    for line_num, line in enumerate(text, start=1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except json.JSONDecodeError as e:
+        row = e
+      yield line_num, row
+  finally:
+    text.detach()
+
+class ImportReport:
+  def __init__(self):
+    self.received = 0
+    self.written = 0
+    self.skipped = 0
+    self.failed = 0
+    self.errors = []
+
+  def add_error(self, line: int, errors):
+    self.failed += 1
+    if len(self.errors) < MAX_REPORTED_ERRORS:
+      self.errors.append({"line": line, "errors": errors})
+
+  def as_dict(self) -> dict:
+    return {
+      "received": self.received,
+      "written": self.written,
+      "skipped": self.skipped,
+      "failed": self.failed,
+      "errors": self.errors,
+      "errors_truncated": self.failed > len(self.errors),
+    }
+
+async def _flush_chunk(db: AsyncSession, chunk: dict, on_conflict: str, fields: set, report: ImportReport):
+  if not chunk:
+    return
+  rows = list(chunk.values())
+  ids = await bulk_upsert_patients(db, rows, on_conflict=on_conflict, update_columns=fields)
+  report.written += len(ids)
+  report.skipped += len(rows) - len(ids)
+
+def _read_chunk(rows: Iterator[Tuple[int, dict]], chunk_size: int, report: ImportReport) -> Tuple[dict, set, bool]:
+  """
+  Validate rows until chunk_size are ready or the input ends. Returns
+  the rows keyed by email, the columns any of them provided, and
+  whether the input is exhausted.
+  """
+  # Keyed by email so a repeated email within one batch can't hit the
+  # same conflict row twice; rows without email get a unique key
+  chunk = {}
+  # Only columns present in the upload are overwritten on conflict
+  fields = set()
+  for line, raw in rows:
+    report.received += 1
+    if isinstance(raw, Exception) or not isinstance(raw, dict):
+      report.add_error(line, [{"msg": "Line is not a JSON object"}])
+      continue
+    # Blank and null values mean "not provided": they must not count as
+    # set, or an update would overwrite stored data with NULL
+    raw = {key: value for key, value in raw.items() if value is not None and value != ""}
+    try:
+      patient = PatientCreate(**raw)
+    except ValidationError as e:
+      report.add_error(line, [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()])
+      continue
+    key = patient.email or f"line:{line}"
+    if key in chunk:
+      report.add_error(line, [{"loc": ["email"], "msg": "Duplicate email earlier in the same batch"}])
+      continue
+    chunk[key] = patient.dict()
+    fields |= patient.model_fields_set
+    if len(chunk) >= chunk_size:
+      return chunk, fields, False
+  return chunk, fields, True
+
+async def import_patients(
+  db: AsyncSession,
+  file: BinaryIO,
+  fmt: str = "csv",
+  on_conflict: str = "skip",
+  chunk_size: int = BULK_CHUNK_SIZE,
+) -> dict:
+  """
+  Validate rows against PatientCreate and write them in batches of
+  chunk_size, one transaction per batch. Invalid rows are reported by
+  line number and don't stop the import; batches already committed stay
+  committed if a later one fails.
+  """
+  rows = iter_csv_rows(file) if fmt == "csv" else iter_ndjson_rows(file)
+  report = ImportReport()
+  while True:
+    # Parsing and validation are CPU-bound; keep them off the event loop
+    chunk, fields, done = await run_in_threadpool(_read_chunk, rows, chunk_size, report)
+    await _flush_chunk(db, chunk, on_conflict, fields, report)
+    if done:
+      break
+  return report.as_dict()
+
+def _export_value(value):
+  return value.isoformat() if hasattr(value, "isoformat") else value
+
+async def export_patients(engine: AsyncEngine, fmt: str = "csv", chunk_size: int = BULK_CHUNK_SIZE) -> AsyncIterator[str]:
+  """
+  Stream every patient as CSV or NDJSON with a server-side cursor, so
+  only chunk_size rows are in memory at a time. Uses its own connection
+  because it outlives the request's session.
+  """
+  columns = [getattr(Patient, name) for name in EXPORT_COLUMNS]
+  stmt = select(*columns).order_by(Patient.id).execution_options(yield_per=chunk_size)
+
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  if fmt == "csv":
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+  async with engine.connect() as conn:
+    result = await conn.stream(stmt)
+    async for partition in result.partitions(chunk_size):
+      buffer.seek(0)
+      buffer.truncate()
+      for row in partition:
+        if fmt == "csv":
+          writer.writerow(row)
+        else:
+          buffer.write(json.dumps({name: _export_value(value) for name, value in zip(EXPORT_COLUMNS, row)}))
+          buffer.write("\n")
+      yield buffer.getvalue()
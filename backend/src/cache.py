@@ -0,0 +1,269 @@
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import json
+import math
+import time
+
+class TTLCache:
+  """
+  Bounded in-process LRU cache with per-entry expiry. Not thread-safe;
+  it is meant to be used from the event loop thread only.
+  """
+
+  def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str = "cache"):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.name = name
+    self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  def get(self, key: Hashable, default: Any = None) -> Any:
+    entry = self._data.get(key)
+    if entry is None:
+      self.misses += 1
+      return default
+    expires_at, value = entry
+    if expires_at <= time.monotonic():
+      del self._data[key]
+      self.expirations += 1
+      self.misses += 1
+      return default
+    self._data.move_to_end(key)
+    self.hits += 1
+    return value
+
+  def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+    ttl = self.ttl if ttl is None else ttl
+    if ttl <= 0 or self.maxsize <= 0:
+      return
+    self._data[key] = (time.monotonic() + ttl, value)
+    self._data.move_to_end(key)
+    while len(self._data) > self.maxsize:
+      self._data.popitem(last=False)
+      self.evictions += 1
+
+  def delete(self, key: Hashable):
+    self._data.pop(key, None)
+
+  def clear(self):
+    self._data.clear()
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key: Hashable):
+    entry = self._data.get(key)
+    return entry is not None and entry[0] > time.monotonic()
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "name": self.name,
+      "size": len(self._data),
+      "maxsize": self.maxsize,
+      "hits": self.hits,
+      "misses": self.misses,
+      "evictions": self.evictions,
+      "expirations": self.expirations,
+      "hit_rate": self.hits / lookups if lookups else 0.0,
+    }
+
+# Shared cache backends, for state that must be visible to every worker.
+# Values must be JSON-serializable.
+class CacheBackend:
+  async def get(self, key: str) -> Any:
+    raise NotImplementedError
+
+  async def set(self, key: str, value: Any, ttl: float):
+    raise NotImplementedError
+
+  async def delete(self, key: str):
+    raise NotImplementedError
+
+class InMemoryBackend(CacheBackend):
+  """
+  Process-local stand-in for a shared cache, for tests and single-worker
+  deployments. Values are round-tripped through JSON like a real backend.
+  """
+
+  def __init__(self, maxsize: int = 100_000):
+    self._cache = TTLCache(maxsize=maxsize, name="shared")
+
+  async def get(self, key: str) -> Any:
+    raw = self._cache.get(key)
+    return None if raw is None else json.loads(raw)
+
+  async def set(self, key: str, value: Any, ttl: float):
+    self._cache.set(key, json.dumps(value), ttl)
+
+  async def delete(self, key: str):
+    self._cache.delete(key)
+
+class RedisBackend(CacheBackend):
+  def __init__(self, url: str, prefix: str = "teraleads:"):
+    try:
+      import redis.asyncio as redis
+    except ImportError as e:
+      raise RuntimeError("The redis cache backend requires the 'redis' package") from e
+    self._client = redis.from_url(url)
+    self.prefix = prefix
+
+  async def get(self, key: str) -> Any:
+    raw = await self._client.get(self.prefix + key)
+    return None if raw is None else json.loads(raw)
+
+  async def set(self, key: str, value: Any, ttl: float):
+    await self._client.set(self.prefix + key, json.dumps(value), ex=max(1, math.ceil(ttl)))
+
+  async def delete(self, key: str):
+    await self._client.delete(self.prefix + key)
+
+def create_backend(kind: Optional[str], url: Optional[str] = None) -> Optional[CacheBackend]:
+  if not kind:
+    return None
+  if kind == "memory":
+    return InMemoryBackend()
+  if kind == "redis":
+    if not url:
+      raise ValueError("CACHE_URL must be set for the redis cache backend")
+    return RedisBackend(url)
+  raise ValueError(f"Unknown cache backend: {kind}")
+
+class ReadThroughCache:
+  """
+  Read-through cache for one entity type: a local TTLCache, optionally
+  backed by a shared CacheBackend, in front of a loader.
+
+  Concurrent misses for the same key are coalesced: the first caller
+  runs the loader and the others await its result. A load that overlaps
+  an invalidate() is returned to its callers but not cached, so a
+  write can't be undone by a read that started before it.
+
+  Other instances' local caches are only invalidated by TTL; keep it
+  short. Values are stored with serialize() in the shared backend and
+  rebuilt with deserialize().
+  """
+
+  def __init__(
+    self,
+    name: str,
+    maxsize: int = 1024,
+    ttl: float = 30.0,
+    backend: Optional[CacheBackend] = None,
+    serialize: Callable[[Any], Any] = lambda value: value,
+    deserialize: Callable[[Any], Any] = lambda data: data,
+  ):
+    self.name = name
+    self.ttl = ttl
+    self.local = TTLCache(maxsize=maxsize, ttl=ttl, name=name)
+    self.backend = backend
+    self.serialize = serialize
+    self.deserialize = deserialize
+    self._inflight: Dict[Hashable, asyncio.Future] = {}
+    self._writes = 0
+    self.loads = 0
+    self.coalesced = 0
+    self.invalidations = 0
+    self.shared_hits = 0
+    self.shared_misses = 0
+    self.shared_errors = 0
+
+  def _shared_key(self, key: Hashable) -> str:
+    return f"{self.name}:{key}"
+
+  async def _get_shared(self, key: Hashable) -> Any:
+    try:
+      data = await self.backend.get(self._shared_key(key))
+    except Exception as e:
+      self.shared_errors += 1
+      print(f"{self.name} cache backend error: {e}")
+      return None
+    if data is None:
+      self.shared_misses += 1
+      return None
+    self.shared_hits += 1
+    return self.deserialize(data)
+
+  async def _set(self, key: Hashable, value: Any):
+    self.local.set(key, value)
+    if self.backend is not None:
+      try:
+        await self.backend.set(self._shared_key(key), self.serialize(value), self.ttl)
+      except Exception as e:
+        self.shared_errors += 1
+        print(f"{self.name} cache backend error: {e}")
+
+  async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Return the cached value for key, calling load() on a miss. None results are not cached."""
+    value = self.local.get(key)
+    if value is not None:
+      return value
+
+    inflight = self._inflight.get(key)
+    if inflight is not None:
+      self.coalesced += 1
+      try:
+        return await asyncio.shield(inflight)
+      except asyncio.CancelledError:
+        # The leading request was cancelled mid-load; load for ourselves
+        if not inflight.cancelled():
+          raise
+
+    future = asyncio.get_running_loop().create_future()
+    self._inflight[key] = future
+    writes = self._writes
+    try:
+      value = await self._get_shared(key) if self.backend is not None else None
+      if value is None:
+        self.loads += 1
+        value = await load()
+        if value is not None and writes == self._writes:
+          await self._set(key, value)
+      elif writes == self._writes:
+        self.local.set(key, value)
+      future.set_result(value)
+      return value
+    except asyncio.CancelledError:
+      future.cancel()
+      raise
+    except Exception as e:
+      future.set_exception(e)
+      # Followers see the error; mark it retrieved so an unawaited
+      # future doesn't log "exception was never retrieved"
+      future.exception()
+      raise
+    finally:
+      if self._inflight.get(key) is future:
+        del self._inflight[key]
+
+  async def invalidate(self, *keys: Hashable):
+    self._writes += 1
+    for key in keys:
+      self.invalidations += 1
+      self.local.delete(key)
+      # Later readers shouldn't join a load that may predate the write
+      self._inflight.pop(key, None)
+      if self.backend is not None:
+        try:
+          await self.backend.delete(self._shared_key(key))
+        except Exception as e:
+          self.shared_errors += 1
+          print(f"{self.name} cache backend error: {e}")
+
+  def stats(self) -> dict:
+    return {
+      **self.local.stats(),
+      "ttl": self.ttl,
+      "shared_backend": type(self.backend).__name__ if self.backend is not None else None,
+      "shared_hits": self.shared_hits,
+      "shared_misses": self.shared_misses,
+      "shared_errors": self.shared_errors,
+      "loads": self.loads,
+      "coalesced": self.coalesced,
+      "inflight": len(self._inflight),
+      "invalidations": self.invalidations,
+    }
@@ -0,0 +1,191 @@
+from datetime import datetime, timezone
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+
+from src.crud import get_patient_cached
+from src.database import engine
+from src.models import Message
+from src.schemas import PatientResponse
+
+# Config
+CHAT_CONTEXT_TURNS = int(os.getenv("CHAT_CONTEXT_TURNS", "6"))
+CHAT_CONTEXT_MAX_CHARS = int(os.getenv("CHAT_CONTEXT_MAX_CHARS", "6000"))
+CHAT_WRITE_WINDOW_MS = float(os.getenv("CHAT_WRITE_WINDOW_MS", "50"))
+CHAT_WRITE_MAX_BATCH = int(os.getenv("CHAT_WRITE_MAX_BATCH", "200"))
+CHAT_WRITE_MAX_RETRIES = int(os.getenv("CHAT_WRITE_MAX_RETRIES", "3"))
+
+SUMMARY_FIELD_CHARS = 300
+
+class MessageWriter:
+  """
+  Buffers chat messages and inserts them in batches, so storing an
+  exchange never puts a commit on the chat request path. A batch is
+  written after window_ms, or as soon as max_batch_size messages are
+  waiting. Batches are committed one at a time, in order.
+
+  Readers that need a conversation's latest messages call
+  wait_written() first; it only blocks while that conversation still
+  has unwritten messages.
+  """
+
+  def __init__(
+    self,
+    engine: AsyncEngine,
+    window_ms: float = 50,
+    max_batch_size: int = 200,
+    max_retries: int = 3,
+  ):
+    self.engine = engine
+    self.window = window_ms / 1000
+    self.max_batch_size = max_batch_size
+    self.max_retries = max_retries
+    self._pending = []
+    self._timer: Optional[asyncio.TimerHandle] = None
+    self._lock = asyncio.Lock()
+    self._tasks = set()
+    # conversation_id -> future of the last batch holding one of its messages
+    self._last_batch: Dict[int, asyncio.Future] = {}
+    self.queued = 0
+    self.written = 0
+    self.batches = 0
+    self.retries = 0
+    self.dropped = 0
+    self.largest_batch = 0
+
+  def append(self, conversation_id: int, role: str, content: str):
+    self._pending.append({
+      "conversation_id": conversation_id,
+      "role": role,
+      "content": content,
+      "created_at": datetime.now(timezone.utc),
+    })
+    self.queued += 1
+    if len(self._pending) >= self.max_batch_size:
+      self._flush()
+    elif self._timer is None:
+      self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+  def _flush(self):
+    if self._timer is not None:
+      self._timer.cancel()
+      self._timer = None
+    batch, self._pending = self._pending, []
+    if not batch:
+      return
+    done = asyncio.get_running_loop().create_future()
+    for row in batch:
+      self._last_batch[row["conversation_id"]] = done
+    # Hold a reference so the task isn't garbage collected mid-flight
+    task = asyncio.get_running_loop().create_task(self._write(batch, done))
+    self._tasks.add(task)
+    task.add_done_callback(self._tasks.discard)
+
+  async def _write(self, batch: list, done: asyncio.Future):
+    try:
+      async with self._lock:
+        for attempt in range(self.max_retries + 1):
+          try:
+            async with self.engine.begin() as conn:
+              await conn.execute(insert(Message), batch)
+            break
+          except Exception as e:
+            if attempt == self.max_retries:
+              print(f"Dropping {len(batch)} chat messages: {e}")
+              self.dropped += len(batch)
+              return
+            self.retries += 1
+            await asyncio.sleep(0.1 * 2 ** attempt)
+        self.batches += 1
+        self.written += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+    finally:
+      done.set_result(None)
+      for row in batch:
+        if self._last_batch.get(row["conversation_id"]) is done:
+          del self._last_batch[row["conversation_id"]]
+
+  async def wait_written(self, conversation_id: int):
+    if any(row["conversation_id"] == conversation_id for row in self._pending):
+      self._flush()
+    done = self._last_batch.get(conversation_id)
+    if done is not None:
+      await asyncio.shield(done)
+
+  async def close(self):
+    self._flush()
+    if self._tasks:
+      await asyncio.gather(*self._tasks, return_exceptions=True)
+
+  def stats(self) -> dict:
+    return {
+      "window_ms": self.window * 1000,
+      "max_batch_size": self.max_batch_size,
+      "queued": self.queued,
+      "pending": len(self._pending),
+      "written": self.written,
+      "batches": self.batches,
+      "avg_batch_size": self.written / self.batches if self.batches else 0.0,
+      "largest_batch": self.largest_batch,
+      "retries": self.retries,
+      "dropped": self.dropped,
+    }
+
+message_writer = MessageWriter(
+  engine,
+  window_ms=CHAT_WRITE_WINDOW_MS,
+  max_batch_size=CHAT_WRITE_MAX_BATCH,
+  max_retries=CHAT_WRITE_MAX_RETRIES,
+)
+
+def _clip(text: str, limit: int) -> str:
+  return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def patient_summary(patient: PatientResponse) -> str:
+  """The patient facts the assistant gets as context, one per line."""
+  facts = [
+    ("Name", f"{patient.first_name} {patient.last_name}"),
+    ("Date of birth", patient.date_of_birth.isoformat() if patient.date_of_birth else None),
+    ("Allergies", patient.allergies),
+    ("Medical history", patient.medical_history),
+    ("Dental history", patient.dental_history),
+  ]
+  return "\n".join(f"{label}: {_clip(value, SUMMARY_FIELD_CHARS)}" for label, value in facts if value)
+
+async def build_context(
+  db: AsyncSession,
+  conversation_id: Optional[int],
+  patient_id: Optional[int] = None,
+  turns: int = CHAT_CONTEXT_TURNS,
+  max_chars: int = CHAT_CONTEXT_MAX_CHARS,
+) -> Tuple[List[dict], Optional[str]]:
+  """
+  Return the last `turns` exchanges of a conversation as chat messages,
+  oldest first and trimmed to max_chars, plus the patient summary. With
+  no conversation there is no history.
+  """
+  history = []
+  if conversation_id is not None:
+    await message_writer.wait_written(conversation_id)
+    result = await db.execute(
+      select(Message.role, Message.content)
+      .where(Message.conversation_id == conversation_id)
+      .order_by(Message.created_at.desc(), Message.id.desc())
+      .limit(turns * 2)
+    )
+    used = 0
+    for role, content in result.all():
+      used += len(content)
+      if used > max_chars:
+        break
+      history.append({"role": role, "content": content})
+    history.reverse()
+
+  summary = None
+  if patient_id is not None:
+    patient = await get_patient_cached(db, patient_id)
+    if patient is not None:
+      summary = patient_summary(patient)
+  return history, summary
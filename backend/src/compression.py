@@ -0,0 +1,163 @@
+from starlette.datastructures import Headers, MutableHeaders
+from typing import Optional
+import os
+import zlib
+
+from src.etag import encoded_etag
+from src.metrics import Counter, registry
+
+try:
+  import brotli
+except ImportError:  # optional; without it only gzip is offered
+  brotli = None
+
+# Config
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Bodies smaller than this are sent as-is: the saving is lost in headers and CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Brotli's default (11) is for static assets; at 4, patient JSON comes
+# out slightly smaller than with gzip -6 for about the same CPU
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Event streams are never compressed: the compressor would hold back
+# tokens until it had enough to emit
+COMPRESSIBLE_TYPES = frozenset({
+  "application/json",
+  "application/x-ndjson",
+  "text/csv",
+  "text/plain",
+  "text/html",
+})
+
+compression_bytes = registry.register(Counter(
+  "http_compression_bytes_total", "Response bytes before and after compression", ("encoding", "stage"),
+))
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+  """The preferred encoding the client accepts: "br", "gzip" or None."""
+  if not accept_encoding:
+    return None
+  weights = {}
+  for item in accept_encoding.lower().split(","):
+    coding, _, params = item.strip().partition(";")
+    q = 1.0
+    params = params.strip()
+    if params.startswith("q="):
+      try:
+        q = float(params[2:])
+      except ValueError:
+        q = 0.0
+    weights[coding.strip()] = q
+  wildcard = weights.get("*", 0.0)
+  offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+  # Highest q wins; on a tie the first offered (brotli) does
+  best = max(offered, key=lambda coding: weights.get(coding, wildcard))
+  return best if weights.get(best, wildcard) > 0 else None
+
+class Encoder:
+  def __init__(self, encoding: str):
+    self.encoding = encoding
+    if encoding == "br":
+      self._compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=COMPRESSION_BROTLI_QUALITY)
+    else:
+      # wbits 31: a gzip header and trailer rather than raw zlib
+      self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+  def compress(self, data: bytes, final: bool) -> bytes:
+    """Compress a chunk. Non-final chunks are flushed so the client can decode them right away."""
+    if self.encoding == "br":
+      return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+    return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def compressible(headers: Headers) -> bool:
+  if "content-encoding" in headers:
+    return False
+  content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+  return content_type in COMPRESSIBLE_TYPES
+
+class CompressionMiddleware:
+  """
+  Pure ASGI response compression, negotiated from Accept-Encoding.
+
+  A response sent in one piece is compressed only if it reaches
+  min_size. Streamed responses (exports) are compressed chunk by chunk
+  and each chunk is flushed, so nothing is buffered. Event streams and
+  other non-text types pass through untouched. A strong ETag on an
+  encoded response gets the coding as a suffix ("v3-gzip"), as each
+  coding is a different representation; weak tags are left alone.
+  """
+
+  def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+    self.app = app
+    self.min_size = min_size
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http" or scope["method"] == "HEAD":
+      await self.app(scope, receive, send)
+      return
+    request_headers = Headers(scope=scope)
+    encoding = choose_encoding(request_headers.get("accept-encoding"))
+    if encoding is None:
+      await self.app(scope, receive, send)
+      return
+
+    start = None
+    encoder = None
+    passthrough = False
+
+    async def send_compressed(message):
+      nonlocal start, encoder, passthrough
+      if passthrough:
+        await send(message)
+        return
+      if message["type"] == "http.response.start":
+        if message["status"] == 304:
+          # Revalidating an encoded copy: answer with the tag the client holds
+          headers = MutableHeaders(raw=message.setdefault("headers", []))
+          etag = headers.get("etag")
+          if etag and encoded_etag(etag, encoding) in request_headers.get("if-none-match", ""):
+            headers["ETag"] = encoded_etag(etag, encoding)
+        if message["status"] in (204, 304) or not compressible(Headers(raw=message.get("headers", []))):
+          passthrough = True
+          await send(message)
+        else:
+          # Held until the first body chunk shows whether this is worth compressing
+          start = message
+        return
+      if message["type"] != "http.response.body":
+        await send(message)
+        return
+
+      body = message.get("body", b"")
+      more_body = message.get("more_body", False)
+      if encoder is None:
+        if not more_body and len(body) < self.min_size:
+          passthrough = True
+          await send(start)
+          await send(message)
+          return
+        encoder = Encoder(encoding)
+        headers = MutableHeaders(raw=start.setdefault("headers", []))
+        headers["Content-Encoding"] = encoding
+        if "etag" in headers:
+          headers["ETag"] = encoded_etag(headers["etag"], encoding)
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+          del headers["Content-Length"]
+        else:
+          data = encoder.compress(body, final=True)
+          headers["Content-Length"] = str(len(data))
+          compression_bytes.inc(encoding, "in", amount=len(body))
+          compression_bytes.inc(encoding, "out", amount=len(data))
+          await send(start)
+          await send({"type": "http.response.body", "body": data})
+          return
+        await send(start)
+
+      data = encoder.compress(body, final=not more_body)
+      compression_bytes.inc(encoding, "in", amount=len(body))
+      compression_bytes.inc(encoding, "out", amount=len(data))
+      await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    await self.app(scope, receive, send_compressed)
@@ -1,77 +1,366 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, func, select, text, tuple_, update
+from typing import Optional, Sequence
 
-from src.models import User, Patient
-from src.schemas import UserCreate, PatientCreate, PatientUpdate
-from src.auth import get_password_hash, verify_password
+from src.database import AsyncSessionLocal, engine
+from src.models import User, Patient, Conversation, Message, RefreshToken
+from src.schemas import UserCreate, PatientBatchUpdateItem, PatientCreate, PatientResponse, PatientUpdate
+from src.hashing import get_password_hash, verify_password
+from src.auth import hash_refresh_token, invalidate_user, new_refresh_token
+from src.pagination import InvalidCursor, decode_cursor, encode_cursor
+from src.patient_cache import patient_cache
+from src.jobs import job_queue
 
 # User CRUD operations
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
   # Check if user already exists
-  db_user = db.query(User).filter(User.email == user.email).first()
+  db_user = await get_user_by_email(db, user.email)
   if db_user:
     return None
   
-  hashed_password = get_password_hash(user.password)
+  hashed_password = await get_password_hash(user.password)
   db_user = User(email=user.email, hashed_password=hashed_password)
   db.add(db_user)
-  db.commit()
-  db.refresh(db_user)
+  await db.commit()
+  await db.refresh(db_user)
+  await invalidate_user(db_user.email)
   return db_user
 
-def authenticate_user(db: Session, email: str, password: str):
-  user = db.query(User).filter(User.email == email).first()
-  if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+  user = await get_user_by_email(db, email)
+  if not user or not await verify_password(password, user.hashed_password):
     return None
   return user
 
-def get_user_by_email(db: Session, email: str):
-  return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+  result = await db.execute(select(User).where(User.email == email))
+  return result.scalars().first()
+
+# Refresh token operations. Only hashes are stored; the raw token is returned once.
+async def create_refresh_token(db: AsyncSession, user_id: int, session_id: str, expires_in: timedelta):
+  token = new_refresh_token()
+  db.add(RefreshToken(
+    user_id=user_id,
+    token_hash=hash_refresh_token(token),
+    session_id=session_id,
+    expires_at=datetime.now(timezone.utc) + expires_in,
+  ))
+  await db.commit()
+  return token
+
+async def get_refresh_token(db: AsyncSession, token: str):
+  result = await db.execute(select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token)))
+  return result.scalars().first()
+
+async def rotate_refresh_token(db: AsyncSession, current: RefreshToken, expires_in: timedelta):
+  """
+  Revoke current and issue its successor in the same session. Returns
+  None if current was already used, including by a concurrent request.
+  """
+  result = await db.execute(
+    update(RefreshToken)
+    .where(RefreshToken.id == current.id, RefreshToken.revoked_at.is_(None))
+    .values(revoked_at=func.now())
+  )
+  if result.rowcount != 1:
+    await db.rollback()
+    return None
+  return await create_refresh_token(db, current.user_id, current.session_id, expires_in)
+
+async def revoke_refresh_session(db: AsyncSession, session_id: str):
+  await db.execute(
+    update(RefreshToken)
+    .where(RefreshToken.session_id == session_id, RefreshToken.revoked_at.is_(None))
+    .values(revoked_at=func.now())
+  )
+  await db.commit()
 
 # Patient CRUD operations
-def create_patient(db: Session, patient: PatientCreate):
+async def create_patient(db: AsyncSession, patient: PatientCreate, actor: Optional[str] = None):
   db_patient = Patient(**patient.dict())
   db.add(db_patient)
-  db.commit()
-  db.refresh(db_patient)
+  # The id is needed for the follow-up jobs, which commit with the patient
+  await db.flush()
+  job_queue.enqueue(db, "audit", {
+    "action": "patient.created",
+    "resource": f"patient:{db_patient.id}",
+    "actor": actor,
+    "at": datetime.now(timezone.utc).isoformat(),
+  })
+  await db.commit()
+  job_queue.notify()
+  await db.refresh(db_patient)
   return db_patient
 
-def get_patients(db: Session, skip: int = 0, limit: int = 100):
-  return db.query(Patient).offset(skip).limit(limit).all()
-
-def get_patient(db: Session, patient_id: int):
-  return db.query(Patient).filter(Patient.id == patient_id).first()
-    
-def update_patient(db: Session, patient_id: int, patient_update: PatientUpdate):
-  db_patient = get_patient(db, patient_id)
-  
-  if not db_patient:
-    return None
-  
-  update_data = patient_update.dict(exclude_unset=True)   
-  for field, value in update_data.items():
-    setattr(db_patient, field, value)
-  
-  db.commit()
-  db.refresh(db_patient)
-  return db_patient
+async def bulk_upsert_patients(db: AsyncSession, rows: list, on_conflict: str = "skip", update_columns: Optional[set] = None):
+  """
+  Insert many patients with INSERT ... ON CONFLICT (email) in a single
+  transaction and commit. Every row must have the same keys. Returns the
+  ids of the rows written; with on_conflict="skip" rows whose email
+  already exists are left alone, with "update" their update_columns
+  (default: every key) are overwritten where the new row has a value;
+  NULLs never replace stored data.
+  """
+  if not rows:
+    return []
+  if db.bind.dialect.name == "postgresql":
+    from sqlalchemy.dialects.postgresql import insert
+  else:
+    from sqlalchemy.dialects.sqlite import insert
 
-def delete_patient(db: Session, patient_id: int):
-  db_patient = get_patient(db, patient_id)
-  
-  if not db_patient:
-    return False
-  
-  db.delete(db_patient)
-  db.commit()
-  return True
-
-def search_patients(db: Session, query: str):
-  return db.query(Patient).filter(
-    or_(
-      Patient.first_name.ilike(f"%{query}%"),
-      Patient.last_name.ilike(f"%{query}%"),
-      Patient.email.ilike(f"%{query}%")
+  # Executed as executemany: SQLAlchemy's insertmanyvalues batches the
+  # rows into multi-row VALUES clauses and the statement stays cached
+  stmt = insert(Patient)
+  if on_conflict == "update":
+    columns = update_columns or rows[0].keys()
+    stmt = stmt.on_conflict_do_update(
+      index_elements=[Patient.email],
+      set_={
+        # Rows in one batch share keys, so a row that didn't provide a
+        # column carries NULL for it; keep the stored value instead
+        **{column: func.coalesce(stmt.excluded[column], Patient.__table__.c[column]) for column in columns},
+        "updated_at": func.now(),
+        "version": Patient.version + 1,
+      },
     )
-  ).all()
\ No newline at end of file
+  else:
+    stmt = stmt.on_conflict_do_nothing(index_elements=[Patient.email])
+  result = await db.execute(stmt.returning(Patient.id), rows)
+  ids = result.scalars().all()
+  await db.commit()
+  if on_conflict == "update":
+    await patient_cache.invalidate(*ids)
+  return ids
+
+def select_patients(fields: Optional[Sequence[str]] = None):
+  # With fields, select just those columns as a Core statement: rows come
+  # back as mappings and no ORM objects are built or identity-mapped
+  if fields is None:
+    return select(Patient)
+  return select(*[Patient.__table__.c[name] for name in fields])
+
+async def _fetch_patients(db: AsyncSession, stmt, fields: Optional[Sequence[str]] = None):
+  result = await db.execute(stmt)
+  return result.scalars().all() if fields is None else result.mappings().all()
+
+async def get_patients(db: AsyncSession, skip: int = 0, limit: int = 100, fields: Optional[Sequence[str]] = None):
+  stmt = select_patients(fields).order_by(Patient.id).offset(skip).limit(limit)
+  return await _fetch_patients(db, stmt, fields)
+
+# Keyset pagination. Each sort is backed by an index with the same
+# column order (the primary key, or ix_patients_name_id).
+PATIENT_SORTS = {
+  "id": (Patient.id,),
+  "name": (Patient.last_name, Patient.first_name, Patient.id),
+}
+
+async def get_patients_page(
+  db: AsyncSession,
+  limit: int = 100,
+  cursor: Optional[str] = None,
+  sort: str = "id",
+  fields: Optional[Sequence[str]] = None,
+):
+  descending = sort.startswith("-")
+  columns = PATIENT_SORTS[sort.lstrip("-")]
+  if fields is not None:
+    # The sort key is needed to build the next cursor
+    fields = list(dict.fromkeys([*fields, *(column.key for column in columns)]))
+
+  stmt = select_patients(fields)
+  if cursor:
+    values = decode_cursor(cursor, sort)
+    if len(values) != len(columns):
+      raise InvalidCursor("Cursor does not match the requested sort")
+    key = tuple_(*columns)
+    stmt = stmt.where(key < tuple_(*values) if descending else key > tuple_(*values))
+  stmt = stmt.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+  # Fetch one extra row to learn whether another page exists
+  patients = await _fetch_patients(db, stmt.limit(limit + 1), fields)
+  next_cursor = None
+  if len(patients) > limit:
+    patients = patients[:limit]
+    last = patients[-1]
+    values = [getattr(last, column.key) if fields is None else last[column.key] for column in columns]
+    next_cursor = encode_cursor(sort, values)
+  return patients, next_cursor
+
+async def count_patients(db: AsyncSession, estimate: bool = True):
+  # Postgres keeps a planner estimate in pg_class that costs nothing to read;
+  # fall back to an exact count elsewhere or if the table was never analyzed.
+  if estimate and db.bind.dialect.name == "postgresql":
+    result = await db.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'patients'::regclass"))
+    approximate = result.scalar()
+    if approximate is not None and approximate >= 0:
+      return approximate, True
+  result = await db.execute(select(func.count()).select_from(Patient))
+  return result.scalar_one(), False
+
+async def get_patient(db: AsyncSession, patient_id: int):
+  result = await db.execute(select(Patient).where(Patient.id == patient_id))
+  return result.scalars().first()
+
+async def get_patient_cached(db: AsyncSession, patient_id: int) -> Optional[PatientResponse]:
+  """
+  get_patient through the patient cache, as a detached PatientResponse.
+  Misses are loaded from the primary even when db is a replica session:
+  a lagging replica would refill the cache with the row from before the
+  last write, and that would outlive the invalidation by a whole TTL.
+  """
+  async def load():
+    if db.bind is engine:
+      patient = await get_patient(db, patient_id)
+    else:
+      async with AsyncSessionLocal() as primary:
+        patient = await get_patient(primary, patient_id)
+    return None if patient is None else PatientResponse.model_validate(patient)
+  return await patient_cache.get(patient_id, load)
+
+# Writes go through the Core table, so they run as single statements
+# without loading or identity-mapping ORM objects
+patients_table = Patient.__table__
+
+class VersionConflict(Exception):
+  """The patient has been written since the version the client sent."""
+
+  def __init__(self, patient_id: int):
+    super().__init__(f"Patient {patient_id} was modified by another request")
+    self.patient_id = patient_id
+
+def _version_guard(stmt, versions: Optional[Sequence[int]]):
+  return stmt if versions is None else stmt.where(patients_table.c.version.in_(versions))
+
+async def _raise_if_exists(db: AsyncSession, patient_id: int):
+  # Only reached when a guarded statement matched nothing: tell a stale
+  # version apart from a missing row
+  if await db.scalar(select(Patient.id).where(Patient.id == patient_id)) is not None:
+    raise VersionConflict(patient_id)
+
+async def _update_patient_row(db: AsyncSession, patient_id: int, values: dict, versions: Optional[Sequence[int]] = None):
+  stmt = (
+    update(patients_table)
+    .where(patients_table.c.id == patient_id)
+    .values(**values, version=patients_table.c.version + 1)
+    .returning(*patients_table.c)
+  )
+  row = (await db.execute(_version_guard(stmt, versions))).mappings().first()
+  if row is None and versions is not None:
+    await _raise_if_exists(db, patient_id)
+  return row
+
+async def update_patient(db: AsyncSession, patient_id: int, patient_update: PatientUpdate, versions: Optional[Sequence[int]] = None):
+  """
+  Apply the fields set on patient_update in one UPDATE ... RETURNING and
+  commit. Returns the updated row, or None if there is no such patient.
+  With versions, the update only applies while the patient is at one of
+  them; otherwise VersionConflict is raised.
+  """
+  try:
+    row = await _update_patient_row(db, patient_id, patient_update.model_dump(exclude_unset=True), versions)
+  except VersionConflict:
+    await db.rollback()
+    raise
+  await db.commit()
+  if row is not None:
+    await patient_cache.invalidate(patient_id)
+  return row
+
+async def update_patients(db: AsyncSession, items: Sequence[PatientBatchUpdateItem]):
+  """
+  Apply a batch of partial updates in one transaction: every item is
+  applied, or none are. Raises LookupError naming the first missing
+  patient, or VersionConflict for the first stale version.
+  """
+  rows = []
+  try:
+    for item in items:
+      values = item.model_dump(exclude_unset=True, exclude={"id", "version"})
+      versions = None if item.version is None else [item.version]
+      row = await _update_patient_row(db, item.id, values, versions)
+      if row is None:
+        raise LookupError(item.id)
+      rows.append(row)
+  except Exception:
+    await db.rollback()
+    raise
+  await db.commit()
+  await patient_cache.invalidate(*[item.id for item in items])
+  return rows
+
+async def delete_patient(db: AsyncSession, patient_id: int, versions: Optional[Sequence[int]] = None):
+  """
+  Delete with a single DELETE ... RETURNING. Returns False if there is
+  no such patient; raises VersionConflict as update_patient does.
+  """
+  stmt = delete(patients_table).where(patients_table.c.id == patient_id).returning(patients_table.c.id)
+  deleted = (await db.execute(_version_guard(stmt, versions))).first() is not None
+  if not deleted and versions is not None:
+    try:
+      await _raise_if_exists(db, patient_id)
+    except VersionConflict:
+      await db.rollback()
+      raise
+  await db.commit()
+  if deleted:
+    await patient_cache.invalidate(patient_id)
+  return deleted
+
+# Chat history
+async def create_conversation(db: AsyncSession, user_id: int, patient_id: Optional[int] = None):
+  conversation = Conversation(user_id=user_id, patient_id=patient_id)
+  db.add(conversation)
+  await db.commit()
+  await db.refresh(conversation)
+  return conversation
+
+async def get_conversation(db: AsyncSession, conversation_id: int, user_id: int):
+  result = await db.execute(
+    select(Conversation).where(Conversation.id == conversation_id, Conversation.user_id == user_id)
+  )
+  return result.scalars().first()
+
+async def get_conversations_page(
+  db: AsyncSession,
+  user_id: int,
+  patient_id: Optional[int] = None,
+  limit: int = 20,
+  cursor: Optional[str] = None,
+):
+  # Newest first
+  stmt = select(Conversation).where(Conversation.user_id == user_id)
+  if patient_id is not None:
+    stmt = stmt.where(Conversation.patient_id == patient_id)
+  if cursor:
+    values = decode_cursor(cursor, "conversations")
+    if len(values) != 1:
+      raise InvalidCursor("Invalid cursor")
+    stmt = stmt.where(Conversation.id < values[0])
+  result = await db.execute(stmt.order_by(Conversation.id.desc()).limit(limit + 1))
+  conversations = result.scalars().all()
+  next_cursor = None
+  if len(conversations) > limit:
+    conversations = conversations[:limit]
+    next_cursor = encode_cursor("conversations", [conversations[-1].id])
+  return conversations, next_cursor
+
+async def get_messages_page(db: AsyncSession, conversation_id: int, limit: int = 50, cursor: Optional[str] = None):
+  # Newest first, keyed on ix_messages_conversation_created
+  stmt = select(Message).where(Message.conversation_id == conversation_id)
+  if cursor:
+    values = decode_cursor(cursor, "messages")
+    try:
+      created_at, message_id = datetime.fromisoformat(values[0]), int(values[1])
+    except (IndexError, TypeError, ValueError):
+      raise InvalidCursor("Invalid cursor")
+    stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+  stmt = stmt.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1)
+  result = await db.execute(stmt)
+  messages = result.scalars().all()
+  next_cursor = None
+  if len(messages) > limit:
+    messages = messages[:limit]
+    last = messages[-1]
+    next_cursor = encode_cursor("messages", [last.created_at.isoformat(), last.id])
+  return messages, next_cursor
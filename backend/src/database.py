@@ -1,21 +1,193 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Optional
+import asyncio
 import os
+import time
 
+from src.metrics import db_checkout, record_query
+from src.profiling import install_query_hooks
+
+# Engine settings
 DATABASE_URL = os.getenv("DATABASE_URL")
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")  # optional read replica for GET endpoints
+DATABASE_SSLMODE = os.getenv("DATABASE_SSLMODE", "require")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+def get_async_url(url: str) -> str:
+  # Map plain driver URLs onto their asyncio drivers
+  if url.startswith("postgres://"):
+    url = "postgresql://" + url[len("postgres://"):]
+  if url.startswith("postgresql://"):
+    return "postgresql+asyncpg://" + url[len("postgresql://"):]
+  if url.startswith("sqlite://"):
+    return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+  return url
+
+def get_connect_args(url: str) -> dict:
+  if url.startswith("postgresql+asyncpg://"):
+    connect_args = {"ssl": False if DATABASE_SSLMODE == "disable" else DATABASE_SSLMODE}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+      connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    return connect_args
+  return {}
+
+class PoolMetrics:
+  def __init__(self, name: str):
+    self.name = name
+    self.checkouts = 0
+    self.timeouts = 0
+    self.connects = 0
+    self.invalidations = 0
+    self.total_wait = 0.0
+    self.max_wait = 0.0
+
+  def record_checkout(self, wait: float):
+    db_checkout.observe(wait, self.name)
+    self.checkouts += 1
+    self.total_wait += wait
+    self.max_wait = max(self.max_wait, wait)
+
+  def stats(self, pool) -> dict:
+    data = {
+      "checkouts": self.checkouts,
+      "timeouts": self.timeouts,
+      "connects": self.connects,
+      "invalidations": self.invalidations,
+      "avg_wait_ms": (self.total_wait / self.checkouts * 1000) if self.checkouts else 0.0,
+      "max_wait_ms": self.max_wait * 1000,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+      capacity = pool.size() + max(DB_MAX_OVERFLOW, 0)
+      data.update({
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "capacity": capacity,
+        "saturation": pool.checkedout() / capacity if capacity else 0.0,
+      })
+    return data
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+  """Queue pool that records how long each checkout waited for a connection."""
+
+  metrics: Optional[PoolMetrics] = None
+
+  def _do_get(self):
+    start = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except Exception:
+      if self.metrics is not None:
+        self.metrics.timeouts += 1
+      raise
+    if self.metrics is not None:
+      self.metrics.record_checkout(time.perf_counter() - start)
+    return connection
+
+  def recreate(self):
+    pool = super().recreate()
+    pool.metrics = self.metrics
+    return pool
+
+pool_metrics = {}
+
+def create_engine_from_settings(url: str, name: str = "primary") -> AsyncEngine:
+  url = get_async_url(url)
+  options = {"connect_args": get_connect_args(url), "echo": DB_ECHO}
+  # In-memory SQLite needs its single static connection, so leave its pool alone
+  if ":memory:" not in url and url != "sqlite+aiosqlite://":
+    options.update(
+      poolclass=TimedQueuePool,
+      pool_size=DB_POOL_SIZE,
+      max_overflow=DB_MAX_OVERFLOW,
+      pool_timeout=DB_POOL_TIMEOUT,
+      pool_recycle=DB_POOL_RECYCLE,
+      pool_pre_ping=DB_POOL_PRE_PING,
+    )
+  new_engine = create_async_engine(url, **options)
 
-engine = create_engine(DATABASE_URL, connect_args={"sslmode": "require"})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+  metrics = PoolMetrics(name)
+  pool_metrics[name] = metrics
+  pool = new_engine.sync_engine.pool
+  if isinstance(pool, TimedQueuePool):
+    pool.metrics = metrics
+
+  @event.listens_for(new_engine.sync_engine, "connect")
+  def on_connect(dbapi_connection, connection_record):
+    metrics.connects += 1
+
+  @event.listens_for(new_engine.sync_engine, "before_cursor_execute")
+  def on_execute(conn, cursor, statement, parameters, context, executemany):
+    record_query(name)
+
+  @event.listens_for(new_engine.sync_engine, "invalidate")
+  def on_invalidate(dbapi_connection, connection_record, exception):
+    metrics.invalidations += 1
+
+  install_query_hooks(new_engine.sync_engine, name)
+  return new_engine
+
+engine = create_engine_from_settings(DATABASE_URL, "primary")
+read_engine = create_engine_from_settings(DATABASE_READ_URL, "replica") if DATABASE_READ_URL else engine
+AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def init_db():
+async def init_db():
+  # Create tables straight from the models. Only for throwaway databases
+  # (benchmarks, local SQLite); real schemas are managed by Alembic.
   from . import models
-  Base.metadata.create_all(bind=engine)
-  
-def get_db():
-  db = SessionLocal()
-  try:
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+
+async def get_db():
+  async with AsyncSessionLocal() as db:
     yield db
-  finally:
-    db.close()
+
+async def get_read_db():
+  # Sessions for read-only GET endpoints; the primary unless DATABASE_READ_URL is set
+  async with ReadSessionLocal() as db:
+    yield db
+
+def get_pool_stats() -> dict:
+  engines = {"primary": engine}
+  if read_engine is not engine:
+    engines["replica"] = read_engine
+  return {
+    name: pool_metrics[name].stats(db_engine.sync_engine.pool)
+    for name, db_engine in engines.items()
+  }
+
+async def check_engines(timeout: float) -> dict:
+  """
+  Run SELECT 1 on each engine, giving up after timeout seconds, so a
+  saturated pool or an unreachable database fails fast.
+  """
+  engines = {"primary": engine}
+  if read_engine is not engine:
+    engines["replica"] = read_engine
+  results = {}
+  for name, db_engine in engines.items():
+    start = time.perf_counter()
+    try:
+      async with asyncio.timeout(timeout):
+        async with db_engine.connect() as conn:
+          await conn.execute(text("SELECT 1"))
+      results[name] = {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000}
+    except Exception as e:
+      results[name] = {"ok": False, "error": type(e).__name__}
+  return results
+
+async def dispose_engines():
+  await engine.dispose()
+  if read_engine is not engine:
+    await read_engine.dispose()
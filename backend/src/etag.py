@@ -0,0 +1,109 @@
+from fastapi import Request, Response
+from typing import Any, Iterable, List, Optional
+import hashlib
+
+from src.serialization import render_json
+
+def make_etag(body: bytes) -> str:
+  return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def version_etag(version: int) -> str:
+  # A row's version identifies its representation, so this tag is strong
+  return f'"v{version}"'
+
+# Columns a weak list ETag is computed from; list queries always select them
+VALIDATOR_FIELDS = ("id", "version", "updated_at")
+
+def rows_etag(rows: Iterable, *parts: Any) -> str:
+  """
+  Weak ETag for a page of patient rows (ORM objects or mappings), from
+  each row's id, version and updated_at plus whatever else shapes the
+  response (query string, fields, cursor, total). Nothing is rendered,
+  so an unchanged page can be answered with a 304 before serialization.
+  Weak, as the same page may be rendered to different bytes.
+  """
+  digest = hashlib.blake2b(digest_size=16)
+  for part in parts:
+    digest.update(repr(part).encode())
+    digest.update(b"\0")
+  for row in rows:
+    values = [row[name] for name in VALIDATOR_FIELDS] if hasattr(row, "keys") else [getattr(row, name) for name in VALIDATOR_FIELDS]
+    digest.update(repr(values).encode())
+  return f'W/"{digest.hexdigest()}"'
+
+# Content-codings CompressionMiddleware may apply
+ETAG_CODINGS = ("gzip", "br")
+
+def encoded_etag(etag: str, coding: str) -> str:
+  """
+  The tag for etag's representation under a content-coding. Strong
+  validators must differ between codings (RFC 9110 8.8.3), so they get
+  a suffix: "v3" becomes "v3-gzip". Weak tags are shared.
+  """
+  if etag.startswith("W/") or not etag.endswith('"'):
+    return etag
+  return f'{etag[:-1]}-{coding}"'
+
+def decoded_etag(tag: str) -> str:
+  """Undo encoded_etag: the tag of the unencoded representation."""
+  for coding in ETAG_CODINGS:
+    suffix = f'-{coding}"'
+    if tag.endswith(suffix):
+      return tag[:-len(suffix)] + '"'
+  return tag
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+  """
+  Row versions an If-Match header accepts, or None when it sets no
+  version precondition (absent, or "*"). If-Match uses strong
+  comparison, so weak tags never match.
+  """
+  if if_match is None or if_match.strip() == "*":
+    return None
+  versions = []
+  for tag in if_match.split(","):
+    # The version is the same whichever coding the client was sent
+    tag = decoded_etag(tag.strip())
+    if tag.startswith('"v') and tag.endswith('"') and tag[2:-1].isdigit():
+      versions.append(int(tag[2:-1]))
+  return versions
+
+def _opaque(tag: str) -> str:
+  return decoded_etag(tag[2:] if tag.startswith("W/") else tag)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+  # If-None-Match uses weak comparison: W/"x" matches "x", and so does
+  # "x-gzip", since the coding doesn't change the content
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  return _opaque(etag) in [_opaque(tag.strip()) for tag in if_none_match.split(",")]
+
+def _cache_headers(etag: str) -> dict:
+  # Private and always revalidated, as responses carry patient data
+  return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+  """An empty 304 if the client's If-None-Match already has etag, else None."""
+  if etag_matches(request.headers.get("if-none-match"), etag):
+    return Response(status_code=304, headers=_cache_headers(etag))
+  return None
+
+def conditional_json_response(request: Request, content: Any, etag: Optional[str] = None) -> Response:
+  """
+  Render content as JSON with an ETag (a strong one over the body unless
+  one is given), or an empty 304 when the client's If-None-Match already
+  has it. A given ETag is checked before rendering.
+  """
+  if etag is not None:
+    response = not_modified(request, etag)
+    if response is not None:
+      return response
+  body = render_json(content)
+  if etag is None:
+    etag = make_etag(body)
+    response = not_modified(request, etag)
+    if response is not None:
+      return response
+  return Response(content=body, media_type="application/json", headers=_cache_headers(etag))
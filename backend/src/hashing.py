@@ -0,0 +1,106 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import os
+import time
+
+from src.auth import get_password_hash as _get_password_hash, verify_password as _verify_password
+from src.metrics import hash_run, hash_wait
+
+# Config
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")  # "thread" or "process"
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+
+class HashPoolFull(Exception):
+  """Raised when the password hashing queue is at capacity."""
+
+def _timed_call(fn, *args):
+  # Runs inside the worker; time.monotonic is system-wide so it is
+  # comparable across processes as well as threads.
+  started = time.monotonic()
+  result = fn(*args)
+  return started, time.monotonic(), result
+
+class PasswordHashPool:
+  """
+  Runs bcrypt off the event loop on a bounded pool and rejects work
+  once more than max_queue calls are waiting for a worker.
+  """
+
+  def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue: int = 32):
+    if kind not in ("thread", "process"):
+      raise ValueError(f"Unknown hash pool kind: {kind}")
+    self.kind = kind
+    self.max_workers = max_workers
+    self.max_queue = max_queue
+    self._executor: Optional[Executor] = None
+    self._pending = 0
+    self.submitted = 0
+    self.completed = 0
+    self.rejected = 0
+    self.total_wait = 0.0
+    self.max_wait = 0.0
+    self.total_run = 0.0
+
+  def _get_executor(self) -> Executor:
+    if self._executor is None:
+      if self.kind == "process":
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+      else:
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+    return self._executor
+
+  async def run(self, fn, *args):
+    if self._pending >= self.max_workers + self.max_queue:
+      self.rejected += 1
+      raise HashPoolFull()
+
+    loop = asyncio.get_running_loop()
+    self._pending += 1
+    self.submitted += 1
+    queued_at = time.monotonic()
+    try:
+      started, finished, result = await loop.run_in_executor(self._get_executor(), _timed_call, fn, *args)
+    finally:
+      self._pending -= 1
+
+    wait = max(0.0, started - queued_at)
+    operation = fn.__name__.lstrip("_")
+    hash_wait.observe(wait, operation)
+    hash_run.observe(finished - started, operation)
+    self.completed += 1
+    self.total_wait += wait
+    self.max_wait = max(self.max_wait, wait)
+    self.total_run += finished - started
+    return result
+
+  def stats(self) -> dict:
+    in_flight = min(self._pending, self.max_workers)
+    return {
+      "kind": self.kind,
+      "max_workers": self.max_workers,
+      "max_queue": self.max_queue,
+      "in_flight": in_flight,
+      "queued": self._pending - in_flight,
+      "utilization": in_flight / self.max_workers,
+      "submitted": self.submitted,
+      "completed": self.completed,
+      "rejected": self.rejected,
+      "avg_wait_ms": (self.total_wait / self.completed * 1000) if self.completed else 0.0,
+      "max_wait_ms": self.max_wait * 1000,
+      "avg_run_ms": (self.total_run / self.completed * 1000) if self.completed else 0.0,
+    }
+
+  def shutdown(self):
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
+
+hash_pool = PasswordHashPool(kind=HASH_POOL_KIND, max_workers=HASH_POOL_SIZE, max_queue=HASH_QUEUE_LIMIT)
+
+async def get_password_hash(password: str) -> str:
+  return await hash_pool.run(_get_password_hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+  return await hash_pool.run(_verify_password, plain_password, hashed_password)
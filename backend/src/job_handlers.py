@@ -0,0 +1,7 @@
+"""Handlers for background jobs. Importing this module registers them with job_queue."""
+from src.jobs import job_queue
+
+@job_queue.handler("audit")
+async def record_audit(payload: dict):
+  # Record ids only: audit lines end up in plain application logs
+  print(f"Audit: {payload['action']} {payload.get('resource')} by {payload.get('actor')} at {payload['at']}")
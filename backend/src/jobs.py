@@ -0,0 +1,306 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import json
+import os
+import time
+
+from src.database import engine
+from src.metrics import Counter, Histogram, registry
+from src.models import Job
+
+# Config
+# Run the worker inside the API process. Set to false when a separate
+# worker (python -m src.worker) serves the queue.
+JOBS_WORKER_ENABLED = os.getenv("JOBS_WORKER_ENABLED", "true").lower() == "true"
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "4"))
+JOBS_POLL_S = float(os.getenv("JOBS_POLL_S", "1"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_RETRY_BASE_S = float(os.getenv("JOBS_RETRY_BASE_S", "5"))
+JOBS_RETRY_MAX_S = float(os.getenv("JOBS_RETRY_MAX_S", "600"))
+# A job that runs longer than its lease is cancelled and retried
+JOBS_LEASE_S = float(os.getenv("JOBS_LEASE_S", "300"))
+JOBS_SHUTDOWN_GRACE_S = float(os.getenv("JOBS_SHUTDOWN_GRACE_S", "10"))
+JOBS_RETENTION_H = float(os.getenv("JOBS_RETENTION_H", "168"))
+
+# Seconds. From a cheap audit write up to a job stuck behind retries.
+JOB_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+jobs_total = registry.register(Counter("jobs_total", "Finished job attempts by kind and outcome", ("kind", "outcome")))
+job_wait = registry.register(Histogram(
+  "job_queue_wait_seconds", "Time from a job becoming due to a worker starting it", ("kind",), buckets=JOB_BUCKETS,
+))
+job_duration = registry.register(Histogram(
+  "job_duration_seconds", "Time spent running a job attempt", ("kind", "outcome"), buckets=JOB_BUCKETS,
+))
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+def _now() -> datetime:
+  return datetime.now(timezone.utc)
+
+def _as_utc(value: datetime) -> datetime:
+  # SQLite hands back naive datetimes; they are stored as UTC
+  return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+class UnknownJobKind(Exception):
+  pass
+
+class JobQueue:
+  """
+  Persistent queue of background jobs in the jobs table.
+
+  enqueue() adds a job to the caller's session, so it is committed (or
+  rolled back) together with the write that caused it. Workers claim due
+  jobs by taking a lease on them, run at most `concurrency` at a time,
+  and retry failures with exponential backoff until max_attempts. Jobs
+  whose worker died are claimed again once their lease expires, so
+  handlers must be safe to run more than once.
+  """
+
+  def __init__(
+    self,
+    engine: AsyncEngine,
+    concurrency: int = 4,
+    poll_interval: float = 1.0,
+    max_attempts: int = 5,
+    retry_base: float = 5.0,
+    retry_max: float = 600.0,
+    lease: float = 300.0,
+    shutdown_grace: float = 10.0,
+    retention_hours: float = 168.0,
+  ):
+    self.engine = engine
+    self.concurrency = concurrency
+    self.poll_interval = poll_interval
+    self.max_attempts = max_attempts
+    self.retry_base = retry_base
+    self.retry_max = retry_max
+    self.lease = lease
+    self.shutdown_grace = shutdown_grace
+    self.retention = timedelta(hours=retention_hours)
+    self._handlers: Dict[str, Handler] = {}
+    self._wake: Optional[asyncio.Event] = None
+    self._task: Optional[asyncio.Task] = None
+    self._running: Set[asyncio.Task] = set()
+    self.depth: Dict[str, int] = {}
+    self._depth_at = 0.0
+    self.oldest_due_s = 0.0
+    self.enqueued = 0
+    self.claimed = 0
+    self.succeeded = 0
+    self.retried = 0
+    self.failed = 0
+    self.polls = 0
+    self.poll_errors = 0
+
+  def handler(self, kind: str):
+    """Register the coroutine that runs jobs of this kind."""
+    def register(fn: Handler) -> Handler:
+      self._handlers[kind] = fn
+      return fn
+    return register
+
+  def enqueue(self, db: AsyncSession, kind: str, payload: dict, delay: float = 0, max_attempts: Optional[int] = None) -> Job:
+    """Add a job to db's transaction; it becomes visible to workers on commit."""
+    now = _now()
+    job = Job(
+      kind=kind,
+      payload=json.dumps(payload),
+      status="queued",
+      attempts=0,
+      max_attempts=max_attempts or self.max_attempts,
+      run_at=now + timedelta(seconds=delay),
+      created_at=now,
+    )
+    db.add(job)
+    self.enqueued += 1
+    return job
+
+  def notify(self):
+    """Wake the in-process worker after committing new jobs, instead of waiting for its next poll."""
+    if self._wake is not None:
+      self._wake.set()
+
+  def _claimable(self, now: datetime):
+    return or_(
+      and_(Job.status == "queued", Job.run_at <= now),
+      and_(Job.status == "running", Job.locked_until < now),
+    )
+
+  async def _claim(self, limit: int) -> list:
+    now = _now()
+    async with self.engine.begin() as conn:
+      # SKIP LOCKED lets several workers claim side by side on Postgres.
+      # SQLite ignores it; the re-check in the UPDATE keeps two workers
+      # from claiming the same job either way.
+      ids = (await conn.execute(
+        select(Job.id).where(self._claimable(now)).order_by(Job.run_at).limit(limit).with_for_update(skip_locked=True)
+      )).scalars().all()
+      if not ids:
+        return []
+      result = await conn.execute(
+        update(Job)
+        .where(Job.id.in_(ids), self._claimable(now))
+        .values(status="running", attempts=Job.attempts + 1, locked_until=now + timedelta(seconds=self.lease))
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.run_at)
+      )
+      return result.mappings().all()
+
+  async def _finish(self, job, **values):
+    # attempts fences the write: if this attempt's lease expired and
+    # another worker claimed the job, that worker now owns the row
+    async with self.engine.begin() as conn:
+      await conn.execute(
+        update(Job).where(Job.id == job["id"], Job.attempts == job["attempts"], Job.status == "running").values(**values)
+      )
+
+  def backoff(self, attempts: int) -> float:
+    return min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+
+  async def _execute(self, job):
+    kind = job["kind"]
+    started = time.perf_counter()
+    job_wait.observe(max(0.0, (_now() - _as_utc(job["run_at"])).total_seconds()), kind)
+    try:
+      handler = self._handlers.get(kind)
+      if handler is None:
+        raise UnknownJobKind(f"No handler registered for job kind {kind!r}")
+      async with asyncio.timeout(self.lease):
+        result = await handler(json.loads(job["payload"]))
+    except asyncio.CancelledError:
+      # Shutting down: hand the job straight back rather than making it
+      # wait out its lease, and don't count this attempt
+      await self._finish(job, status="queued", attempts=job["attempts"] - 1, locked_until=None, run_at=_now())
+      raise
+    except Exception as e:
+      elapsed = time.perf_counter() - started
+      error = f"{type(e).__name__}: {e}"
+      if job["attempts"] >= job["max_attempts"] or isinstance(e, UnknownJobKind):
+        outcome = "failed"
+        self.failed += 1
+        print(f"Job {job['id']} ({kind}) failed after {job['attempts']} attempts: {error}")
+        await self._finish(job, status="failed", last_error=error, locked_until=None, finished_at=_now())
+      else:
+        outcome = "retry"
+        self.retried += 1
+        run_at = _now() + timedelta(seconds=self.backoff(job["attempts"]))
+        await self._finish(job, status="queued", last_error=error, locked_until=None, run_at=run_at)
+    else:
+      elapsed = time.perf_counter() - started
+      outcome = "done"
+      self.succeeded += 1
+      await self._finish(
+        job,
+        status="done",
+        result=None if result is None else json.dumps(result),
+        locked_until=None,
+        finished_at=_now(),
+      )
+    jobs_total.inc(kind, outcome)
+    job_duration.observe(elapsed, kind, outcome)
+
+  def _start(self, job):
+    task = asyncio.get_running_loop().create_task(self._execute(job))
+    self._running.add(task)
+
+    def done(task: asyncio.Task):
+      self._running.discard(task)
+      if not task.cancelled() and task.exception() is not None:
+        print(f"Job {job['id']} could not be recorded: {task.exception()}")
+      # A slot is free: claim the next job now
+      if self._wake is not None:
+        self._wake.set()
+
+    task.add_done_callback(done)
+
+  async def refresh_depth(self):
+    now = _now()
+    async with self.engine.connect() as conn:
+      rows = (await conn.execute(
+        select(Job.status, func.count(), func.min(Job.run_at)).where(Job.status != "done").group_by(Job.status)
+      )).all()
+    self.depth = {status: count for status, count, _ in rows}
+    oldest = next((run_at for status, _, run_at in rows if status == "queued"), None)
+    self.oldest_due_s = max(0.0, (now - _as_utc(oldest)).total_seconds()) if oldest is not None else 0.0
+
+  async def prune(self):
+    async with self.engine.begin() as conn:
+      await conn.execute(delete(Job).where(Job.status == "done", Job.finished_at < _now() - self.retention))
+
+  async def poll(self):
+    """Claim and start as many due jobs as there are free slots."""
+    free = self.concurrency - len(self._running)
+    if free > 0:
+      for job in await self._claim(free):
+        self.claimed += 1
+        self._start(job)
+    self.polls += 1
+    # Workers wake on every enqueue and finished job; counting the
+    # table once per poll interval is plenty
+    if time.monotonic() - self._depth_at >= self.poll_interval:
+      self._depth_at = time.monotonic()
+      await self.refresh_depth()
+    # Finished jobs only need clearing out occasionally
+    if self.polls % 1000 == 1:
+      await self.prune()
+
+  async def _run(self):
+    while True:
+      self._wake.clear()
+      try:
+        await self.poll()
+      except Exception as e:
+        self.poll_errors += 1
+        print(f"Job queue poll failed: {e}")
+      try:
+        await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+      except asyncio.TimeoutError:
+        pass
+
+  async def start(self):
+    self._wake = asyncio.Event()
+    self._task = asyncio.get_running_loop().create_task(self._run())
+
+  async def stop(self):
+    """Stop claiming, give running jobs shutdown_grace seconds, then requeue the rest."""
+    if self._task is None:
+      return
+    self._task.cancel()
+    self._task = None
+    if self._running:
+      _, pending = await asyncio.wait(set(self._running), timeout=self.shutdown_grace)
+      for task in pending:
+        task.cancel()
+      if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    self._wake = None
+
+  def stats(self) -> dict:
+    return {
+      "worker": self._task is not None,
+      "concurrency": self.concurrency,
+      "running": len(self._running),
+      "depth": {status: self.depth.get(status, 0) for status in ("queued", "running", "failed")},
+      "oldest_due_seconds": self.oldest_due_s,
+      "enqueued": self.enqueued,
+      "claimed": self.claimed,
+      "succeeded": self.succeeded,
+      "retried": self.retried,
+      "failed": self.failed,
+      "poll_errors": self.poll_errors,
+    }
+
+job_queue = JobQueue(
+  engine,
+  concurrency=JOBS_CONCURRENCY,
+  poll_interval=JOBS_POLL_S,
+  max_attempts=JOBS_MAX_ATTEMPTS,
+  retry_base=JOBS_RETRY_BASE_S,
+  retry_max=JOBS_RETRY_MAX_S,
+  lease=JOBS_LEASE_S,
+  shutdown_grace=JOBS_SHUTDOWN_GRACE_S,
+  retention_hours=JOBS_RETENTION_H,
+)
@@ -1,26 +1,62 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from dotenv import load_dotenv
 import os
 
-from src.database import init_db
-from src.routers import auth, chat, patients
-
+# Load .env before importing modules that read settings at import time
 load_dotenv()
 
+from src.database import check_engines, dispose_engines, get_pool_stats
+from src.hashing import hash_pool
+from src.auth import get_cache_stats
+from src.ai import close_ai_client, get_ai_stats
+from src.serialization import FAST_JSON, FastJSONResponse
+from src.chat_history import message_writer
+from src.patient_cache import patient_cache
+from src.revocation import revocation_list
+from src.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, registry
+from src.profiling import ProfilingMiddleware
+from src.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from src.ratelimit import RATE_LIMIT_ENABLED, RateLimitMiddleware, get_rate_limit_stats
+from src.jobs import JOBS_WORKER_ENABLED, job_queue
+import src.job_handlers
+from src.routers import auth, chat, patients
+
 origins = [ os.getenv("VITE_APP_URL") ]
+HEALTH_DB_TIMEOUT_S = float(os.getenv("HEALTH_DB_TIMEOUT_S", "2"))
 
 app = FastAPI(
   title="Dental Clinic Patient Assistant API",
   description="AI-powered patient management system for dental clinics",
   version="1.0.0",
+  # Only override when enabled: leaving the default in place keeps
+  # FastAPI's own Pydantic-to-bytes path for response models
+  **({"default_response_class": FastJSONResponse} if FAST_JSON else {}),
 )
 
-# Initialize the database
+# The schema is managed by Alembic (alembic upgrade head), so cold
+# starts do no DDL round-trips
 @app.on_event("startup")
-def on_startup():
-  init_db()
+async def on_startup():
+  await revocation_list.start()
+  if JOBS_WORKER_ENABLED:
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+  await revocation_list.stop()
+  # Running jobs get a grace period; unfinished ones go back on the queue
+  await job_queue.stop()
+  hash_pool.shutdown()
+  # Flush buffered chat messages before the engine goes away
+  await message_writer.close()
+  await dispose_engines()
+  await close_ai_client()
+
+# Inside CORS, so 429s carry CORS headers the browser can read
+if RATE_LIMIT_ENABLED:
+  app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,8 +64,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend: ETag for If-Match, and rate limit state
+    expose_headers=["ETag", "Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy"],
 )
 
+# Outside CORS and rate limiting, so every response body can be compressed
+if COMPRESSION_ENABLED:
+  app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(ProfilingMiddleware)
+
+# Added last so it wraps everything else, CORS included
+if METRICS_ENABLED:
+  app.add_middleware(MetricsMiddleware)
+
 security = HTTPBearer()
 
 @app.get("/")
@@ -40,6 +88,69 @@ async def root():
 async def health_check():
   return {"status": "healthy"}
 
+@app.get("/health/live")
+async def liveness():
+  # The process is up and serving; no dependencies are checked
+  return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness(response: Response):
+  databases = await check_engines(HEALTH_DB_TIMEOUT_S)
+  pools = get_pool_stats()
+  # Until the revocation list has synced once, revoked tokens would be accepted
+  revocation_synced = await revocation_list.wait_synced(HEALTH_DB_TIMEOUT_S)
+  ready = all(result["ok"] for result in databases.values()) and revocation_synced
+  if not ready:
+    response.status_code = 503
+  return {
+    "status": "ready" if ready else "unavailable",
+    "databases": databases,
+    "revocation": {"synced": revocation_synced, "last_error": revocation_list.last_error},
+    "pools": {name: {key: pool.get(key) for key in ("checked_out", "capacity", "saturation", "timeouts")} for name, pool in pools.items()},
+  }
+
+# Prometheus exposition. The JSON stats below are included as gauges.
+registry.add_collector("password_hash_pool", lambda: hash_pool.stats())
+registry.add_collector("auth_cache", get_cache_stats)
+registry.add_collector("db_pool", get_pool_stats)
+registry.add_collector("ai", get_ai_stats)
+registry.add_collector("chat_history", lambda: message_writer.stats())
+registry.add_collector("entity_cache_patient", lambda: patient_cache.stats())
+registry.add_collector("rate_limit", get_rate_limit_stats)
+registry.add_collector("jobs", lambda: job_queue.stats())
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+  return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/metrics/hashing")
+async def hashing_metrics():
+  return hash_pool.stats()
+
+@app.get("/metrics/auth-cache")
+async def auth_cache_metrics():
+  return get_cache_stats()
+
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+  return get_pool_stats()
+
+@app.get("/metrics/ai")
+async def ai_metrics():
+  return get_ai_stats()
+
+@app.get("/metrics/chat-history")
+async def chat_history_metrics():
+  return message_writer.stats()
+
+@app.get("/metrics/entity-cache")
+async def entity_cache_metrics():
+  return {"patient": patient_cache.stats()}
+
+@app.get("/metrics/jobs")
+async def jobs_metrics():
+  return job_queue.stats()
+
 app.include_router(auth.router, prefix="/api", tags=["Authentication"])
 app.include_router(patients.router, prefix="/api", tags=["Patients"])
 app.include_router(chat.router, prefix="/api", tags=["Chat"])
\ No newline at end of file
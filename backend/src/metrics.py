@@ -0,0 +1,245 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import math
+import os
+import re
+import time
+
+# Config
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers a cached GET (~1ms) up to a slow AI completion.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+def _escape(value: str) -> str:
+  return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+  pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+  if extra:
+    pairs.append(extra)
+  return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+  if value == math.inf:
+    return "+Inf"
+  return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+  kind = "untyped"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+    self.name = name
+    self.documentation = documentation
+    self.labelnames = tuple(labelnames)
+
+  def header(self) -> List[str]:
+    return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+  """
+  Monotonic counter. Updates are plain dict writes: every caller runs on
+  the event loop thread, so no locking is needed.
+  """
+  kind = "counter"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+    super().__init__(name, documentation, labelnames)
+    self._values: Dict[Tuple[str, ...], float] = {}
+
+  def inc(self, *labelvalues: str, amount: float = 1):
+    self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+  def render(self) -> List[str]:
+    return self.header() + [
+      f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in self._values.items()
+    ]
+
+class Gauge(Metric):
+  kind = "gauge"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+    super().__init__(name, documentation, labelnames)
+    self._values: Dict[Tuple[str, ...], float] = {}
+
+  def set(self, value: float, *labelvalues: str):
+    self._values[labelvalues] = value
+
+  def inc(self, *labelvalues: str, amount: float = 1):
+    self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+  def dec(self, *labelvalues: str, amount: float = 1):
+    self.inc(*labelvalues, amount=-amount)
+
+  def render(self) -> List[str]:
+    return self.header() + [
+      f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in self._values.items()
+    ]
+
+class Histogram(Metric):
+  """
+  Fixed-bucket histogram. observe() bumps a single bucket; the
+  cumulative counts Prometheus expects are only built on scrape.
+  """
+  kind = "histogram"
+
+  def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+    super().__init__(name, documentation, labelnames)
+    self.buckets = tuple(sorted(buckets))
+    # labels -> [per-bucket counts (+Inf last), sum]
+    self._series: Dict[Tuple[str, ...], list] = {}
+
+  def observe(self, value: float, *labelvalues: str):
+    series = self._series.get(labelvalues)
+    if series is None:
+      series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+    series[0][bisect_left(self.buckets, value)] += 1
+    series[1] += value
+
+  def render(self) -> List[str]:
+    lines = self.header()
+    for labels, (counts, total) in self._series.items():
+      cumulative = 0
+      for bound, count in zip((*self.buckets, math.inf), counts):
+        cumulative += count
+        le = 'le="' + _number(bound) + '"'
+        lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+      lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+      lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+    return lines
+
+def _flatten(prefix: str, data: dict):
+  for key, value in data.items():
+    name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+    if isinstance(value, dict):
+      yield from _flatten(name, value)
+    elif isinstance(value, bool):
+      yield name, int(value)
+    elif isinstance(value, (int, float)):
+      yield name, value
+
+class Registry:
+  def __init__(self):
+    self._metrics: List[Metric] = []
+    self._collectors: List[Tuple[str, Callable[[], dict]]] = []
+
+  def register(self, metric: Metric) -> Metric:
+    self._metrics.append(metric)
+    return metric
+
+  def add_collector(self, prefix: str, collect: Callable[[], dict]):
+    """Expose the numeric leaves of a stats() dict as gauges, read at scrape time."""
+    self._collectors.append((prefix, collect))
+
+  def render(self) -> str:
+    lines = []
+    for metric in self._metrics:
+      lines.extend(metric.render())
+    for prefix, collect in self._collectors:
+      try:
+        stats = collect()
+      except Exception as e:
+        print(f"Metrics collector {prefix} failed: {e}")
+        continue
+      for name, value in _flatten(prefix, stats):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+  "http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"),
+))
+http_latency = registry.register(Histogram(
+  "http_request_duration_seconds", "Time to the end of the response body", ("method", "route", "status"),
+))
+http_in_flight = registry.register(Gauge("http_requests_in_flight", "Requests currently being served"))
+db_queries = registry.register(Histogram(
+  "db_queries_per_request", "Statements executed per request", ("route",), buckets=COUNT_BUCKETS,
+))
+db_query_total = registry.register(Counter("db_queries_total", "Statements executed", ("engine",)))
+db_checkout = registry.register(Histogram(
+  "db_pool_checkout_seconds", "Time spent waiting for a pooled connection", ("pool",),
+))
+ai_latency = registry.register(Histogram(
+  "ai_request_duration_seconds", "AI provider call latency", ("mode", "outcome"),
+))
+ai_errors = registry.register(Counter("ai_errors_total", "AI provider failures by type", ("mode", "error")))
+hash_wait = registry.register(Histogram(
+  "password_hash_wait_seconds", "Time bcrypt calls waited for a worker", ("operation",),
+))
+hash_run = registry.register(Histogram(
+  "password_hash_run_seconds", "Time spent inside bcrypt", ("operation",),
+))
+
+class RequestStats:
+  __slots__ = ("queries",)
+
+  def __init__(self):
+    self.queries = 0
+
+# Set by the middleware for the duration of each request
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def record_query(engine_name: str):
+  db_query_total.inc(engine_name)
+  stats = current_request.get()
+  if stats is not None:
+    stats.queries += 1
+
+def route_template(scope: dict) -> str:
+  # The matched route's path pattern, never the raw URL: ids and query
+  # strings would give every request its own series
+  route = scope.get("route")
+  template = getattr(route, "path", None)
+  if template is None:
+    return "unmatched"
+  # Routes from a router included with a prefix only carry their own
+  # path, so find the static prefix their pattern was matched under
+  regex = getattr(route, "path_regex", None)
+  path = scope["path"]
+  if regex is not None and not regex.match(path):
+    for index in range(1, len(path)):
+      if path[index] == "/" and regex.match(path[index:]):
+        return path[:index] + template
+  return template
+
+class MetricsMiddleware:
+  """Pure ASGI middleware, so streamed responses are passed through untouched."""
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    status = "500"
+
+    async def send_wrapper(message):
+      nonlocal status
+      if message["type"] == "http.response.start":
+        status = str(message["status"])
+      await send(message)
+
+    stats = RequestStats()
+    token = current_request.set(stats)
+    http_in_flight.inc()
+    start = time.perf_counter()
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      elapsed = time.perf_counter() - start
+      http_in_flight.dec()
+      current_request.reset(token)
+      route = route_template(scope)
+      method = scope["method"]
+      http_requests.inc(method, route, status)
+      http_latency.observe(elapsed, method, route, status)
+      db_queries.observe(stats.queries, route)
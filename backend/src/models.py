@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Date
+from sqlalchemy import Column, Integer, String, DateTime, Text, Date, Index, ForeignKey
 from sqlalchemy.sql import func
 
 from src.database import Base
@@ -28,4 +28,89 @@ class Patient(Base):
   allergies = Column(Text)
   emergency_contact = Column(String)
   created_at = Column(DateTime(timezone=True), server_default=func.now())
-  updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+  updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+  # Bumped on every write; the ETag that If-Match preconditions compare against
+  version = Column(Integer, nullable=False, server_default="1")
+
+  __table_args__ = (
+    # Backs the "name" keyset sort: ORDER BY last_name, first_name, id
+    Index("ix_patients_name_id", "last_name", "first_name", "id"),
+  )
+
+class Conversation(Base):
+  __tablename__ = "conversations"
+
+  id = Column(Integer, primary_key=True, index=True)
+  user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+  patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
+  created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+  __table_args__ = (
+    Index("ix_conversations_user_patient", "user_id", "patient_id"),
+  )
+
+class Message(Base):
+  """One chat message. Rows are only ever inserted, never updated."""
+  __tablename__ = "messages"
+
+  id = Column(Integer, primary_key=True)
+  conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+  role = Column(String, nullable=False)  # "user" or "assistant"
+  content = Column(Text, nullable=False)
+  # Set by the app when the message is queued, not when the batch is flushed
+  created_at = Column(DateTime(timezone=True), nullable=False)
+
+  __table_args__ = (
+    # Backs history pages and the context window: newest messages first
+    Index("ix_messages_conversation_created", "conversation_id", "created_at", "id"),
+  )
+
+class RefreshToken(Base):
+  """
+  A refresh token, stored as a SHA-256 hash. Each login starts a session;
+  every refresh revokes the presented token and issues the next one in
+  the same session.
+  """
+  __tablename__ = "refresh_tokens"
+
+  id = Column(Integer, primary_key=True)
+  user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+  token_hash = Column(String(64), unique=True, nullable=False)
+  session_id = Column(String, nullable=False, index=True)
+  expires_at = Column(DateTime(timezone=True), nullable=False)
+  created_at = Column(DateTime(timezone=True), server_default=func.now())
+  revoked_at = Column(DateTime(timezone=True))
+
+class RevokedToken(Base):
+  """A revoked access-token jti or session id, kept until it would have expired anyway."""
+  __tablename__ = "revoked_tokens"
+
+  id = Column(String, primary_key=True)
+  expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+  revoked_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class Job(Base):
+  """
+  A unit of background work, run by the queue in src/jobs.py. A running
+  job holds a lease until locked_until; if its worker dies, the job is
+  claimed again once the lease runs out.
+  """
+  __tablename__ = "jobs"
+
+  id = Column(Integer, primary_key=True)
+  kind = Column(String, nullable=False)
+  payload = Column(Text, nullable=False)  # JSON
+  status = Column(String, nullable=False)  # "queued", "running", "done" or "failed"
+  attempts = Column(Integer, nullable=False, server_default="0")
+  max_attempts = Column(Integer, nullable=False)
+  run_at = Column(DateTime(timezone=True), nullable=False)
+  locked_until = Column(DateTime(timezone=True))
+  last_error = Column(Text)
+  result = Column(Text)  # JSON
+  created_at = Column(DateTime(timezone=True), nullable=False)
+  finished_at = Column(DateTime(timezone=True))
+
+  __table_args__ = (
+    # Backs claiming (due queued jobs, oldest first) and queue depth
+    Index("ix_jobs_status_run_at", "status", "run_at"),
+  )
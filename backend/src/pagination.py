@@ -0,0 +1,22 @@
+from typing import Any, List
+import base64
+import json
+
+class InvalidCursor(ValueError):
+  """Raised when a pagination cursor is malformed or was issued for another sort."""
+
+def encode_cursor(sort: str, values: List[Any]) -> str:
+  raw = json.dumps({"s": sort, "v": values}, separators=(",", ":")).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> List[Any]:
+  try:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    values = data["v"]
+    cursor_sort = data["s"]
+  except (ValueError, TypeError, KeyError):
+    raise InvalidCursor("Invalid cursor")
+  if cursor_sort != sort or not isinstance(values, list):
+    raise InvalidCursor("Cursor does not match the requested sort")
+  return values
@@ -0,0 +1,21 @@
+import os
+
+from src.cache import ReadThroughCache, create_backend
+from src.schemas import PatientResponse
+
+# Config
+PATIENT_CACHE_SIZE = int(os.getenv("PATIENT_CACHE_SIZE", "5000"))  # 0 disables
+PATIENT_CACHE_TTL = float(os.getenv("PATIENT_CACHE_TTL", "30"))
+# Patient records are PHI, so the shared tier is never inherited from
+# AUTH_CACHE_BACKEND: it is only used when set here explicitly
+PATIENT_CACHE_BACKEND = os.getenv("PATIENT_CACHE_BACKEND")  # "memory" or "redis"
+CACHE_URL = os.getenv("CACHE_URL")
+
+patient_cache = ReadThroughCache(
+  "patient",
+  maxsize=PATIENT_CACHE_SIZE,
+  ttl=PATIENT_CACHE_TTL,
+  backend=create_backend(PATIENT_CACHE_BACKEND, CACHE_URL),
+  serialize=lambda patient: patient.model_dump(mode="json"),
+  deserialize=PatientResponse.model_validate,
+)
@@ -0,0 +1,232 @@
+from contextvars import ContextVar
+from typing import Dict, Optional
+import asyncio
+import collections
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+from src.cache import TTLCache
+from src.metrics import Counter, registry, route_template
+
+# Config
+# Profiling is off unless enabled: PROFILE_SAMPLE_RATE profiles a random
+# share of requests, PROFILE_HEADER_ENABLED lets a client ask for one
+# with "X-Profile: 1".
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 disables
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+# Bound parameters may hold patient data, so they are not logged by default
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "false").lower() == "true"
+NPLUSONE_THRESHOLD = int(os.getenv("NPLUSONE_THRESHOLD", "10"))  # 0 disables
+
+PROFILE_HEADER = b"x-profile"
+EXPLAIN_EVERY_S = 300.0
+
+repeated_queries = registry.register(Counter(
+  "db_repeated_queries_total", "Requests that ran one statement NPLUSONE_THRESHOLD+ times", ("route",),
+))
+slow_queries = registry.register(Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("engine",)))
+
+# Statement text -> executions in the current request
+current_statements: ContextVar[Optional[collections.Counter]] = ContextVar("current_statements", default=None)
+
+def _frame_name(frame) -> str:
+  code = frame.f_code
+  return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _await_chain(coro) -> list:
+  # Walk a suspended task's coroutines down to whatever it awaits
+  names = []
+  while coro is not None and hasattr(coro, "cr_frame"):
+    if coro.cr_frame is not None:
+      names.append(_frame_name(coro.cr_frame))
+    coro = coro.cr_await
+  return names
+
+class StackSampler:
+  """
+  Samples the event loop thread from a background thread and attributes
+  each sample to the request task being profiled. When that task is
+  running, the sample is its Python stack. When it is suspended, the
+  sample is the chain of coroutines it is awaiting, under "(waiting)",
+  so time spent in the database or the AI provider shows up too.
+  Stacks are kept in the folded "a;b;c count" format that flamegraph.pl,
+  speedscope and inferno read.
+  """
+
+  def __init__(self, interval: float):
+    self.interval = interval
+    self._profiles: Dict[asyncio.Task, collections.Counter] = {}
+    self._lock = threading.Lock()
+    self._thread: Optional[threading.Thread] = None
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._loop_thread_id: Optional[int] = None
+
+  def start(self, task: asyncio.Task) -> collections.Counter:
+    samples = collections.Counter()
+    with self._lock:
+      self._loop = task.get_loop()
+      self._loop_thread_id = threading.get_ident()
+      self._profiles[task] = samples
+      if self._thread is None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+    return samples
+
+  def stop(self, task: asyncio.Task) -> collections.Counter:
+    with self._lock:
+      return self._profiles.pop(task, collections.Counter())
+
+  def _run(self):
+    while True:
+      time.sleep(self.interval)
+      with self._lock:
+        if not self._profiles:
+          self._thread = None
+          return
+        self._sample()
+
+  def _sample(self):
+    running = asyncio.current_task(self._loop)
+    frame = sys._current_frames().get(self._loop_thread_id)
+    for task, samples in self._profiles.items():
+      if task is running and frame is not None:
+        stack = []
+        while frame is not None:
+          stack.append(_frame_name(frame))
+          frame = frame.f_back
+        samples[";".join(reversed(stack))] += 1
+      else:
+        chain = _await_chain(task.get_coro())
+        samples[";".join(["(waiting)", *chain])] += 1
+
+sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+def write_profile(profile_id: str, samples: collections.Counter) -> str:
+  os.makedirs(PROFILE_DIR, exist_ok=True)
+  path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+  with open(path, "w") as f:
+    for stack, count in samples.most_common():
+      f.write(f"{stack} {count}\n")
+  return path
+
+def should_profile(scope: dict) -> bool:
+  if PROFILE_HEADER_ENABLED:
+    for name, value in scope["headers"]:
+      if name == PROFILE_HEADER:
+        return value not in (b"", b"0", b"false")
+  return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+class ProfilingMiddleware:
+  """
+  Counts the statements each request runs, to warn about N+1 query
+  patterns, and runs the stack sampler for requests chosen for
+  profiling. Profiled responses carry an X-Profile-Id header naming
+  the .folded file written to PROFILE_DIR.
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    profile_id = None
+    task = None
+    if should_profile(scope):
+      profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+      task = asyncio.current_task()
+      sampler.start(task)
+
+      async def send_with_profile_id(message):
+        if message["type"] == "http.response.start":
+          message.setdefault("headers", [])
+          message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+        await send(message)
+    else:
+      send_with_profile_id = send
+
+    statements = collections.Counter() if NPLUSONE_THRESHOLD > 0 else None
+    token = current_statements.set(statements)
+    try:
+      await self.app(scope, receive, send_with_profile_id)
+    finally:
+      current_statements.reset(token)
+      if task is not None:
+        path = write_profile(profile_id, sampler.stop(task))
+        print(f"Profiled {scope['method']} {scope['path']}: {path}")
+      if statements:
+        report_repeated_statements(scope, statements)
+
+def report_repeated_statements(scope: dict, statements: collections.Counter):
+  statement, count = statements.most_common(1)[0]
+  if count < NPLUSONE_THRESHOLD:
+    return
+  route = route_template(scope)
+  repeated_queries.inc(route)
+  print(f"Possible N+1 in {scope['method']} {route}: ran {count} times: {' '.join(statement.split())[:300]}")
+
+# Statements explained in the last EXPLAIN_EVERY_S. Bounded, since
+# statements with inlined values or IN lists are endless variations.
+_recently_explained = TTLCache(maxsize=1000, ttl=EXPLAIN_EVERY_S, name="explained_statements")
+
+def explain(conn, statement: str, parameters) -> Optional[str]:
+  # Plain EXPLAIN only; EXPLAIN ANALYZE would run the statement again
+  prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+  cursor = conn.connection.cursor()
+  try:
+    cursor.execute(prefix + statement, parameters)
+    return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+  finally:
+    cursor.close()
+
+def log_slow_query(conn, engine_name: str, statement: str, parameters, elapsed: float, executemany: bool):
+  slow_queries.inc(engine_name)
+  message = f"Slow query on {engine_name} ({elapsed * 1000:.1f}ms): {' '.join(statement.split())[:1000]}"
+  if SLOW_QUERY_LOG_PARAMS:
+    message += f"\n  parameters: {str(parameters)[:500]}"
+  # Explain SELECTs, at most once per statement every EXPLAIN_EVERY_S
+  if (
+    SLOW_QUERY_EXPLAIN
+    and not executemany
+    and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    and statement not in _recently_explained
+  ):
+    _recently_explained.set(statement, True)
+    try:
+      message += "\n  plan:\n    " + explain(conn, statement, parameters).replace("\n", "\n    ")
+    except Exception as e:
+      message += f"\n  plan unavailable: {e}"
+  print(message)
+
+def install_query_hooks(sync_engine, engine_name: str):
+  """Time every statement on the engine for the slow-query log and N+1 counts."""
+
+  @event.listens_for(sync_engine, "before_cursor_execute")
+  def before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+      context._query_started = time.perf_counter()
+    statements = current_statements.get()
+    if statements is not None:
+      statements[statement] += 1
+
+  @event.listens_for(sync_engine, "after_cursor_execute")
+  def after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None or SLOW_QUERY_MS <= 0:
+      return
+    elapsed = time.perf_counter() - started
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+      log_slow_query(conn, engine_name, statement, parameters, elapsed, executemany)
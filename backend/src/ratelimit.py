@@ -0,0 +1,288 @@
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+import json
+import math
+import os
+import time
+
+from src.auth import decode_token
+from src.metrics import Counter, registry
+
+# Config
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "redis"
+# Only trust X-Forwarded-For behind a proxy that sets it (Vercel, nginx)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+CACHE_URL = os.getenv("CACHE_URL")
+
+rate_limit_decisions = registry.register(Counter(
+  "rate_limit_decisions_total", "Rate limiter decisions by policy", ("policy", "outcome"),
+))
+
+class Policy:
+  """
+  `limit` requests per `period` seconds per key, of which up to `burst`
+  may arrive back to back. Policies match on path prefix and method;
+  `key` is "user" (the access token's subject, falling back to the
+  client IP) or "ip".
+  """
+
+  def __init__(
+    self,
+    name: str,
+    prefix: str,
+    limit: int,
+    period: float,
+    burst: Optional[int] = None,
+    methods: Optional[Sequence[str]] = None,
+    key: str = "user",
+  ):
+    self.name = name
+    self.prefix = prefix
+    self.methods = frozenset(methods) if methods else None
+    self.key = key
+    self.configure(limit, period, burst)
+
+  def configure(self, limit: int, period: float, burst: Optional[int] = None):
+    self.limit = limit
+    self.period = period
+    self.burst = burst or limit
+    # GCRA: one request is "emitted" every interval; a key may run up to
+    # burst intervals ahead of the clock
+    self.interval = period / limit
+    self.tolerance = self.interval * self.burst
+    # Advertise the sustained quota; burst only shows up in Remaining
+    self.header = f"{limit};w={period:g}"
+
+  def matches(self, method: str, path: str) -> bool:
+    return path.startswith(self.prefix) and (self.methods is None or method in self.methods)
+
+# First match wins. Override with RATE_LIMIT_<NAME>="limit/period[:burst]",
+# e.g. RATE_LIMIT_LOGIN="10/60:5"; a limit of 0 turns a policy off.
+DEFAULT_POLICIES = [
+  # bcrypt makes every login attempt expensive, so limit per IP
+  Policy("login", "/api/auth/login", 10, 60, burst=5, methods=("POST",), key="ip"),
+  Policy("register", "/api/auth/register", 5, 3600, burst=3, methods=("POST",), key="ip"),
+  Policy("refresh", "/api/auth/refresh", 30, 60, burst=10, methods=("POST",), key="ip"),
+  # Every chat turn is an AI call
+  Policy("chat", "/api/chat", 20, 60, burst=5, methods=("POST",)),
+  Policy("bulk", "/api/patients/import", 10, 3600, burst=2, methods=("POST",)),
+  Policy("api", "/api/", 600, 60, burst=100),
+]
+
+def load_policies(policies: List[Policy]) -> List[Policy]:
+  active = []
+  for policy in policies:
+    override = os.getenv(f"RATE_LIMIT_{policy.name.upper()}")
+    if override:
+      rate, _, burst = override.partition(":")
+      limit, _, period = rate.partition("/")
+      if int(limit) <= 0:
+        continue
+      policy.configure(int(limit), float(period or policy.period), int(burst) if burst else None)
+    active.append(policy)
+  return active
+
+class Decision:
+  __slots__ = ("allowed", "remaining", "reset", "retry_after")
+
+  def __init__(self, allowed: bool, remaining: int, reset: float, retry_after: float):
+    self.allowed = allowed
+    self.remaining = remaining
+    self.reset = reset
+    self.retry_after = retry_after
+
+def gcra(tat: Optional[float], now: float, policy: Policy) -> Tuple[Optional[float], Decision]:
+  """
+  Apply one request to a key whose theoretical arrival time is tat.
+  Returns the key's new tat (None when the request is rejected and the
+  stored value stands) and the decision.
+  """
+  tat = now if tat is None or tat < now else tat
+  new_tat = tat + policy.interval
+  allow_at = new_tat - policy.tolerance
+  if now < allow_at:
+    return None, Decision(False, 0, tat - now, allow_at - now)
+  # The epsilon keeps float error from rounding a whole request away
+  remaining = int((now - allow_at) / policy.interval + 1e-9)
+  return new_tat, Decision(True, remaining, new_tat - now, 0.0)
+
+class RateLimitStore:
+  async def hit(self, key: str, policy: Policy) -> Decision:
+    raise NotImplementedError
+
+class InMemoryRateLimitStore(RateLimitStore):
+  """
+  Per-process store: one float per key, in least recently used order.
+  Each hit is a read and a write with no await in between, so on the
+  event loop it needs no locks. Past max_keys the least recently used
+  keys are evicted, one per new key.
+  """
+
+  def __init__(self, max_keys: int = 100_000):
+    self.max_keys = max_keys
+    self._tats: "OrderedDict[str, float]" = OrderedDict()
+    self.evictions = 0
+
+  async def hit(self, key: str, policy: Policy) -> Decision:
+    now = time.monotonic()
+    new_tat, decision = gcra(self._tats.get(key), now, policy)
+    if new_tat is not None:
+      self._tats[key] = new_tat
+    if key in self._tats:
+      self._tats.move_to_end(key)
+    while len(self._tats) > self.max_keys:
+      # The oldest key has gone longest without a request, so it is the
+      # likeliest to be back to a full bucket already
+      self._tats.popitem(last=False)
+      self.evictions += 1
+    return decision
+
+  def __len__(self):
+    return len(self._tats)
+
+# GCRA as one atomic script, so every instance shares the same buckets.
+# Uses the server clock, so instances need no clock agreement.
+GCRA_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - tolerance
+if now < allow_at then
+  return {0, tostring(tat - now), tostring(allow_at - now)}
+end
+redis.call("SET", KEYS[1], tostring(new_tat), "PX", math.ceil((new_tat - now) * 1000))
+return {1, tostring(new_tat - now), tostring(now - allow_at)}
+"""
+
+class RedisRateLimitStore(RateLimitStore):
+  def __init__(self, url: str, prefix: str = "teraleads:ratelimit:"):
+    try:
+      import redis.asyncio as redis
+    except ImportError as e:
+      raise RuntimeError("The redis rate limit backend requires the 'redis' package") from e
+    self._client = redis.from_url(url)
+    self._script = self._client.register_script(GCRA_SCRIPT)
+    self.prefix = prefix
+
+  async def hit(self, key: str, policy: Policy) -> Decision:
+    allowed, reset, extra = await self._script(keys=[self.prefix + key], args=[policy.interval, policy.tolerance])
+    reset, extra = float(reset), float(extra)
+    if allowed:
+      return Decision(True, int(extra / policy.interval + 1e-9), reset, 0.0)
+    return Decision(False, 0, reset, extra)
+
+def create_rate_limit_store(kind: str, url: Optional[str] = None) -> RateLimitStore:
+  if kind == "memory":
+    return InMemoryRateLimitStore(RATE_LIMIT_MAX_KEYS)
+  if kind == "redis":
+    if not url:
+      raise ValueError("CACHE_URL must be set for the redis rate limit backend")
+    return RedisRateLimitStore(url)
+  raise ValueError(f"Unknown rate limit backend: {kind}")
+
+def client_ip(scope: dict) -> str:
+  if RATE_LIMIT_TRUST_FORWARDED:
+    for name, value in scope["headers"]:
+      if name == b"x-forwarded-for":
+        return value.decode("latin-1").split(",")[0].strip()
+  client = scope.get("client")
+  return client[0] if client else "unknown"
+
+def request_user(scope: dict) -> Optional[str]:
+  # The same subject auth.get_current_user resolves, from the cached
+  # token claims; no database lookup
+  for name, value in scope["headers"]:
+    if name == b"authorization":
+      scheme, _, token = value.decode("latin-1").partition(" ")
+      if scheme.lower() != "bearer" or not token:
+        return None
+      try:
+        return decode_token(token)["sub"]
+      except Exception:
+        return None
+  return None
+
+class RateLimitMiddleware:
+  """
+  Pure ASGI rate limiting. Allowed responses carry RateLimit-Limit,
+  RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy headers;
+  rejected requests get a 429 with Retry-After. If a shared store
+  fails, requests are let through.
+  """
+
+  def __init__(self, app, policies: Optional[List[Policy]] = None, store: Optional[RateLimitStore] = None):
+    self.app = app
+    self.policies = load_policies(DEFAULT_POLICIES) if policies is None else policies
+    # Not `or`: an empty in-memory store has len() 0 and is falsy
+    self.store = store if store is not None else rate_limit_store
+
+  def match(self, method: str, path: str) -> Optional[Policy]:
+    for policy in self.policies:
+      if policy.matches(method, path):
+        return policy
+    return None
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http" or scope["method"] == "OPTIONS":
+      await self.app(scope, receive, send)
+      return
+    policy = self.match(scope["method"], scope["path"])
+    if policy is None:
+      await self.app(scope, receive, send)
+      return
+
+    user = request_user(scope) if policy.key == "user" else None
+    key = f"{policy.name}:u:{user}" if user else f"{policy.name}:ip:{client_ip(scope)}"
+    try:
+      decision = await self.store.hit(key, policy)
+    except Exception as e:
+      rate_limit_decisions.inc(policy.name, "error")
+      print(f"Rate limit store error: {e}")
+      await self.app(scope, receive, send)
+      return
+
+    headers = [
+      (b"ratelimit-limit", str(policy.limit).encode()),
+      (b"ratelimit-remaining", str(decision.remaining).encode()),
+      (b"ratelimit-reset", str(math.ceil(decision.reset)).encode()),
+      (b"ratelimit-policy", policy.header.encode()),
+    ]
+    if not decision.allowed:
+      rate_limit_decisions.inc(policy.name, "rejected")
+      body = json.dumps({"detail": "Too many requests, please slow down."}).encode()
+      await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+          (b"content-type", b"application/json"),
+          (b"content-length", str(len(body)).encode()),
+          (b"retry-after", str(math.ceil(decision.retry_after)).encode()),
+          *headers,
+        ],
+      })
+      await send({"type": "http.response.body", "body": body})
+      return
+
+    rate_limit_decisions.inc(policy.name, "allowed")
+
+    async def send_with_headers(message):
+      if message["type"] == "http.response.start":
+        message["headers"] = [*message.get("headers", []), *headers]
+      await send(message)
+
+    await self.app(scope, receive, send_with_headers)
+
+rate_limit_store = create_rate_limit_store(RATE_LIMIT_BACKEND, CACHE_URL)
+
+def get_rate_limit_stats() -> dict:
+  data = {"backend": type(rate_limit_store).__name__}
+  if isinstance(rate_limit_store, InMemoryRateLimitStore):
+    data["keys"] = len(rate_limit_store)
+    data["evictions"] = rate_limit_store.evictions
+  return data
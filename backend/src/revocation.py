@@ -0,0 +1,231 @@
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import os
+import time
+
+from src.models import RevokedToken
+
+# Config
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "database")  # "database", "redis" or "memory"
+REVOCATION_SYNC_S = float(os.getenv("REVOCATION_SYNC_S", "5"))
+CACHE_URL = os.getenv("CACHE_URL")
+
+# Rows committed just before a sync may carry a slightly earlier
+# revoked_at than the watermark, so each sync re-reads this much
+SYNC_OVERLAP_S = 2.0
+
+# (id, expires_at, revoked_at) as Unix timestamps
+Revocation = Tuple[str, float, float]
+
+def _to_timestamp(value: datetime) -> float:
+  # SQLite hands back naive datetimes; they are stored as UTC
+  if value.tzinfo is None:
+    value = value.replace(tzinfo=timezone.utc)
+  return value.timestamp()
+
+def _to_datetime(timestamp: float) -> datetime:
+  return datetime.fromtimestamp(timestamp, timezone.utc)
+
+class RevocationBackend:
+  """Shared store of revocations, read by every instance's RevocationList."""
+
+  async def revoke(self, token_id: str, expires_at: float, revoked_at: float):
+    raise NotImplementedError
+
+  async def revoked_since(self, since: float) -> List[Revocation]:
+    raise NotImplementedError
+
+  async def prune(self, now: float):
+    pass
+
+class InMemoryRevocationBackend(RevocationBackend):
+  """Process-local stand-in for tests and single-worker deployments."""
+
+  def __init__(self):
+    self._rows: Dict[str, Tuple[float, float]] = {}
+
+  async def revoke(self, token_id: str, expires_at: float, revoked_at: float):
+    self._rows[token_id] = (expires_at, revoked_at)
+
+  async def revoked_since(self, since: float) -> List[Revocation]:
+    return [(token_id, expires_at, revoked_at) for token_id, (expires_at, revoked_at) in self._rows.items() if revoked_at > since]
+
+  async def prune(self, now: float):
+    self._rows = {token_id: row for token_id, row in self._rows.items() if row[0] > now}
+
+class DatabaseRevocationBackend(RevocationBackend):
+  """Revocations in the revoked_tokens table."""
+
+  def __init__(self, session_factory: async_sessionmaker):
+    self.session_factory = session_factory
+
+  async def revoke(self, token_id: str, expires_at: float, revoked_at: float):
+    async with self.session_factory() as db:
+      await db.merge(RevokedToken(id=token_id, expires_at=_to_datetime(expires_at), revoked_at=_to_datetime(revoked_at)))
+      await db.commit()
+
+  async def revoked_since(self, since: float) -> List[Revocation]:
+    async with self.session_factory() as db:
+      result = await db.execute(
+        select(RevokedToken.id, RevokedToken.expires_at, RevokedToken.revoked_at)
+        .where(RevokedToken.revoked_at > _to_datetime(since))
+      )
+      return [(token_id, _to_timestamp(expires_at), _to_timestamp(revoked_at)) for token_id, expires_at, revoked_at in result.all()]
+
+  async def prune(self, now: float):
+    async with self.session_factory() as db:
+      await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= _to_datetime(now)))
+      await db.commit()
+
+class RedisRevocationBackend(RevocationBackend):
+  """Revocations in a Redis sorted set scored by revocation time."""
+
+  def __init__(self, url: str, key: str = "teraleads:revoked"):
+    try:
+      import redis.asyncio as redis
+    except ImportError as e:
+      raise RuntimeError("The redis revocation backend requires the 'redis' package") from e
+    self._client = redis.from_url(url)
+    self.key = key
+
+  async def revoke(self, token_id: str, expires_at: float, revoked_at: float):
+    await self._client.zadd(self.key, {f"{token_id}|{expires_at}": revoked_at})
+
+  async def revoked_since(self, since: float) -> List[Revocation]:
+    rows = await self._client.zrangebyscore(self.key, f"({since}", "+inf", withscores=True)
+    revocations = []
+    for member, revoked_at in rows:
+      token_id, expires_at = (member.decode() if isinstance(member, bytes) else member).rsplit("|", 1)
+      revocations.append((token_id, float(expires_at), revoked_at))
+    return revocations
+
+  async def prune(self, now: float):
+    # Scores are revocation times, so expiry has to be read off each member
+    rows = await self._client.zrange(self.key, 0, -1)
+    stale = [member for member in rows if float((member.decode() if isinstance(member, bytes) else member).rsplit("|", 1)[1]) <= now]
+    if stale:
+      await self._client.zrem(self.key, *stale)
+
+class RevocationList:
+  """
+  In-memory set of revoked token and session ids, checked on every
+  request without leaving the process.
+
+  Entries are dropped once the token they revoke would have expired, so
+  the set only ever holds revocations from the last token lifetime. It
+  is synced from the shared backend every sync_interval seconds; a
+  revocation made on another instance takes effect here within that
+  interval, one made on this instance takes effect immediately.
+  """
+
+  def __init__(self, backend: RevocationBackend, sync_interval: float = 5.0):
+    self.backend = backend
+    self.sync_interval = sync_interval
+    self._revoked: Dict[str, float] = {}
+    self._watermark = 0.0
+    self._task: Optional[asyncio.Task] = None
+    self.checks = 0
+    self.hits = 0
+    self.syncs = 0
+    self.sync_errors = 0
+    self.last_sync: Optional[float] = None
+    self.last_error: Optional[str] = None
+    self._synced: Optional[asyncio.Event] = None
+
+  def is_revoked(self, *token_ids: Optional[str]) -> bool:
+    self.checks += 1
+    now = time.time()
+    for token_id in token_ids:
+      expires_at = self._revoked.get(token_id) if token_id else None
+      if expires_at is not None and expires_at > now:
+        self.hits += 1
+        return True
+    return False
+
+  async def revoke(self, token_id: str, expires_at: float):
+    now = time.time()
+    self._revoked[token_id] = max(expires_at, self._revoked.get(token_id, 0.0))
+    await self.backend.revoke(token_id, expires_at, now)
+
+  async def sync(self):
+    now = time.time()
+    rows = await self.backend.revoked_since(max(0.0, self._watermark - SYNC_OVERLAP_S))
+    for token_id, expires_at, revoked_at in rows:
+      if expires_at > now:
+        self._revoked[token_id] = max(expires_at, self._revoked.get(token_id, 0.0))
+      self._watermark = max(self._watermark, revoked_at)
+    self._revoked = {token_id: expires_at for token_id, expires_at in self._revoked.items() if expires_at > now}
+    self.syncs += 1
+    self.last_sync = now
+    self.last_error = None
+    # The shared store only needs cleaning occasionally
+    if self.syncs % 100 == 1:
+      await self.backend.prune(now)
+    if self._synced is not None:
+      self._synced.set()
+
+  async def _run(self):
+    while True:
+      try:
+        await self.sync()
+      except Exception as e:
+        self.sync_errors += 1
+        self.last_error = f"{type(e).__name__}: {e}"
+        print(f"Revocation sync failed: {e}")
+      await asyncio.sleep(self.sync_interval)
+
+  async def start(self):
+    # The first sync runs in the background task too, so an unreachable
+    # store delays readiness instead of failing startup
+    self._synced = asyncio.Event()
+    self._task = asyncio.get_running_loop().create_task(self._run())
+
+  @property
+  def synced(self) -> bool:
+    return self.last_sync is not None
+
+  async def wait_synced(self, timeout: float) -> bool:
+    """Wait up to timeout seconds for the first successful sync."""
+    if self.synced or self._synced is None:
+      return self.synced
+    try:
+      await asyncio.wait_for(self._synced.wait(), timeout)
+    except asyncio.TimeoutError:
+      pass
+    return self.synced
+
+  async def stop(self):
+    if self._task is not None:
+      self._task.cancel()
+      # Let an in-flight sync unwind before the engines are disposed
+      await asyncio.gather(self._task, return_exceptions=True)
+      self._task = None
+
+  def stats(self) -> dict:
+    return {
+      "backend": type(self.backend).__name__,
+      "entries": len(self._revoked),
+      "checks": self.checks,
+      "hits": self.hits,
+      "syncs": self.syncs,
+      "sync_errors": self.sync_errors,
+      "last_error": self.last_error,
+      "seconds_since_sync": time.time() - self.last_sync if self.last_sync else None,
+    }
+
+def create_revocation_backend(kind: str, url: Optional[str] = None) -> RevocationBackend:
+  if kind == "database":
+    from src.database import AsyncSessionLocal
+    return DatabaseRevocationBackend(AsyncSessionLocal)
+  if kind == "memory":
+    return InMemoryRevocationBackend()
+  if kind == "redis":
+    if not url:
+      raise ValueError("CACHE_URL must be set for the redis revocation backend")
+    return RedisRevocationBackend(url)
+  raise ValueError(f"Unknown revocation backend: {kind}")
+
+revocation_list = RevocationList(create_revocation_backend(REVOCATION_BACKEND, CACHE_URL), sync_interval=REVOCATION_SYNC_S)
@@ -1,22 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
 import os
+import time
+import uuid
 
 from src.schemas import (
-  LoginRequest,
+  LoginRequest, RefreshRequest,
   UserCreate, UserResponse, Token,
 )
 from src.database import get_db
+from src.models import User
 from src.crud import (
   create_user, authenticate_user,
-  get_user_by_email
+  create_refresh_token, get_refresh_token,
+  rotate_refresh_token, revoke_refresh_session,
 )
+from src.hashing import HashPoolFull
 from src.auth import (
+  ACCESS_TOKEN_EXPIRE_MINUTES,
+  REFRESH_TOKEN_EXPIRE_DAYS,
   create_access_token,
+  decode_token,
   get_current_user,
-  verify_token
 )
+from src.revocation import revocation_list
 
 router = APIRouter(prefix="/auth")
 security = HTTPBearer()
@@ -24,9 +33,35 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+def raise_hash_pool_full():
+  raise HTTPException(
+    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+    detail="Too many authentication requests, please try again shortly",
+    headers={"Retry-After": "1"},
+  )
+
+def issue_tokens(user: User, session_id: str, refresh_token: str) -> dict:
+  access_token = create_access_token(data={"sub": user.email, "sid": session_id})
+  return {
+    "access_token": access_token,
+    "token_type": "bearer",
+    "refresh_token": refresh_token,
+    "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+  }
+
+async def revoke_session(db: AsyncSession, session_id: str):
+  # Access tokens minted by the session live at most one lifetime from now
+  await revoke_refresh_session(db, session_id)
+  await revocation_list.revoke(session_id, time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-  db_user = create_user(db, user)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+  try:
+    db_user = await create_user(db, user)
+  except HashPoolFull:
+    raise_hash_pool_full()
   if not db_user:
     raise HTTPException(
       status_code=400,
@@ -35,66 +70,69 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
   return db_user
 
 @router.post("/login", response_model=Token)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
-  authenticated_user = authenticate_user(db, request.email, request.password)
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_db)):
+  try:
+    authenticated_user = await authenticate_user(db, request.email, request.password)
+  except HashPoolFull:
+    raise_hash_pool_full()
   if not authenticated_user:
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Incorrect email or password",
         headers={"WWW-Authenticate": "Bearer"},
     )
-  access_token = create_access_token(data={"sub": authenticated_user.email})
-  return {"access_token": access_token, "token_type": "bearer"}
+  # Each login is a session: its refresh tokens and the access tokens
+  # they mint share a session id, so the whole chain can be revoked
+  session_id = uuid.uuid4().hex
+  refresh_token = await create_refresh_token(db, authenticated_user.id, session_id, REFRESH_TOKEN_LIFETIME)
+  return issue_tokens(authenticated_user, session_id, refresh_token)
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(
-  credentials: HTTPAuthorizationCredentials = Depends(security),
-  db: Session = Depends(get_db)
-):
-    try:
-      token = credentials.credentials
-      email = verify_token(token)
-    except Exception:
-      raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid authentication credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-      )
-    
-    current_user = get_user_by_email(db, email)
-    if not current_user:
-      raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Not authenticated",
-        headers={"WWW-Authenticate": "Bearer"},
-      )
-    return current_user
+async def get_me(current_user: User = Depends(get_current_user)):
+  return current_user
 
 @router.post("/logout")
-async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    # Invalidate the token (if using a token store, otherwise just return success)
-    return {"message": "Successfully logged out"}
-
-@router.post("/refresh")
-async def refresh_token(
+async def logout(
   credentials: HTTPAuthorizationCredentials = Depends(security),
-  db: Session = Depends(get_db)
+  db: AsyncSession = Depends(get_db)
 ):
-    try:
-      token = credentials.credentials
-      email = verify_token(token)
-    except Exception:
-      raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid authentication credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-      )
-    current_user = get_user_by_email(db, email)
-    if not current_user:
-      raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not refresh token",
-        headers={"WWW-Authenticate": "Bearer"},
-      )
-    new_token = create_access_token(data={"sub": current_user.email})
-    return {"access_token": new_token, "token_type": "bearer"}
\ No newline at end of file
+  claims = decode_token(credentials.credentials)
+  if claims["sid"]:
+    await revoke_session(db, claims["sid"])
+  elif claims["jti"]:
+    await revocation_list.revoke(claims["jti"], claims["exp"])
+  return {"message": "Successfully logged out"}
+
+@router.post("/refresh", response_model=Token)
+async def refresh_token(request: RefreshRequest, db: AsyncSession = Depends(get_db)):
+  """
+  Exchange a refresh token for a new access token and a new refresh
+  token. Each refresh token works once: presenting a used one again
+  means it was copied, so the whole session is revoked.
+  """
+  invalid = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid refresh token",
+    headers={"WWW-Authenticate": "Bearer"},
+  )
+  current = await get_refresh_token(db, request.refresh_token)
+  if current is None or revocation_list.is_revoked(current.session_id):
+    raise invalid
+  expires_at = current.expires_at
+  if expires_at.tzinfo is None:
+    expires_at = expires_at.replace(tzinfo=timezone.utc)
+  if expires_at <= datetime.now(timezone.utc):
+    raise invalid
+
+  new_refresh_token = None
+  if current.revoked_at is None:
+    new_refresh_token = await rotate_refresh_token(db, current, REFRESH_TOKEN_LIFETIME)
+  if new_refresh_token is None:
+    print(f"Refresh token reuse detected, revoking session {current.session_id}")
+    await revoke_session(db, current.session_id)
+    raise invalid
+
+  user = await db.get(User, current.user_id)
+  if user is None:
+    raise invalid
+  return issue_tokens(user, current.session_id, new_refresh_token)
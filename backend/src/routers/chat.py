@@ -1,43 +1,167 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional, Tuple
+import json
 
 from src.schemas import (
   ChatResponse,
-  ChatMessage
+  ChatMessage,
+  ConversationCreate,
+  ConversationPage,
+  ConversationResponse,
+  MessagePage,
 )
 
+from src.database import get_db, get_read_db
+from src.models import Conversation, User
+from src.crud import (
+  create_conversation,
+  get_conversation,
+  get_conversations_page,
+  get_patient_cached,
+  get_messages_page,
+)
 from src.auth import get_current_user
-from src.ai import generate_ai_response
+from src.ai import get_ai_response, stream_ai_response
+from src.chat_history import build_context, message_writer
+from src.pagination import InvalidCursor
 
 router = APIRouter()
 
-# Option 1: Dummy reply (no external API)
+MAX_HISTORY_PAGE_SIZE = 200
+
+async def check_patient(db: AsyncSession, patient_id: Optional[int]):
+  if patient_id is not None and await get_patient_cached(db, patient_id) is None:
+    raise HTTPException(status_code=404, detail="Patient not found")
+
+async def prepare_turn(db: AsyncSession, user: User, message: ChatMessage) -> Tuple[Optional[Conversation], List[dict], Optional[str]]:
+  """
+  Resolve the conversation and assemble the model context: its recent
+  turns, plus the stored patient summary and any context the client sent.
+
+  Without a conversation_id the turn is stateless: nothing is stored, so
+  the chat path never waits on a commit. Clients that want history
+  create a conversation first (POST /chat/conversations).
+  """
+  conversation = None
+  if message.conversation_id is not None:
+    conversation = await get_conversation(db, message.conversation_id, user.id)
+    if conversation is None:
+      raise HTTPException(status_code=404, detail="Conversation not found")
+  else:
+    await check_patient(db, message.patient_id)
+  patient_id = conversation.patient_id if conversation is not None else message.patient_id
+  history, summary = await build_context(db, conversation.id if conversation else None, patient_id)
+  patient_context = "\n".join(part for part in (summary, message.patient_context) if part) or None
+  # Release the connection before the model is called: AI calls and
+  # streams outlast every query, and holding a pooled connection for
+  # them would let chat traffic starve the patient endpoints
+  await db.commit()
+  return conversation, history, patient_context
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatMessage, _: str = Depends(get_current_user)):
-  ai_response = generate_ai_response(request.message)
+async def chat(request: ChatMessage, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+  conversation, history, patient_context = await prepare_turn(db, current_user, request)
+  ai_response = await get_ai_response(request.message, patient_context, history, str(current_user.id))
+  if conversation is not None:
+    message_writer.append(conversation.id, "user", request.message)
+    message_writer.append(conversation.id, "assistant", ai_response)
   return ChatResponse(
     message=request.message,
     response=ai_response,
-    timestamp=request.timestamp
+    timestamp=request.timestamp,
+    conversation_id=conversation.id if conversation else None,
   )
 
-# Option 2: Use OpenAI (if you have an API key)
-# @router.post("/chat", response_model=ChatResponse)
-# async def chat_endpoint(
-#   message: ChatMessage,
-#   _: str = Depends(get_current_user)
-# ):
-#   try:
-#     ai_response = await get_ai_response(message.message, message.patient_context)
-#     return ChatResponse(
-#         message=message.message,
-#         response=ai_response,
-#         timestamp=message.timestamp
-#     )
-#   except Exception as e:
-#     # Fallback response if AI service fails
-#     return ChatResponse(
-#         message=message.message,
-#         response="I apologize, but I'm experiencing technical difficulties. Please consult with your dental professional for specific medical advice.",
-#         timestamp=message.timestamp
-#     )
\ No newline at end of file
+def sse_event(event: str, data: dict) -> str:
+  return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_event_stream(
+  request: Request,
+  message: ChatMessage,
+  conversation_id: Optional[int],
+  history: List[dict],
+  patient_context: Optional[str],
+  user: str,
+) -> AsyncIterator[str]:
+  tokens = stream_ai_response(message.message, patient_context, history, user)
+  chunks = []
+  try:
+    async for token in tokens:
+      # StreamingResponse cancels us on disconnect; this also catches
+      # disconnects while the model is between tokens
+      if await request.is_disconnected():
+        break
+      chunks.append(token)
+      yield sse_event("token", {"token": token})
+    else:
+      # Only complete exchanges are stored: a user turn without its reply
+      # would be sent to the model again on every later turn
+      if conversation_id is not None:
+        message_writer.append(conversation_id, "user", message.message)
+        message_writer.append(conversation_id, "assistant", "".join(chunks))
+      yield sse_event("done", {
+        "message": message.message,
+        "response": "".join(chunks),
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+        "conversation_id": conversation_id,
+      })
+  except Exception as e:
+    print(f"Chat stream error: {e}")
+    yield sse_event("error", {"detail": "The assistant is unavailable, please try again."})
+  finally:
+    # Stop the upstream model as soon as the client goes away
+    await tokens.aclose()
+
+@router.post("/chat/stream")
+async def chat_stream(request: Request, message: ChatMessage, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+  # prepare_turn does all the database work and releases the connection
+  # before streaming starts, so none is held for the length of the reply
+  conversation, history, patient_context = await prepare_turn(db, current_user, message)
+  return StreamingResponse(
+    chat_event_stream(
+      request, message, conversation.id if conversation else None, history, patient_context, str(current_user.id),
+    ),
+    media_type="text/event-stream",
+    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+  )
+
+@router.post("/chat/conversations", response_model=ConversationResponse)
+async def start_conversation(body: ConversationCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+  # One commit per conversation, so messages sent to it never wait on one
+  await check_patient(db, body.patient_id)
+  return await create_conversation(db, current_user.id, body.patient_id)
+
+@router.get("/chat/conversations", response_model=ConversationPage)
+async def list_conversations(
+  patient_id: Optional[int] = None,
+  limit: int = Query(20, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: AsyncSession = Depends(get_read_db),
+  current_user: User = Depends(get_current_user)
+):
+  try:
+    conversations, next_cursor = await get_conversations_page(db, current_user.id, patient_id, limit=limit, cursor=cursor)
+  except InvalidCursor as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  return ConversationPage(items=conversations, next_cursor=next_cursor)
+
+@router.get("/chat/conversations/{conversation_id}/messages", response_model=MessagePage)
+async def conversation_history(
+  conversation_id: int,
+  limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+  cursor: Optional[str] = None,
+  db: AsyncSession = Depends(get_db),
+  current_user: User = Depends(get_current_user)
+):
+  # Newest first. Reads the primary so just-flushed messages are visible.
+  if await get_conversation(db, conversation_id, current_user.id) is None:
+    raise HTTPException(status_code=404, detail="Conversation not found")
+  await message_writer.wait_written(conversation_id)
+  try:
+    messages, next_cursor = await get_messages_page(db, conversation_id, limit=limit, cursor=cursor)
+  except InvalidCursor as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  return MessagePage(items=messages, next_cursor=next_cursor)
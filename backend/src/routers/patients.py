@@ -1,66 +1,202 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 
-from src.database import get_db
+from src.database import get_db, get_read_db, read_engine
+from src.models import User
 from src.schemas import (
+  PatientBatchUpdate,
   PatientCreate,
+  PatientPage,
   PatientResponse,
+  PatientSummary,
+  PatientSummaryPage,
   PatientUpdate,
 )
 from src.crud import (
   create_patient,
   get_patients,
-  get_patient,
+  get_patients_page,
+  count_patients,
+  get_patient_cached,
   update_patient,
+  update_patients,
   delete_patient,
+  VersionConflict,
 )
 from src.auth import get_current_user
+from src.pagination import InvalidCursor
+from src.search import search_patients
+from src.bulk import export_patients, import_patients
+from src.etag import VALIDATOR_FIELDS, conditional_json_response, not_modified, parse_if_match, rows_etag, version_etag
+from src.serialization import FAST_JSON
 
 router = APIRouter(prefix="/patients")
 
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_RESULTS = 100
+
+PATIENT_FIELDS = tuple(PatientResponse.model_fields)
+SUMMARY_FIELDS = tuple(PatientSummary.model_fields)
+
+def parse_fields(view: str, fields: Optional[str]) -> Optional[List[str]]:
+  # None means full ORM rows; otherwise the columns to project, id first
+  if fields:
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(PATIENT_FIELDS))
+    if unknown:
+      raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", *names]))
+  if view == "summary":
+    return list(SUMMARY_FIELDS)
+  # The fast path reads full rows as Core mappings too, skipping ORM
+  # hydration and PatientResponse validation
+  return list(PATIENT_FIELDS) if FAST_JSON else None
+
+def serialize_patients(patients, fields: Optional[List[str]]):
+  if fields is None:
+    return [PatientResponse.model_validate(patient) for patient in patients]
+  return [{name: row[name] for name in fields} for row in patients]
+
 @router.post("/", response_model=PatientResponse)
-async def create(patient: PatientCreate, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
-  print(f"Creating patient: {patient}")
-  return create_patient(db, patient)
+async def create(patient: PatientCreate, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+  # Follow-up work (audit record) is queued and runs after the response
+  return await create_patient(db, patient, actor=user.email)
 
-@router.get("/", response_model=List[PatientResponse])
+@router.get("/", response_model=Union[List[PatientResponse], PatientPage, List[PatientSummary], PatientSummaryPage])
 async def list_patients(
+  request: Request,
   skip: int = 0,
   limit: int = 100,
-  db: Session = Depends(get_db),
+  paginate: str = Query("offset", pattern="^(offset|cursor)$"),
+  cursor: Optional[str] = None,
+  sort: str = Query("id", pattern="^-?(id|name)$"),
+  include_total: bool = False,
+  view: str = Query("full", pattern="^(full|summary)$"),
+  fields: Optional[str] = Query(None, description="Comma-separated patient fields to return; overrides view"),
+  db: AsyncSession = Depends(get_read_db),
+  _: str = Depends(get_current_user)
+):
+  projection = parse_fields(view, fields)
+  # The ETag columns are read even when not returned
+  columns = None if projection is None else list(dict.fromkeys([*projection, *VALIDATOR_FIELDS]))
+  shape = (request.url.query, projection or PATIENT_FIELDS)
+
+  # Legacy skip/limit mode returns a bare list; passing a cursor or
+  # paginate=cursor switches to keyset pagination and a page object
+  if paginate == "offset" and cursor is None:
+    patients = await get_patients(db, skip=skip, limit=limit, fields=columns)
+    # Unchanged pages are answered before any serialization
+    etag = rows_etag(patients, *shape)
+    response = not_modified(request, etag)
+    if response is not None:
+      return response
+    return conditional_json_response(request, serialize_patients(patients, projection), etag=etag)
+
+  try:
+    patients, next_cursor = await get_patients_page(
+      db, limit=min(max(limit, 1), MAX_PAGE_SIZE), cursor=cursor, sort=sort, fields=columns
+    )
+  except InvalidCursor as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  total = total_is_estimate = None
+  if include_total:
+    total, total_is_estimate = await count_patients(db)
+  etag = rows_etag(patients, *shape, next_cursor, total)
+  response = not_modified(request, etag)
+  if response is not None:
+    return response
+  page = {"items": serialize_patients(patients, projection), "next_cursor": next_cursor, "total": total, "total_is_estimate": total_is_estimate}
+  return conditional_json_response(request, page, etag=etag)
+
+@router.post("/import")
+async def bulk_import(
+  file: UploadFile = File(...),
+  format: str = Query("csv", pattern="^(csv|ndjson)$"),
+  on_conflict: str = Query("skip", pattern="^(skip|update)$"),
+  db: AsyncSession = Depends(get_db),
+  _: str = Depends(get_current_user)
+):
+  # The upload is spooled to a temporary file, so it is parsed and
+  # written in batches rather than held in memory
+  return await import_patients(db, file.file, fmt=format, on_conflict=on_conflict)
+
+# Declared before /{patient_id} so "export" isn't parsed as an id
+@router.get("/export")
+async def bulk_export(
+  format: str = Query("csv", pattern="^(csv|ndjson)$"),
   _: str = Depends(get_current_user)
 ):
-  return get_patients(db, skip=skip, limit=limit)
+  media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+  return StreamingResponse(
+    export_patients(read_engine, fmt=format),
+    media_type=media_type,
+    headers={"Content-Disposition": f'attachment; filename="patients.{format}"'},
+  )
+
+# Declared before /{patient_id} so "search" isn't parsed as an id
+@router.get("/search", response_model=PatientPage)
+async def search(
+  query: str = Query(..., min_length=1, max_length=100),
+  mode: str = Query("full", pattern="^(full|prefix)$"),
+  limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+  cursor: Optional[str] = None,
+  db: AsyncSession = Depends(get_read_db),
+  _: str = Depends(get_current_user)
+):
+  try:
+    patients, next_cursor = await search_patients(db, query, limit=limit, cursor=cursor, prefix=mode == "prefix")
+  except InvalidCursor as e:
+    raise HTTPException(status_code=400, detail=str(e))
+  return PatientPage(items=patients, next_cursor=next_cursor)
+
+@router.patch("/", response_model=List[PatientResponse])
+async def batch_update(batch: PatientBatchUpdate, db: AsyncSession = Depends(get_db), _: str = Depends(get_current_user)):
+  # All-or-nothing: the whole batch is one transaction
+  try:
+    return await update_patients(db, batch.items)
+  except LookupError as e:
+    raise HTTPException(status_code=404, detail=f"Patient {e.args[0]} not found")
+  except VersionConflict as e:
+    raise HTTPException(status_code=409, detail=str(e))
 
 @router.get("/{patient_id}", response_model=PatientResponse)
-async def get(patient_id: int, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
-  patient = get_patient(db, patient_id)
+async def get(request: Request, patient_id: int, db: AsyncSession = Depends(get_read_db), _: str = Depends(get_current_user)):
+  patient = await get_patient_cached(db, patient_id)
   if not patient:
     raise HTTPException(status_code=404, detail="Patient not found")
-  return patient
+  return conditional_json_response(request, patient, etag=version_etag(patient.version))
 
 @router.put("/{patient_id}", response_model=PatientResponse)
-async def update(patient_id: int, patient_update: PatientUpdate, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
-  patient = update_patient(db, patient_id, patient_update)
+async def update(
+  patient_id: int,
+  patient_update: PatientUpdate,
+  response: Response,
+  if_match: Optional[str] = Header(None),
+  db: AsyncSession = Depends(get_db),
+  _: str = Depends(get_current_user)
+):
+  try:
+    patient = await update_patient(db, patient_id, patient_update, versions=parse_if_match(if_match))
+  except VersionConflict as e:
+    raise HTTPException(status_code=412, detail=str(e))
   if not patient:
     raise HTTPException(status_code=404, detail="Patient not found")
+  response.headers["ETag"] = version_etag(patient["version"])
   return patient
 
 @router.delete("/{patient_id}", status_code=204)
-async def delete(patient_id: int, db: Session = Depends(get_db), _: str = Depends(get_current_user)):
-  success = delete_patient(db, patient_id)
+async def delete(
+  patient_id: int,
+  if_match: Optional[str] = Header(None),
+  db: AsyncSession = Depends(get_db),
+  _: str = Depends(get_current_user)
+):
+  try:
+    success = await delete_patient(db, patient_id, versions=parse_if_match(if_match))
+  except VersionConflict as e:
+    raise HTTPException(status_code=412, detail=str(e))
   if not success:
       raise HTTPException(status_code=404, detail="Patient not found")
   return {"message": "Patient deleted successfully"}
-
-@router.get("/search", response_model=List[PatientResponse])
-async def search_patients(
-  query: str,
-  db: Session = Depends(get_db),
-  _: str = Depends(get_current_user)
-):
-  patients = search_patients(db, query)
-  if not patients:
-      raise HTTPException(status_code=404, detail="No patients found")
-  return patients
\ No newline at end of file
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Optional
 
 class LoginRequest(BaseModel):
   email: EmailStr
@@ -22,6 +22,11 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
   access_token: str
   token_type: str
+  refresh_token: Optional[str] = None
+  expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+  refresh_token: str
 
 # Patient schemas
 class PatientBase(BaseModel):
@@ -55,17 +60,82 @@ class PatientResponse(PatientBase):
   id: int
   created_at: datetime
   updated_at: Optional[datetime] = None
+  version: int = 1
 
   class Config:
     from_attributes = True
 
+class PatientBatchUpdateItem(PatientUpdate):
+  id: int
+  # Applied only if the patient is still at this version
+  version: Optional[int] = None
+
+class PatientBatchUpdate(BaseModel):
+  items: List[PatientBatchUpdateItem] = Field(..., min_length=1, max_length=500)
+
+class PatientPage(BaseModel):
+  items: List[PatientResponse]
+  next_cursor: Optional[str] = None
+  total: Optional[int] = None
+  total_is_estimate: Optional[bool] = None
+
+# Table-view projection: no address or history text columns
+class PatientSummary(BaseModel):
+  id: int
+  first_name: str
+  last_name: str
+  email: Optional[str] = None
+  phone: Optional[str] = None
+
+  class Config:
+    from_attributes = True
+
+class PatientSummaryPage(BaseModel):
+  items: List[PatientSummary]
+  next_cursor: Optional[str] = None
+  total: Optional[int] = None
+  total_is_estimate: Optional[bool] = None
+
 # Chat schemas
 class ChatMessage(BaseModel):
   message: str
   patient_context: Optional[str] = None
   timestamp: Optional[datetime] = None
+  # Continue a stored conversation (POST /chat/conversations). Without
+  # one the turn is not stored; patient_id adds that patient's summary.
+  conversation_id: Optional[int] = None
+  patient_id: Optional[int] = None
 
 class ChatResponse(BaseModel):
   message: str
   response: str
-  timestamp: Optional[datetime] = None
\ No newline at end of file
+  timestamp: Optional[datetime] = None
+  conversation_id: Optional[int] = None
+
+class ConversationCreate(BaseModel):
+  patient_id: Optional[int] = None
+
+class ConversationResponse(BaseModel):
+  id: int
+  patient_id: Optional[int] = None
+  created_at: datetime
+
+  class Config:
+    from_attributes = True
+
+class ConversationPage(BaseModel):
+  items: List[ConversationResponse]
+  next_cursor: Optional[str] = None
+
+class MessageResponse(BaseModel):
+  id: int
+  role: str
+  content: str
+  created_at: datetime
+
+  class Config:
+    from_attributes = True
+
+class MessagePage(BaseModel):
+  items: List[MessageResponse]
+  next_cursor: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,108 @@
+from sqlalchemy import and_, case, func, literal, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import re
+
+from src.models import Patient
+from src.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+MAX_TERMS = 5
+MIN_PHONE_DIGITS = 3
+PHONE_QUERY = re.compile(r"^[\d\s+().-]+$")
+
+def normalize_phone(value: Optional[str]) -> str:
+  return re.sub(r"\D", "", value or "")
+
+def escape_like(value: str) -> str:
+  return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def phone_digits(dialect: str):
+  # Must match the expression index created in the search migration,
+  # so the arguments are inlined rather than bound
+  if dialect == "postgresql":
+    return func.regexp_replace(Patient.phone, literal_column(r"'\D'"), literal_column("''"), literal_column("'g'"))
+  expr = Patient.phone
+  for char in (" ", "-", "(", ")", "+", "."):
+    expr = func.replace(expr, char, "")
+  return expr
+
+def _term_score(term: str):
+  # Exact name match > name prefix > email prefix > substring anywhere
+  first_name = func.lower(Patient.first_name)
+  last_name = func.lower(Patient.last_name)
+  prefix = f"{escape_like(term)}%"
+  return case(
+    (or_(last_name == term, first_name == term), 4),
+    (or_(last_name.like(prefix, escape="\\"), first_name.like(prefix, escape="\\")), 3),
+    (func.lower(Patient.email).like(prefix, escape="\\"), 2),
+    else_=1,
+  )
+
+def build_search_filter(query: str, dialect: str, prefix: bool = False):
+  """
+  Returns (where clause, score expression) for a search query, or None
+  if the query has nothing to search on.
+
+  Phone-like queries match on the digits of the phone number. Anything
+  else is split into terms, and every term must match the first name,
+  last name or email. Full mode matches substrings, which the trigram
+  indexes serve. Prefix (typeahead) mode matches the start of the
+  column, which the lower() text_pattern_ops indexes serve.
+  """
+  query = query.strip().lower()
+  if not query:
+    return None
+
+  if PHONE_QUERY.match(query):
+    digits = normalize_phone(query)
+    if len(digits) >= MIN_PHONE_DIGITS:
+      pattern = f"{digits}%" if prefix else f"%{digits}%"
+      return phone_digits(dialect).like(pattern), literal(1)
+
+  terms = query.split()[:MAX_TERMS]
+  clauses = []
+  for term in terms:
+    escaped = escape_like(term)
+    pattern = f"{escaped}%" if prefix else f"%{escaped}%"
+    clauses.append(or_(
+      func.lower(Patient.first_name).like(pattern, escape="\\"),
+      func.lower(Patient.last_name).like(pattern, escape="\\"),
+      func.lower(Patient.email).like(pattern, escape="\\"),
+    ))
+  score = sum((_term_score(term) for term in terms[1:]), _term_score(terms[0]))
+  return and_(*clauses), score
+
+async def search_patients(
+  db: AsyncSession,
+  query: str,
+  limit: int = 20,
+  cursor: Optional[str] = None,
+  prefix: bool = False,
+):
+  search = build_search_filter(query, db.bind.dialect.name, prefix=prefix)
+  if search is None:
+    return [], None
+  where, score = search
+
+  # Keyset over (-score, last_name, first_name, id) so ranked results
+  # can be paged with a single ascending row comparison
+  rank = (-score).label("rank")
+  columns = (rank, Patient.last_name, Patient.first_name, Patient.id)
+  # Cursors are bound to the query and mode they were issued for
+  cursor_key = f"search:{'prefix' if prefix else 'full'}:{query.strip().lower()}"
+
+  stmt = select(Patient, rank).where(where)
+  if cursor:
+    values = decode_cursor(cursor, cursor_key)
+    if len(values) != len(columns):
+      raise InvalidCursor("Cursor does not match the requested search")
+    stmt = stmt.where(tuple_(-score, Patient.last_name, Patient.first_name, Patient.id) > tuple_(*values))
+  stmt = stmt.order_by(rank, Patient.last_name, Patient.first_name, Patient.id).limit(limit + 1)
+
+  rows = (await db.execute(stmt)).all()
+  next_cursor = None
+  if len(rows) > limit:
+    rows = rows[:limit]
+    patient, last_rank = rows[-1]
+    next_cursor = encode_cursor(cursor_key, [last_rank, patient.last_name, patient.first_name, patient.id])
+  return [patient for patient, _ in rows], next_cursor
@@ -0,0 +1,46 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import RowMapping
+from typing import Any
+import os
+import pydantic_core
+
+try:
+  import orjson
+except ImportError:  # only needed for the fast path
+  orjson = None
+
+# Config
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true"
+
+if FAST_JSON and orjson is None:
+  raise RuntimeError("FAST_JSON requires orjson to be installed")
+
+# UTC datetimes end in "Z", as Pydantic writes them
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z if orjson else 0
+
+def _orjson_default(obj: Any):
+  # orjson handles dicts, lists, str, numbers, date and datetime natively
+  if isinstance(obj, BaseModel):
+    return obj.model_dump()
+  if isinstance(obj, RowMapping):
+    return dict(obj)
+  return jsonable_encoder(obj)
+
+def render_json(content: Any) -> bytes:
+  """
+  Serialize content to JSON bytes. By default this goes through
+  Pydantic's serializer, producing the same bytes as FastAPI's
+  response_model path. With FAST_JSON, models, Core row mappings and
+  datetimes go straight to orjson instead.
+  """
+  if FAST_JSON:
+    return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
+  return pydantic_core.to_json(content)
+
+class FastJSONResponse(JSONResponse):
+  """JSONResponse rendered with orjson. The app default when FAST_JSON is set."""
+
+  def render(self, content: Any) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=ORJSON_OPTIONS)
@@ -0,0 +1,49 @@
+"""
+Standalone job worker: serves the background job queue without the API.
+Run the API with JOBS_WORKER_ENABLED=false when using it. Serves only
+health and metrics endpoints, on WORKER_PORT.
+
+  python -m src.worker
+"""
+from fastapi import FastAPI, Response
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+import uvicorn
+
+from src.database import dispose_engines
+from src.jobs import job_queue
+from src.metrics import CONTENT_TYPE, registry
+import src.job_handlers
+
+WORKER_PORT = int(os.getenv("WORKER_PORT", "8001"))
+
+app = FastAPI(title="Dental Clinic Job Worker")
+
+@app.on_event("startup")
+async def on_startup():
+  await job_queue.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+  await job_queue.stop()
+  await dispose_engines()
+
+@app.get("/health/live")
+async def liveness():
+  return {"status": "alive"}
+
+registry.add_collector("jobs", lambda: job_queue.stats())
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+  return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/metrics/jobs")
+async def jobs_metrics():
+  return job_queue.stats()
+
+if __name__ == "__main__":
+  uvicorn.run(app, host="0.0.0.0", port=WORKER_PORT)
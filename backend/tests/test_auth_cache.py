@@ -0,0 +1,23 @@
+import pytest
+
+from src.auth import principal_stats
+
+pytestmark = pytest.mark.anyio
+
+async def test_principal_is_loaded_once(client, auth):
+  loads = principal_stats["db_loads"]
+  for _ in range(3):
+    response = await client.get("/api/auth/me", headers=auth)
+    assert response.status_code == 200
+  assert principal_stats["db_loads"] == loads + 1
+
+async def test_unknown_principal_is_rejected(client):
+  from src.auth import create_access_token
+
+  token = create_access_token(data={"sub": "nobody@example.com"})
+  response = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+  assert response.status_code == 401
+
+async def test_missing_token_is_rejected(client):
+  response = await client.get("/api/auth/me")
+  assert response.status_code in (401, 403)
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+FIELDS = ["first_name", "last_name", "email", "phone", "date_of_birth", "allergies", "medical_history"]
+ROWS = [
+  {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "phone": "555 0100",
+   "date_of_birth": "1815-12-10", "allergies": "latex", "medical_history": "Line one\nline two, with a comma"},
+  {"first_name": "Zoë", "last_name": "Núñez", "email": "zoe@example.com", "phone": None,
+   "date_of_birth": None, "allergies": None, "medical_history": 'Quoted "history"'},
+  {"first_name": "Alan", "last_name": "Turing", "email": None, "phone": "555 0101",
+   "date_of_birth": "1912-06-23", "allergies": "penicillin", "medical_history": None},
+]
+
+def to_csv(rows, fields=FIELDS) -> str:
+  buffer = io.StringIO()
+  writer = csv.DictWriter(buffer, fieldnames=fields)
+  writer.writeheader()
+  for row in rows:
+    writer.writerow({name: "" if row.get(name) is None else row[name] for name in fields})
+  return buffer.getvalue()
+
+def to_ndjson(rows) -> str:
+  return "".join(json.dumps(row) + "\n" for row in rows)
+
+async def upload(client, auth, content: str, fmt: str = "csv", on_conflict: str = "skip") -> dict:
+  response = await client.post(
+    "/api/patients/import",
+    params={"format": fmt, "on_conflict": on_conflict},
+    files={"file": (f"patients.{fmt}", content.encode(), "text/plain")},
+    headers=auth,
+  )
+  assert response.status_code == 200, response.text
+  return response.json()
+
+async def export(client, auth, fmt: str) -> list:
+  response = await client.get("/api/patients/export", params={"format": fmt}, headers=auth)
+  assert response.status_code == 200
+  if fmt == "csv":
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    return [{name: value or None for name, value in row.items()} for row in rows]
+  return [json.loads(line) for line in response.text.splitlines()]
+
+def project(rows) -> list:
+  return [{name: row.get(name) for name in FIELDS} for row in rows]
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+async def test_round_trip(client, auth, fmt):
+  content = to_csv(ROWS) if fmt == "csv" else to_ndjson(ROWS)
+  report = await upload(client, auth, content, fmt)
+  assert (report["received"], report["written"], report["failed"]) == (3, 3, 0)
+  exported = await export(client, auth, fmt)
+  assert project(exported) == ROWS
+  assert all(row["id"] and row["version"] for row in exported)
+
+async def test_exported_csv_imports_back_unchanged(client, auth):
+  await upload(client, auth, to_csv(ROWS))
+  response = await client.get("/api/patients/export", headers=auth)
+  report = await upload(client, auth, response.text, on_conflict="update")
+  # The email-less row has nothing to conflict on, so it is added again
+  assert (report["written"], report["failed"]) == (3, 0)
+  assert project(await export(client, auth, "csv")) == ROWS + [ROWS[2]]
+
+async def test_skip_leaves_existing_patients_alone(client, auth):
+  await upload(client, auth, to_csv(ROWS[:1]))
+  changed = {**ROWS[0], "allergies": "none"}
+  report = await upload(client, auth, to_csv([changed]))
+  assert (report["written"], report["skipped"]) == (0, 1)
+  assert (await export(client, auth, "csv"))[0]["allergies"] == "latex"
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+async def test_update_keeps_columns_the_upload_leaves_out(client, auth, fmt):
+  await upload(client, auth, to_csv(ROWS[:2]))
+  # Ada: phone changes, allergies blank/null. Zoë: allergies set.
+  # medical_history isn't in the upload at all.
+  updates = [
+    {"first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", "phone": "555 0199", "allergies": None},
+    {"first_name": "Zoë", "last_name": "Núñez", "email": "zoe@example.com", "phone": None, "allergies": "latex"},
+  ]
+  fields = ["first_name", "last_name", "email", "phone", "allergies"]
+  content = to_csv(updates, fields) if fmt == "csv" else to_ndjson(updates)
+  report = await upload(client, auth, content, fmt, on_conflict="update")
+  assert (report["written"], report["failed"]) == (2, 0)
+
+  ada, zoe = await export(client, auth, "csv")
+  assert (ada["phone"], ada["allergies"], ada["medical_history"]) == ("555 0199", "latex", ROWS[0]["medical_history"])
+  assert (zoe["phone"], zoe["allergies"], zoe["medical_history"]) == (None, "latex", ROWS[1]["medical_history"])
+
+async def test_malformed_csv_rows_are_reported_and_skipped(client, auth):
+  content = to_csv([ROWS[0], {"first_name": "No", "email": "nolast@example.com"}, {**ROWS[1], "email": "not-an-email"}, ROWS[2]])
+  report = await upload(client, auth, content)
+  assert (report["received"], report["written"], report["failed"]) == (4, 2, 2)
+  # Header is line 1; Ada's history spans lines 2-3
+  assert [error["line"] for error in report["errors"]] == [4, 5]
+  assert report["errors"][0]["errors"][0]["loc"] == ["last_name"]
+  assert [row["email"] for row in await export(client, auth, "csv")] == ["ada@example.com", None]
+
+async def test_malformed_ndjson_lines_are_reported_and_skipped(client, auth):
+  content = to_ndjson(ROWS[:1]) + "{not json\n" + "[1, 2]\n" + "\n" + to_ndjson(ROWS[1:2])
+  report = await upload(client, auth, content, "ndjson")
+  assert (report["written"], report["failed"]) == (2, 2)
+  assert [error["line"] for error in report["errors"]] == [2, 3]
+
+async def test_duplicate_email_in_one_upload(client, auth):
+  report = await upload(client, auth, to_csv([ROWS[0], {**ROWS[0], "first_name": "Augusta"}]))
+  assert (report["written"], report["failed"]) == (1, 1)
+  assert (await export(client, auth, "csv"))[0]["first_name"] == "Ada"
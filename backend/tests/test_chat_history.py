@@ -0,0 +1,60 @@
+import pytest
+
+from src.routers import chat
+from src.routers.chat import chat_event_stream
+from src.schemas import ChatMessage
+
+pytestmark = pytest.mark.anyio
+
+class DisconnectingRequest:
+  """Stands in for the Request: the client goes away after `after` tokens."""
+
+  def __init__(self, after: int):
+    self.after = after
+    self.checks = 0
+
+  async def is_disconnected(self) -> bool:
+    self.checks += 1
+    return self.checks > self.after
+
+@pytest.fixture
+async def conversation_id(client, auth):
+  response = await client.post("/api/chat/conversations", json={}, headers=auth)
+  assert response.status_code == 200
+  return response.json()["id"]
+
+async def history(client, auth, conversation_id) -> list:
+  response = await client.get(f"/api/chat/conversations/{conversation_id}/messages", headers=auth)
+  assert response.status_code == 200
+  return [(item["role"], item["content"]) for item in response.json()["items"]]
+
+async def run_stream(request, conversation_id: int, text: str) -> list:
+  message = ChatMessage(message=text, conversation_id=conversation_id)
+  return [event async for event in chat_event_stream(request, message, conversation_id, [], None, "1")]
+
+async def test_completed_stream_stores_both_turns(client, auth, conversation_id):
+  events = await run_stream(DisconnectingRequest(after=10_000), conversation_id, "How often should I floss?")
+  assert events[-1].startswith("event: done")
+  turns = await history(client, auth, conversation_id)
+  assert [role for role, _ in turns] == ["assistant", "user"]
+  assert turns[1][1] == "How often should I floss?"
+
+async def test_disconnect_mid_stream_stores_nothing(client, auth, conversation_id):
+  events = await run_stream(DisconnectingRequest(after=1), conversation_id, "What helps with sensitive teeth?")
+  assert len(events) == 1 and events[0].startswith("event: token")
+  assert await history(client, auth, conversation_id) == []
+
+async def test_failed_stream_stores_nothing(client, auth, conversation_id, monkeypatch):
+  async def failing_stream(*args):
+    yield "Partial "
+    raise RuntimeError("upstream went away")
+
+  monkeypatch.setattr(chat, "stream_ai_response", failing_stream)
+  events = await run_stream(DisconnectingRequest(after=10_000), conversation_id, "Is whitening safe?")
+  assert events[-1].startswith("event: error")
+  assert await history(client, auth, conversation_id) == []
+
+async def test_non_streaming_chat_stores_both_turns(client, auth, conversation_id):
+  response = await client.post("/api/chat", json={"message": "Do I need an x-ray?", "conversation_id": conversation_id}, headers=auth)
+  assert response.status_code == 200
+  assert [role for role, _ in await history(client, auth, conversation_id)] == ["assistant", "user"]
@@ -0,0 +1,167 @@
+import gzip
+import zlib
+
+from starlette.datastructures import Headers
+import pytest
+
+from src.compression import CompressionMiddleware, brotli, choose_encoding
+
+pytestmark = pytest.mark.anyio
+
+needs_brotli = pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+
+# Large enough to clear COMPRESSION_MIN_SIZE
+HISTORY = "Routine cleaning, no complications. " * 60
+
+@pytest.fixture
+async def patient_url(create_patient):
+  patient = await create_patient(medical_history=HISTORY)
+  return f"/api/patients/{patient['id']}"
+
+async def test_encoded_responses_get_their_own_strong_etag(client, auth, patient_url):
+  plain = await client.get(patient_url, headers={**auth, "Accept-Encoding": "identity"})
+  gzipped = await client.get(patient_url, headers={**auth, "Accept-Encoding": "gzip"})
+  assert "content-encoding" not in plain.headers
+  assert plain.headers["etag"] == '"v1"'
+  assert gzipped.headers["content-encoding"] == "gzip"
+  assert gzipped.headers["etag"] == '"v1-gzip"'
+  assert gzipped.json() == plain.json()
+
+async def test_if_match_accepts_an_encoded_etag(client, auth, patient_url):
+  etag = (await client.get(patient_url, headers={**auth, "Accept-Encoding": "gzip"})).headers["etag"]
+  response = await client.put(patient_url, json={"allergies": "latex"}, headers={**auth, "If-Match": etag})
+  assert response.status_code == 200
+  # ...and the version in it is still checked
+  response = await client.put(patient_url, json={"allergies": "none"}, headers={**auth, "If-Match": etag})
+  assert response.status_code == 412
+
+async def test_revalidating_an_encoded_copy(client, auth, patient_url):
+  etag = (await client.get(patient_url, headers={**auth, "Accept-Encoding": "gzip"})).headers["etag"]
+  response = await client.get(patient_url, headers={**auth, "Accept-Encoding": "gzip", "If-None-Match": etag})
+  assert response.status_code == 304
+  assert response.headers["etag"] == etag
+
+async def test_weak_list_etags_are_shared_between_codings(client, auth, patient_url):
+  url = "/api/patients/?limit=10"
+  plain = await client.get(url, headers={**auth, "Accept-Encoding": "identity"})
+  gzipped = await client.get(url, headers={**auth, "Accept-Encoding": "gzip"})
+  assert gzipped.headers["content-encoding"] == "gzip"
+  assert plain.headers["etag"].startswith("W/")
+  assert gzipped.headers["etag"] == plain.headers["etag"]
+
+def asgi_app(content_type: str, chunks: list, headers: list = ()):
+  """An app that sends `chunks` as the body, recording what had gone out before each one."""
+  async def app(scope, receive, send):
+    await send({
+      "type": "http.response.start",
+      "status": 200,
+      "headers": [(b"content-type", content_type.encode()), *headers],
+    })
+    for index, chunk in enumerate(chunks):
+      app.seen_before.append(len(app.sent))
+      await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+  app.seen_before = []
+  app.sent = []
+  return app
+
+async def call(app, accept_encoding: str = "gzip", method: str = "GET", min_size: int = 1024) -> list:
+  async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+  async def send(message):
+    app.sent.append(message)
+
+  scope = {"type": "http", "method": method, "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+  await CompressionMiddleware(app, min_size=min_size)(scope, receive, send)
+  return app.sent
+
+def response_headers(messages: list) -> Headers:
+  return Headers(raw=messages[0]["headers"])
+
+def body(messages: list) -> bytes:
+  return b"".join(message.get("body", b"") for message in messages[1:])
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+  (None, None),
+  ("", None),
+  ("identity", None),
+  ("gzip", "gzip"),
+  pytest.param("gzip, deflate, br", "br", marks=needs_brotli),
+  ("br;q=0.5, gzip", "gzip"),
+  ("br;q=0, gzip;q=0.1", "gzip"),
+  ("gzip;q=0, br;q=0", None),
+  pytest.param("*", "br", marks=needs_brotli),
+  ("*, br;q=0", "gzip"),
+  ("gzip;q=bogus", None),
+  ("GZIP", "gzip"),
+])
+def test_choose_encoding(accept_encoding, expected):
+  assert choose_encoding(accept_encoding) == expected
+
+async def test_large_json_is_compressed_with_vary(anyio_backend):
+  payload = HISTORY.encode()
+  messages = await call(asgi_app("application/json", [payload], [(b"content-length", str(len(payload)).encode())]))
+  headers = response_headers(messages)
+  assert headers["content-encoding"] == "gzip"
+  assert headers["vary"] == "Accept-Encoding"
+  assert int(headers["content-length"]) == len(body(messages)) < len(payload)
+  assert gzip.decompress(body(messages)) == payload
+
+@needs_brotli
+async def test_brotli_when_preferred(anyio_backend):
+  payload = HISTORY.encode()
+  messages = await call(asgi_app("application/json", [payload]), accept_encoding="br")
+  assert response_headers(messages)["content-encoding"] == "br"
+  assert brotli.decompress(body(messages)) == payload
+
+async def test_vary_is_added_to_an_existing_one(anyio_backend):
+  messages = await call(asgi_app("application/json", [HISTORY.encode()], [(b"vary", b"Authorization")]))
+  assert response_headers(messages)["vary"] == "Authorization, Accept-Encoding"
+
+async def test_small_bodies_are_sent_as_is(anyio_backend):
+  payload = b'{"status": "ok"}'
+  messages = await call(asgi_app("application/json", [payload]))
+  headers = response_headers(messages)
+  assert "content-encoding" not in headers
+  assert body(messages) == payload
+
+async def test_min_size_is_inclusive(anyio_backend):
+  messages = await call(asgi_app("application/json", [b"x" * 100]), min_size=100)
+  assert response_headers(messages)["content-encoding"] == "gzip"
+
+async def test_no_compression_without_accept_encoding(anyio_backend):
+  payload = HISTORY.encode()
+  messages = await call(asgi_app("application/json", [payload]), accept_encoding="identity")
+  assert "content-encoding" not in response_headers(messages)
+  assert body(messages) == payload
+
+async def test_other_types_and_head_pass_through(anyio_backend):
+  payload = HISTORY.encode()
+  messages = await call(asgi_app("image/png", [payload]))
+  assert "content-encoding" not in response_headers(messages)
+  messages = await call(asgi_app("application/json", [payload]), method="HEAD")
+  assert "content-encoding" not in response_headers(messages)
+
+async def test_event_streams_pass_through_unbuffered(anyio_backend):
+  events = [f"data: token {n} {HISTORY}\n\n".encode() for n in range(3)]
+  app = asgi_app("text/event-stream", events)
+  messages = await call(app)
+  headers = response_headers(messages)
+  assert "content-encoding" not in headers and "vary" not in headers
+  # Every event went out before the app produced the next one
+  assert app.seen_before == [1, 2, 3]
+  assert [message["body"] for message in messages[1:]] == events
+
+async def test_streamed_bodies_are_flushed_chunk_by_chunk(anyio_backend):
+  rows = [f"{n},{HISTORY}\n".encode() for n in range(3)]
+  app = asgi_app("text/csv", rows, [(b"content-length", b"99999")])
+  messages = await call(app)
+  headers = response_headers(messages)
+  assert headers["content-encoding"] == "gzip"
+  assert "content-length" not in headers
+  assert app.seen_before == [0, 2, 3]
+  decoder = zlib.decompressobj(31)
+  # Each flushed chunk decodes on its own, without waiting for the rest
+  for row, message in zip(rows, messages[1:]):
+    assert decoder.decompress(message["body"]) == row
+  assert messages[-1]["more_body"] is False
@@ -0,0 +1,151 @@
+from datetime import timedelta
+import asyncio
+import json
+
+from sqlalchemy import select, update
+import pytest
+
+from src.database import AsyncSessionLocal, engine
+from src.jobs import JobQueue, _as_utc, _now
+from src.models import Job
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def queue(anyio_backend):
+  queue = JobQueue(engine, concurrency=2, max_attempts=3, retry_base=5.0, retry_max=60.0, lease=30.0, shutdown_grace=0.1)
+  yield queue
+  await queue.stop()
+  # Connections belong to this test's event loop
+  await engine.dispose()
+
+async def enqueue(queue: JobQueue, kind: str = "echo", payload: dict = None, **options) -> int:
+  async with AsyncSessionLocal() as db:
+    job = queue.enqueue(db, kind, payload or {}, **options)
+    await db.commit()
+    return job.id
+
+async def load(job_id: int) -> Job:
+  async with AsyncSessionLocal() as db:
+    return await db.get(Job, job_id)
+
+async def make_due(job_id: int):
+  async with engine.begin() as conn:
+    await conn.execute(update(Job).where(Job.id == job_id).values(run_at=_now() - timedelta(seconds=1)))
+
+async def run_due(queue: JobQueue):
+  """One poll, then wait for the jobs it started."""
+  await queue.poll()
+  await asyncio.gather(*queue._running)
+
+async def test_job_runs_once_and_stores_its_result(queue):
+  calls = []
+
+  @queue.handler("echo")
+  async def echo(payload):
+    calls.append(payload)
+    return {"echo": payload["value"]}
+
+  job_id = await enqueue(queue, payload={"value": 7})
+  await run_due(queue)
+  await run_due(queue)
+  job = await load(job_id)
+  assert calls == [{"value": 7}]
+  assert (job.status, job.attempts, json.loads(job.result)) == ("done", 1, {"echo": 7})
+  assert job.locked_until is None and job.finished_at is not None
+
+async def test_rolled_back_enqueue_leaves_no_job(queue):
+  async with AsyncSessionLocal() as db:
+    queue.enqueue(db, "echo", {})
+    await db.rollback()
+  async with AsyncSessionLocal() as db:
+    assert (await db.execute(select(Job))).first() is None
+
+async def test_failures_retry_with_backoff_then_fail(queue):
+  @queue.handler("flaky")
+  async def flaky(payload):
+    raise RuntimeError("upstream unavailable")
+
+  job_id = await enqueue(queue, "flaky")
+  for attempt in (1, 2):
+    before = _now()
+    await run_due(queue)
+    job = await load(job_id)
+    assert (job.status, job.attempts) == ("queued", attempt)
+    assert job.last_error == "RuntimeError: upstream unavailable"
+    # Backoff doubles: 5s after the first attempt, 10s after the second
+    delay = (_as_utc(job.run_at) - before).total_seconds()
+    assert queue.backoff(attempt) <= delay < queue.backoff(attempt) + 2
+    # Not due yet, so the next poll leaves it alone
+    await run_due(queue)
+    assert (await load(job_id)).attempts == attempt
+    await make_due(job_id)
+
+  await run_due(queue)
+  job = await load(job_id)
+  assert (job.status, job.attempts) == ("failed", 3)
+  assert queue.retried == 2 and queue.failed == 1
+
+def test_backoff_is_capped():
+  queue = JobQueue(engine, retry_base=5.0, retry_max=60.0)
+  assert [queue.backoff(n) for n in range(1, 7)] == [5.0, 10.0, 20.0, 40.0, 60.0, 60.0]
+
+async def test_unknown_kind_fails_without_retrying(queue):
+  job_id = await enqueue(queue, "nobody-handles-this")
+  await run_due(queue)
+  job = await load(job_id)
+  assert (job.status, job.attempts) == ("failed", 1)
+  assert job.last_error.startswith("UnknownJobKind")
+
+async def test_expired_lease_is_reclaimed_and_the_stale_worker_is_fenced(queue):
+  job_id = await enqueue(queue)
+  (stale,) = await queue._claim(1)
+  assert stale["attempts"] == 1
+  # A live lease keeps other workers off the job
+  assert await queue._claim(1) == []
+
+  # The first worker stalls past its lease
+  async with engine.begin() as conn:
+    await conn.execute(update(Job).where(Job.id == job_id).values(locked_until=_now() - timedelta(seconds=1)))
+  other = JobQueue(engine, lease=30.0)
+  (current,) = await other._claim(1)
+  assert (current["id"], current["attempts"]) == (job_id, 2)
+
+  # The stalled worker wakes up and reports; its write must not land
+  await queue._finish(stale, status="done", result=json.dumps("stale"), locked_until=None, finished_at=_now())
+  job = await load(job_id)
+  assert (job.status, job.attempts, job.result) == ("running", 2, None)
+
+  await other._finish(current, status="done", result=json.dumps("current"), locked_until=None, finished_at=_now())
+  job = await load(job_id)
+  assert (job.status, json.loads(job.result)) == ("done", "current")
+
+async def test_concurrency_limits_claims(queue):
+  release = asyncio.Event()
+
+  @queue.handler("slow")
+  async def slow(payload):
+    await release.wait()
+
+  ids = [await enqueue(queue, "slow") for _ in range(3)]
+  await queue.poll()
+  assert len(queue._running) == 2
+  release.set()
+  await asyncio.gather(*queue._running)
+  await run_due(queue)
+  assert [(await load(job_id)).status for job_id in ids] == ["done"] * 3
+
+async def test_stop_requeues_running_jobs_without_using_an_attempt(queue):
+  started = asyncio.Event()
+
+  @queue.handler("stuck")
+  async def stuck(payload):
+    started.set()
+    await asyncio.sleep(60)
+
+  job_id = await enqueue(queue, "stuck")
+  await queue.start()
+  await asyncio.wait_for(started.wait(), 5)
+  await queue.stop()
+  job = await load(job_id)
+  assert (job.status, job.attempts, job.locked_until) == ("queued", 0, None)
@@ -0,0 +1,74 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+NAMES = [("Ada", "Lovelace"), ("Alan", "Turing"), ("Grace", "Hopper"), ("Alan", "Kay"), ("Ada", "Turing")]
+
+async def walk(client, auth, **params) -> list:
+  """Follow next_cursor to the end; every patient seen, in order."""
+  seen, cursor = [], None
+  while True:
+    query = {"paginate": "cursor", **params, **({"cursor": cursor} if cursor else {})}
+    response = await client.get("/api/patients/", params=query, headers=auth)
+    assert response.status_code == 200, response.text
+    page = response.json()
+    assert len(page["items"]) <= params["limit"]
+    seen += page["items"]
+    cursor = page["next_cursor"]
+    if cursor is None:
+      return seen
+
+@pytest.fixture
+async def patients(create_patient):
+  # Repeated names make the id tie-breaker matter
+  return [await create_patient(first, last) for _ in range(3) for first, last in NAMES]
+
+@pytest.mark.parametrize("limit", [1, 4, 15, 100])
+async def test_cursor_walk_by_id(client, auth, patients, limit):
+  seen = await walk(client, auth, limit=limit)
+  assert [p["id"] for p in seen] == sorted(p["id"] for p in patients)
+
+async def test_cursor_walk_by_id_descending(client, auth, patients):
+  seen = await walk(client, auth, limit=4, sort="-id")
+  assert [p["id"] for p in seen] == sorted((p["id"] for p in patients), reverse=True)
+
+@pytest.mark.parametrize("sort", ["name", "-name"])
+async def test_cursor_walk_by_name(client, auth, patients, sort):
+  seen = await walk(client, auth, limit=4, sort=sort)
+  expected = sorted(patients, key=lambda p: (p["last_name"], p["first_name"], p["id"]), reverse=sort.startswith("-"))
+  assert [p["id"] for p in seen] == [p["id"] for p in expected]
+
+async def test_rows_added_behind_the_cursor_are_not_repeated(client, auth, patients, create_patient):
+  response = await client.get("/api/patients/", params={"paginate": "cursor", "limit": 5}, headers=auth)
+  first = response.json()
+  late = await create_patient("Late", "Arrival")
+  rest = await walk(client, auth, limit=5, cursor=first["next_cursor"])
+  ids = [p["id"] for p in first["items"] + rest]
+  assert len(ids) == len(set(ids)) == len(patients) + 1
+  assert ids[-1] == late["id"]
+
+async def test_summary_view_pages(client, auth, patients):
+  seen = await walk(client, auth, limit=6, view="summary")
+  assert len(seen) == len(patients)
+  assert "medical_history" not in seen[0]
+
+async def test_include_total(client, auth, patients):
+  response = await client.get("/api/patients/", params={"paginate": "cursor", "limit": 2, "include_total": True}, headers=auth)
+  page = response.json()
+  assert page["total"] == len(patients)
+  assert page["total_is_estimate"] is False
+
+async def test_malformed_cursor_is_rejected(client, auth, patients):
+  response = await client.get("/api/patients/", params={"cursor": "not-a-cursor"}, headers=auth)
+  assert response.status_code == 400
+
+async def test_cursor_from_another_sort_is_rejected(client, auth, patients):
+  response = await client.get("/api/patients/", params={"paginate": "cursor", "limit": 2}, headers=auth)
+  cursor = response.json()["next_cursor"]
+  response = await client.get("/api/patients/", params={"cursor": cursor, "sort": "name"}, headers=auth)
+  assert response.status_code == 400
+
+async def test_offset_mode_still_returns_a_list(client, auth, patients):
+  response = await client.get("/api/patients/", params={"skip": 2, "limit": 3}, headers=auth)
+  assert response.status_code == 200
+  assert [p["id"] for p in response.json()] == sorted(p["id"] for p in patients)[2:5]
@@ -0,0 +1,144 @@
+import asyncio
+import shutil
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import pytest
+
+from conftest import TEST_DB_PATH
+from src.cache import ReadThroughCache
+from src.crud import get_patient
+from src.database import get_read_db
+from src.patient_cache import patient_cache
+
+pytestmark = pytest.mark.anyio
+
+async def test_detail_reads_are_served_from_the_cache(client, auth, create_patient):
+  patient = await create_patient()
+  loads = patient_cache.loads
+  for _ in range(3):
+    response = await client.get(f"/api/patients/{patient['id']}", headers=auth)
+    assert response.status_code == 200
+  assert patient_cache.loads == loads + 1
+
+async def test_update_invalidates(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  await client.get(url, headers=auth)
+  await client.put(url, json={"allergies": "latex"}, headers=auth)
+  response = await client.get(url, headers=auth)
+  assert response.json()["allergies"] == "latex"
+  assert response.headers["etag"] == '"v2"'
+
+async def test_batch_update_invalidates(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  await client.get(url, headers=auth)
+  await client.patch("/api/patients/", json={"items": [{"id": patient["id"], "phone": "555"}]}, headers=auth)
+  assert (await client.get(url, headers=auth)).json()["phone"] == "555"
+
+async def test_delete_invalidates(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  await client.get(url, headers=auth)
+  await client.delete(url, headers=auth)
+  assert (await client.get(url, headers=auth)).status_code == 404
+
+async def test_import_invalidates(client, auth, create_patient):
+  patient = await create_patient(email="ada@example.com")
+  url = f"/api/patients/{patient['id']}"
+  await client.get(url, headers=auth)
+  csv = "first_name,last_name,email,allergies\nAda,Lovelace,ada@example.com,penicillin\n"
+  response = await client.post(
+    "/api/patients/import",
+    params={"on_conflict": "update"},
+    files={"file": ("patients.csv", csv, "text/csv")},
+    headers=auth,
+  )
+  assert response.status_code == 200, response.text
+  assert (await client.get(url, headers=auth)).json()["allergies"] == "penicillin"
+
+async def test_cache_is_not_filled_from_a_lagging_replica(client, auth, create_patient, tmp_path):
+  from src.main import app
+
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  # A copy taken before the write stands in for a replica that hasn't caught up
+  replica_path = tmp_path / "replica.db"
+  shutil.copy(TEST_DB_PATH, replica_path)
+  replica = create_async_engine(f"sqlite+aiosqlite:///{replica_path}")
+
+  async def lagging_read_db():
+    async with AsyncSession(replica) as db:
+      yield db
+
+  app.dependency_overrides[get_read_db] = lagging_read_db
+  try:
+    await client.put(url, json={"allergies": "latex"}, headers=auth)
+    async with AsyncSession(replica) as db:
+      assert (await get_patient(db, patient["id"])).allergies is None
+    for _ in range(2):
+      response = await client.get(url, headers=auth)
+      assert response.json()["allergies"] == "latex"
+      assert response.headers["etag"] == '"v2"'
+  finally:
+    app.dependency_overrides.pop(get_read_db, None)
+    await replica.dispose()
+
+async def test_concurrent_misses_are_coalesced(anyio_backend):
+  cache = ReadThroughCache("test")
+  calls = 0
+  release = asyncio.Event()
+
+  async def load():
+    nonlocal calls
+    calls += 1
+    await release.wait()
+    return {"id": 1}
+
+  readers = [asyncio.ensure_future(cache.get(1, load)) for _ in range(10)]
+  await asyncio.sleep(0)
+  release.set()
+  results = await asyncio.gather(*readers)
+  assert calls == 1
+  assert cache.coalesced == 9
+  assert all(result == {"id": 1} for result in results)
+
+async def test_load_overlapping_a_write_is_not_cached(anyio_backend):
+  cache = ReadThroughCache("test")
+  release = asyncio.Event()
+
+  async def stale_load():
+    await release.wait()
+    return "before write"
+
+  reader = asyncio.ensure_future(cache.get(1, stale_load))
+  await asyncio.sleep(0)
+  await cache.invalidate(1)
+  release.set()
+  # The reader that started first still gets its answer...
+  assert await reader == "before write"
+
+  # ...but it isn't cached over the write
+  async def fresh_load():
+    return "after write"
+
+  assert await cache.get(1, fresh_load) == "after write"
+
+async def test_failed_load_reaches_every_waiter_and_is_not_cached(anyio_backend):
+  cache = ReadThroughCache("test")
+  release = asyncio.Event()
+
+  async def failing_load():
+    await release.wait()
+    raise RuntimeError("database is down")
+
+  readers = [asyncio.ensure_future(cache.get(1, failing_load)) for _ in range(3)]
+  await asyncio.sleep(0)
+  release.set()
+  results = await asyncio.gather(*readers, return_exceptions=True)
+  assert all(isinstance(result, RuntimeError) for result in results)
+
+  async def load():
+    return "recovered"
+
+  assert await cache.get(1, load) == "recovered"
@@ -0,0 +1,71 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_detail_etag_is_the_version(client, auth, create_patient):
+  patient = await create_patient()
+  response = await client.get(f"/api/patients/{patient['id']}", headers=auth)
+  assert response.headers["etag"] == '"v1"'
+  response = await client.get(f"/api/patients/{patient['id']}", headers={**auth, "If-None-Match": '"v1"'})
+  assert response.status_code == 304
+
+async def test_update_with_current_version(client, auth, create_patient):
+  patient = await create_patient()
+  response = await client.put(f"/api/patients/{patient['id']}", json={"allergies": "latex"}, headers={**auth, "If-Match": '"v1"'})
+  assert response.status_code == 200
+  assert response.headers["etag"] == '"v2"'
+  assert response.json()["version"] == 2
+
+async def test_stale_update_is_rejected(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  await client.put(url, json={"allergies": "latex"}, headers={**auth, "If-Match": '"v1"'})
+
+  # A second writer still holding v1 must not overwrite the first
+  response = await client.put(url, json={"allergies": "none"}, headers={**auth, "If-Match": '"v1"'})
+  assert response.status_code == 412
+  assert (await client.get(url, headers=auth)).json()["allergies"] == "latex"
+
+async def test_weak_tags_never_match(client, auth, create_patient):
+  patient = await create_patient()
+  response = await client.put(f"/api/patients/{patient['id']}", json={"allergies": "latex"}, headers={**auth, "If-Match": 'W/"v1"'})
+  assert response.status_code == 412
+
+async def test_unconditional_update_bumps_the_version(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  for expected in (2, 3):
+    response = await client.put(url, json={"phone": str(expected)}, headers=auth)
+    assert response.json()["version"] == expected
+  assert (await client.put(url, json={"phone": "0"}, headers={**auth, "If-Match": "*"})).status_code == 200
+
+async def test_stale_delete_is_rejected(client, auth, create_patient):
+  patient = await create_patient()
+  url = f"/api/patients/{patient['id']}"
+  await client.put(url, json={"allergies": "latex"}, headers=auth)
+  assert (await client.delete(url, headers={**auth, "If-Match": '"v1"'})).status_code == 412
+  assert (await client.delete(url, headers={**auth, "If-Match": '"v2"'})).status_code == 204
+  assert (await client.get(url, headers=auth)).status_code == 404
+
+async def test_missing_patient_is_404_not_412(client, auth):
+  response = await client.put("/api/patients/999999", json={"allergies": "latex"}, headers={**auth, "If-Match": '"v1"'})
+  assert response.status_code == 404
+
+async def test_batch_update_is_all_or_nothing_on_conflict(client, auth, create_patient):
+  first, second = await create_patient(), await create_patient("Grace", "Hopper")
+  await client.put(f"/api/patients/{second['id']}", json={"allergies": "latex"}, headers=auth)
+
+  response = await client.patch("/api/patients/", json={"items": [
+    {"id": first["id"], "version": 1, "phone": "111"},
+    {"id": second["id"], "version": 1, "phone": "222"},
+  ]}, headers=auth)
+  assert response.status_code == 409
+  # The first item was rolled back with the rest
+  assert (await client.get(f"/api/patients/{first['id']}", headers=auth)).json()["phone"] is None
+
+  response = await client.patch("/api/patients/", json={"items": [
+    {"id": first["id"], "version": 1, "phone": "111"},
+    {"id": second["id"], "version": 2, "phone": "222"},
+  ]}, headers=auth)
+  assert response.status_code == 200
+  assert [p["version"] for p in response.json()] == [2, 3]
@@ -0,0 +1,126 @@
+import httpx
+import pytest
+
+import src.ratelimit
+from src.auth import create_access_token
+from src.ratelimit import DEFAULT_POLICIES, InMemoryRateLimitStore, Policy, RateLimitMiddleware, gcra, load_policies
+
+pytestmark = pytest.mark.anyio
+
+def login_policy() -> Policy:
+  return Policy("login", "/api/auth/login", 10, 60, burst=5, methods=("POST",), key="ip")
+
+def test_gcra_allows_the_burst_then_rejects():
+  policy = login_policy()
+  tat = None
+  for expected_remaining in (4, 3, 2, 1, 0):
+    tat, decision = gcra(tat, 0.0, policy)
+    assert decision.allowed and decision.remaining == expected_remaining
+  new_tat, decision = gcra(tat, 0.0, policy)
+  assert new_tat is None
+  assert not decision.allowed
+  # One request is earned back every period / limit = 6 seconds
+  assert decision.retry_after == pytest.approx(6.0)
+
+def test_gcra_recovers_at_the_sustained_rate():
+  policy = login_policy()
+  tat = None
+  for _ in range(5):
+    tat, _ = gcra(tat, 0.0, policy)
+  assert not gcra(tat, 5.9, policy)[1].allowed
+  tat, decision = gcra(tat, 6.0, policy)
+  assert decision.allowed and decision.remaining == 0
+  assert not gcra(tat, 6.0, policy)[1].allowed
+  # A full period of quiet refills the whole burst
+  _, decision = gcra(tat, 60.0, policy)
+  assert decision.allowed and decision.remaining == 4
+
+def test_policy_overrides(monkeypatch):
+  monkeypatch.setenv("RATE_LIMIT_LOGIN", "20/30:4")
+  monkeypatch.setenv("RATE_LIMIT_API", "100")
+  monkeypatch.setenv("RATE_LIMIT_CHAT", "0")
+  fresh = [Policy(p.name, p.prefix, p.limit, p.period, p.burst, p.methods, p.key) for p in DEFAULT_POLICIES]
+  policies = {policy.name: policy for policy in load_policies(fresh)}
+
+  assert "chat" not in policies
+  login = policies["login"]
+  assert (login.limit, login.period, login.burst, login.header) == (20, 30, 4, "20;w=30")
+  api = policies["api"]
+  # The period is kept and the burst defaults to the limit
+  assert (api.limit, api.period, api.burst, api.header) == (100, 60, 100, "100;w=60")
+  assert policies["register"].header == "5;w=3600"
+
+async def ok_app(scope, receive, send):
+  await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+  await send({"type": "http.response.body", "body": b"ok"})
+
+def limited_client(**middleware) -> httpx.AsyncClient:
+  app = RateLimitMiddleware(ok_app, **{"policies": [login_policy()], "store": InMemoryRateLimitStore(), **middleware})
+  return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+async def test_sixth_login_gets_429_with_headers():
+  async with limited_client() as client:
+    for expected_remaining in ("4", "3", "2", "1", "0"):
+      response = await client.post("/api/auth/login")
+      assert response.status_code == 200
+      assert response.headers["ratelimit-limit"] == "10"
+      assert response.headers["ratelimit-policy"] == "10;w=60"
+      assert response.headers["ratelimit-remaining"] == expected_remaining
+    response = await client.post("/api/auth/login")
+  assert response.status_code == 429
+  assert response.headers["retry-after"] == "6"
+  assert response.headers["ratelimit-limit"] == "10"
+  assert response.headers["ratelimit-remaining"] == "0"
+  assert response.headers["ratelimit-policy"] == "10;w=60"
+  assert int(response.headers["ratelimit-reset"]) == 30
+  assert response.json() == {"detail": "Too many requests, please slow down."}
+
+async def test_unmatched_requests_are_not_limited():
+  async with limited_client() as client:
+    for _ in range(10):
+      response = await client.get("/api/auth/login")
+      assert response.status_code == 200
+      assert "ratelimit-limit" not in response.headers
+
+async def test_users_have_separate_buckets():
+  policy = Policy("chat", "/api/chat", 20, 60, burst=1, methods=("POST",))
+  alice = {"Authorization": f"Bearer {create_access_token(data={'sub': 'alice@example.com'})}"}
+  bob = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bob@example.com'})}"}
+  async with limited_client(policies=[policy]) as client:
+    assert (await client.post("/api/chat", headers=alice)).status_code == 200
+    assert (await client.post("/api/chat", headers=alice)).status_code == 429
+    assert (await client.post("/api/chat", headers=bob)).status_code == 200
+    # Without a token the client IP is the key
+    assert (await client.post("/api/chat")).status_code == 200
+    assert (await client.post("/api/chat")).status_code == 429
+
+async def test_forwarded_for_is_only_trusted_when_configured(monkeypatch):
+  policy = Policy("login", "/api/auth/login", 10, 60, burst=1, methods=("POST",), key="ip")
+  async with limited_client(policies=[policy]) as client:
+    await client.post("/api/auth/login", headers={"X-Forwarded-For": "10.0.0.1"})
+    assert (await client.post("/api/auth/login", headers={"X-Forwarded-For": "10.0.0.2"})).status_code == 429
+  monkeypatch.setattr(src.ratelimit, "RATE_LIMIT_TRUST_FORWARDED", True)
+  async with limited_client(policies=[policy]) as client:
+    await client.post("/api/auth/login", headers={"X-Forwarded-For": "10.0.0.1"})
+    assert (await client.post("/api/auth/login", headers={"X-Forwarded-For": "10.0.0.2"})).status_code == 200
+
+async def test_store_errors_fail_open():
+  class BrokenStore(InMemoryRateLimitStore):
+    async def hit(self, key, policy):
+      raise ConnectionError("store is down")
+
+  async with limited_client(store=BrokenStore()) as client:
+    for _ in range(10):
+      assert (await client.post("/api/auth/login")).status_code == 200
+
+async def test_store_evicts_least_recently_used_keys():
+  store = InMemoryRateLimitStore(max_keys=3)
+  policy = Policy("api", "/api/", 1, 60, burst=1)
+  await store.hit("busy", policy)
+  for key in ("a", "b", "c"):
+    assert (await store.hit("busy", policy)).allowed is False
+    await store.hit(key, policy)
+  assert len(store) == 3
+  assert store.evictions == 1
+  # The busy key was touched most recently, so it kept its limit
+  assert (await store.hit("busy", policy)).allowed is False
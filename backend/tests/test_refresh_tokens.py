@@ -0,0 +1,58 @@
+import pytest
+
+from src.revocation import InMemoryRevocationBackend, revocation_list
+
+pytestmark = pytest.mark.anyio
+
+async def refresh(client, token: str):
+  return await client.post("/api/auth/refresh", json={"refresh_token": token})
+
+def bearer(tokens: dict) -> dict:
+  return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+def test_tests_use_the_in_memory_backend():
+  assert isinstance(revocation_list.backend, InMemoryRevocationBackend)
+
+async def test_refresh_rotates_both_tokens(client, tokens):
+  response = await refresh(client, tokens["refresh_token"])
+  assert response.status_code == 200
+  rotated = response.json()
+  assert rotated["refresh_token"] != tokens["refresh_token"]
+  assert (await client.get("/api/auth/me", headers=bearer(rotated))).status_code == 200
+  # The successor rotates in turn
+  assert (await refresh(client, rotated["refresh_token"])).status_code == 200
+
+async def test_reused_refresh_token_revokes_the_session(client, tokens):
+  rotated = (await refresh(client, tokens["refresh_token"])).json()
+
+  # Presenting the used token again means it was copied
+  assert (await refresh(client, tokens["refresh_token"])).status_code == 401
+
+  # Every token in the session stops working, including the legitimate successor
+  assert (await refresh(client, rotated["refresh_token"])).status_code == 401
+  assert (await client.get("/api/auth/me", headers=bearer(rotated))).status_code == 401
+  assert (await client.get("/api/auth/me", headers=bearer(tokens))).status_code == 401
+
+async def test_reuse_only_revokes_its_own_session(client, tokens):
+  email = (await client.get("/api/auth/me", headers=bearer(tokens))).json()["email"]
+  other = (await client.post("/api/auth/login", json={"email": email, "password": "test-password"})).json()
+
+  await refresh(client, tokens["refresh_token"])
+  await refresh(client, tokens["refresh_token"])
+
+  assert (await client.get("/api/auth/me", headers=bearer(other))).status_code == 200
+  assert (await refresh(client, other["refresh_token"])).status_code == 200
+
+async def test_unknown_refresh_token_is_rejected(client, tokens):
+  assert (await refresh(client, "not-a-refresh-token")).status_code == 401
+
+async def test_logout_revokes_access_and_refresh_tokens(client, tokens):
+  response = await client.post("/api/auth/logout", headers=bearer(tokens))
+  assert response.status_code == 200
+  assert (await client.get("/api/auth/me", headers=bearer(tokens))).status_code == 401
+  assert (await refresh(client, tokens["refresh_token"])).status_code == 401
+
+async def test_revocations_survive_a_resync(client, tokens):
+  await client.post("/api/auth/logout", headers=bearer(tokens))
+  await revocation_list.sync()
+  assert (await client.get("/api/auth/me", headers=bearer(tokens))).status_code == 401
@@ -0,0 +1,98 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def search(client, auth, query: str, **params):
+  response = await client.get("/api/patients/search", params={"query": query, **params}, headers=auth)
+  assert response.status_code == 200, response.text
+  return response.json()
+
+async def search_ids(client, auth, query: str, **params) -> list:
+  return [p["id"] for p in (await search(client, auth, query, **params))["items"]]
+
+async def walk(client, auth, query: str, **params) -> list:
+  """Follow next_cursor to the end; every match seen, in order."""
+  seen, cursor = [], None
+  while True:
+    page = await search(client, auth, query, **params, **({"cursor": cursor} if cursor else {}))
+    assert len(page["items"]) <= params["limit"]
+    seen += [p["id"] for p in page["items"]]
+    cursor = page["next_cursor"]
+    if cursor is None:
+      return seen
+
+async def test_rank_order(client, auth, create_patient):
+  substring = await create_patient("Tom", "Blacksmith")
+  email = await create_patient("Ann", "Jones", email="smithy@example.com")
+  prefix = await create_patient("Zoe", "Smithers")
+  exact = await create_patient("John", "Smith")
+  await create_patient("Grace", "Hopper")
+  # Exact name > name prefix > email prefix > substring
+  assert await search_ids(client, auth, "Smith") == [exact["id"], prefix["id"], email["id"], substring["id"]]
+
+async def test_ties_are_ordered_by_name(client, auth, create_patient):
+  second = await create_patient("Bob", "Smith")
+  first = await create_patient("Amy", "Smith")
+  assert await search_ids(client, auth, "smith") == [first["id"], second["id"]]
+
+async def test_every_term_must_match(client, auth, create_patient):
+  ada = await create_patient("Ada", "Lovelace")
+  await create_patient("Ada", "Turing")
+  await create_patient("Alan", "Lovelace")
+  assert await search_ids(client, auth, "ada love") == [ada["id"]]
+
+@pytest.mark.parametrize("query", ["(555) 123-4567", "555-123-4567", "5551234567", "555.123", "123 45", "+555 123"])
+async def test_phone_matches_whatever_the_format(client, auth, create_patient, query):
+  patient = await create_patient(phone="(555) 123-4567")
+  await create_patient("Grace", "Hopper", phone="555-987-6543")
+  assert await search_ids(client, auth, query) == [patient["id"]]
+
+async def test_phone_prefix_mode(client, auth, create_patient):
+  patient = await create_patient(phone="555 123 4567")
+  assert await search_ids(client, auth, "555-12", mode="prefix") == [patient["id"]]
+  assert await search_ids(client, auth, "1234", mode="prefix") == []
+
+async def test_short_digit_queries_search_text(client, auth, create_patient):
+  patient = await create_patient("Room", "42", phone="555 123 4567")
+  # Too few digits for a phone search; matched against names instead
+  assert await search_ids(client, auth, "42") == [patient["id"]]
+
+async def test_like_wildcards_are_literal(client, auth, create_patient):
+  await create_patient("Axb", "Jones")
+  literal = await create_patient("A_b", "Jones")
+  assert await search_ids(client, auth, "a_b") == [literal["id"]]
+  assert await search_ids(client, auth, "%") == []
+
+async def test_prefix_mode_skips_substrings(client, auth, create_patient):
+  prefix = await create_patient("Tom", "Smithers")
+  await create_patient("Tom", "Blacksmith")
+  assert await search_ids(client, auth, "smi", mode="prefix") == [prefix["id"]]
+
+@pytest.mark.parametrize("limit", [1, 2, 5])
+async def test_cursor_walk_keeps_rank_order(client, auth, create_patient, limit):
+  for first, last in [("John", "Smith"), ("Ann", "Smith"), ("Zoe", "Smithers"), ("Tom", "Blacksmith"), ("Ed", "Smithson")]:
+    await create_patient(first, last)
+  expected = await search_ids(client, auth, "smith", limit=50)
+  assert len(expected) == 5
+  assert await walk(client, auth, "smith", limit=limit) == expected
+
+async def test_malformed_cursor_is_rejected(client, auth, create_patient):
+  await create_patient("John", "Smith")
+  response = await client.get("/api/patients/search", params={"query": "smith", "cursor": "not-a-cursor"}, headers=auth)
+  assert response.status_code == 400
+
+async def test_cursor_from_another_search_is_rejected(client, auth, create_patient):
+  for first in ("Amy", "Bob", "Cal"):
+    await create_patient(first, "Smith")
+  cursor = (await search(client, auth, "smith", limit=1))["next_cursor"]
+  for params in ({"query": "smi"}, {"query": "smith", "mode": "prefix"}):
+    response = await client.get("/api/patients/search", params={**params, "cursor": cursor}, headers=auth)
+    assert response.status_code == 400
+
+async def test_list_cursor_is_rejected_by_search(client, auth, create_patient):
+  for first in ("Amy", "Bob"):
+    await create_patient(first, "Smith")
+  response = await client.get("/api/patients/", params={"paginate": "cursor", "limit": 1}, headers=auth)
+  cursor = response.json()["next_cursor"]
+  response = await client.get("/api/patients/search", params={"query": "smith", "cursor": cursor}, headers=auth)
+  assert response.status_code == 400
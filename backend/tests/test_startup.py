@@ -0,0 +1,61 @@
+import statistics
+
+import httpx
+import pytest
+
+from benchmarks import startup_benchmark
+from conftest import BACKEND_DIR
+from src.revocation import revocation_list
+
+pytestmark = pytest.mark.anyio
+
+async def test_ready_after_startup(client):
+  response = await client.get("/health/ready")
+  assert response.status_code == 200
+  body = response.json()
+  assert body["status"] == "ready"
+  assert body["revocation"] == {"synced": True, "last_error": None}
+  assert all(result["ok"] for result in body["databases"].values())
+
+async def test_liveness(client):
+  response = await client.get("/health/live")
+  assert response.status_code == 200
+
+async def test_startup_survives_an_unreachable_revocation_store(anyio_backend, monkeypatch):
+  import src.main
+  from src.main import app
+
+  async def unreachable(since):
+    raise ConnectionError("store is down")
+
+  monkeypatch.setattr(revocation_list, "last_sync", None)
+  monkeypatch.setattr(revocation_list.backend, "revoked_since", unreachable)
+  monkeypatch.setattr(src.main, "HEALTH_DB_TIMEOUT_S", 0.2)
+  # Startup must not wait on the store
+  await app.router._startup()
+  try:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+      assert (await client.get("/health/live")).status_code == 200
+      response = await client.get("/health/ready")
+      assert response.status_code == 503
+      assert response.json()["revocation"]["synced"] is False
+      assert "store is down" in response.json()["revocation"]["last_error"]
+
+      # Once the store answers, the next sync makes the instance ready
+      monkeypatch.undo()
+      await revocation_list.sync()
+      assert (await client.get("/health/ready")).status_code == 200
+  finally:
+    await app.router._shutdown()
+
+def test_cold_start_within_budget(monkeypatch):
+  # Each run is a fresh interpreter, as on a serverless cold start
+  monkeypatch.chdir(BACKEND_DIR)
+  runs = [startup_benchmark.run_once() for _ in range(3)]
+  budgets = {
+    "import": startup_benchmark.IMPORT_BUDGET_MS,
+    "first": startup_benchmark.FIRST_REQUEST_BUDGET_MS,
+    "ready": startup_benchmark.READY_BUDGET_MS,
+  }
+  for phase, budget in budgets.items():
+    assert statistics.median(run[phase] * 1000 for run in runs) <= budget, phase
@@ -56,9 +56,12 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   const login = async (email: string, password: string): Promise<boolean> => {
     try {
       const response = await authApi.login({ email, password });
-      const { access_token } = response.data;
+      const { access_token, refresh_token } = response.data;
 
       localStorage.setItem("token", access_token);
+      if (refresh_token) {
+        localStorage.setItem("refreshToken", refresh_token);
+      }
       api.defaults.headers.common["Authorization"] = `Bearer ${access_token}`;
 
       setUser({ id: 1, email, created_at: new Date().toISOString() });
@@ -95,7 +98,13 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   };
 
   const logout = () => {
+    // Revoke the session server-side; the local state is cleared either way
+    const token = localStorage.getItem("token");
+    if (token) {
+      authApi.logout(token).catch(() => undefined);
+    }
     localStorage.removeItem("token");
+    localStorage.removeItem("refreshToken");
     // localStorage.removeItem("userEmail")
     delete api.defaults.headers.common["Authorization"];
     setUser(null);
@@ -22,6 +22,9 @@ export default function Chat() {
   ]);
   const [input, setInput] = useState("");
   const [isTyping, setIsTyping] = useState(false);
+  // Started on the first message and sent with every later one, so the
+  // assistant sees earlier turns
+  const conversationId = useRef<number | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -33,7 +36,15 @@ export default function Chat() {
   }, [messages]);
 
   const sendMessageMutation = useMutation(
-    ({ message }: { message: string }) => chatApi.sendMessage({ message }),
+    async ({ message }: { message: string }) => {
+      if (conversationId.current === null) {
+        conversationId.current = (await chatApi.startConversation()).data.id;
+      }
+      return chatApi.sendMessage({
+        message,
+        conversation_id: conversationId.current,
+      });
+    },
     {
       onSuccess: (response) => {
         const botMessage: ChatMessage = {
@@ -19,18 +19,58 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Access tokens are short-lived; on a 401 the stored refresh token is
+// exchanged once for a new pair and the request is retried. Concurrent
+// 401s share one refresh, since each refresh token only works once.
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem("refreshToken");
+    refreshing = (
+      refreshToken
+        ? api.post("/auth/refresh", { refresh_token: refreshToken })
+        : Promise.reject(new Error("No refresh token"))
+    )
+      .then((response) => {
+        const { access_token, refresh_token } = response.data;
+        localStorage.setItem("token", access_token);
+        if (refresh_token) localStorage.setItem("refreshToken", refresh_token);
+        api.defaults.headers.common["Authorization"] = `Bearer ${access_token}`;
+        return access_token as string;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 // Response interceptor to handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    // Only redirect to login for 401 errors on protected routes
-    // Don't redirect for login/register endpoints
+  async (error) => {
+    const config = error.config;
+    // Only handle 401 errors on protected routes
+    // Don't refresh or redirect for the auth endpoints themselves
     if (
       error.response?.status === 401 &&
-      !error.config?.url?.includes("/auth/login") &&
-      !error.config?.url?.includes("/auth/register")
+      !config?.url?.includes("/auth/login") &&
+      !config?.url?.includes("/auth/register") &&
+      !config?.url?.includes("/auth/refresh")
     ) {
+      if (!config._retried) {
+        try {
+          const token = await refreshAccessToken();
+          config._retried = true;
+          config.headers.Authorization = `Bearer ${token}`;
+          return api(config);
+        } catch {
+          // Fall through to the login page
+        }
+      }
       localStorage.removeItem("token");
+      localStorage.removeItem("refreshToken");
       window.location.href = "/login";
     }
     return Promise.reject(error);
@@ -15,7 +15,10 @@ export const authApi = {
   register: (credentials: LoginCredentials): Promise<AxiosResponse<User>> =>
     api.post("/auth/register", credentials),
   me: (): Promise<AxiosResponse<User>> => api.get("/auth/me"),
-  logout: (): Promise<AxiosResponse<void>> => api.post("/auth/logout"),
+  logout: (token: string): Promise<AxiosResponse<void>> =>
+    api.post("/auth/logout", null, {
+      headers: { Authorization: `Bearer ${token}` },
+    }),
   resetPassword: (data: PasswordResetRequest): Promise<AxiosResponse<void>> =>
     api.post("/auth/reset-password", data),
   changePassword: (data: PasswordChangeRequest): Promise<AxiosResponse<void>> =>
@@ -1,13 +1,18 @@
 import { api } from "./api";
 
 import { type AxiosResponse } from "axios";
-import type { ChatRequest, ChatResponse } from "../types";
+import type { ChatRequest, ChatResponse, Conversation } from "../types";
 
 export const chatApi = {
+  startConversation: (patientId?: number): Promise<AxiosResponse<Conversation>> =>
+    api.post("/chat/conversations", { patient_id: patientId }),
+
   sendMessage: (request: ChatRequest): Promise<AxiosResponse<ChatResponse>> =>
     api.post("/chat", {
       message: request.message,
       patient_context: request.patient_context,
+      conversation_id: request.conversation_id,
+      patient_id: request.patient_id,
       timestamp: new Date().toISOString(),
     }),
 };
@@ -19,6 +19,7 @@ export interface Patient {
   emergency_contact?: string;
   created_at: string;
   updated_at?: string;
+  version?: number;
 }
 
 export interface PatientFormData {
@@ -81,6 +82,8 @@ export interface ProfileUpdateRequest {
 export interface Token {
   access_token: string;
   token_type: string;
+  refresh_token?: string;
+  expires_in?: number;
 }
 
 export interface ChatMessage {
@@ -94,12 +97,21 @@ export interface ChatRequest {
   message: string;
   patient_context?: string;
   timestamp?: string;
+  conversation_id?: number;
+  patient_id?: number;
+}
+
+export interface Conversation {
+  id: number;
+  patient_id?: number;
+  created_at: string;
 }
 
 export interface ChatResponse {
   message: string;
   response: string;
   timestamp?: string;
+  conversation_id?: number;
 }
 
 export interface ApiResponse<T> {